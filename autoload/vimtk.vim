@@ -142,456 +142,75 @@ endfunc
 
 
 func! vimtk#execute_text_in_terminal(...) range
-python3 << EOF
-"""
-Interactive scripting function. Takes part of the file you are editing
-and pastes it into a terminal and then returns the editor to focus.
-
-Args:
-    mode (str): clipboard, word, line, or visual
-    return_to_vim (bool): if True, returns focus to vim after we paste
-        (defaults to True)
-
-Suggested Binding:
-  noremap  <leader>a :call vimtk#execute_text_in_terminal(mode())<CR>
-  vnoremap <leader>a :call vimtk#execute_text_in_terminal(visualmode())<CR>
-  noremap  <leader>m :call vimtk#execute_text_in_terminal('word')<CR>
-
-"""
-import vimtk
-
-#import logging
-#logging.basicConfig()
-#logging.getLogger().setLevel(logging.DEBUG)
-#vimtk.reload()
-
-argv = vimtk.vim_argv(defaults=['clipboard', '1'])
-mode = argv[0]
-return_to_vim = argv[1] != '0'
-
-vimtk.logger.debug(('CALL FUNCTION vimtk#execute_text_in_terminal('
-                    'mode={mode!r}, return_to_vim={return_to_vim!r}'
-                    ')').format(**locals()))
-
-vimtk.logger.debug('Get text from mode={}'.format(mode))
-if mode == 'clipboard':
-    vimtk.logger.debug('Text is already in clipboard')
-    text = vimtk.Clipboard.paste()
-    vimtk.logger.debug('got text')
-    vimtk.logger.debug('text = %r' % (text,))
-else:
-    if mode == 'word':
-        text = vimtk.TextSelector.word_at_cursor()
-    else:
-        if 'v' in mode.lower():
-            text = vimtk.TextSelector.selected_text()
-        else:
-            text = vimtk.TextSelector.line_at_cursor()
-
-text = vimtk.preprocess_executable_text(text)
-vimtk.execute_text_in_terminal(text, return_to_vim=return_to_vim)
-
-EOF
+  " Pastes the current text (clipboard, word, line, or visual) into a terminal
+  " Usage: vimtk#execute_text_in_terminal(mode, [return_to_vim])
+  " See vimtk.commands.execute_text_in_terminal for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('execute_text_in_terminal')
 endfunc
 
 
 
 func! vimtk#copy_current_fpath()
-python3 << EOF
-"""
-Copies the absolute path to the current file into your clipboard
-
-Suggested Binding:
-    noremap <leader>C :call vimtk#copy_current_fpath()<Esc>
-"""
-
-import vimtk
-import sys
-from os.path import normpath
-from vimtk.util import shrinkuser
-WIN32   = sys.platform == 'win32'  # type: bool
-fpath = vimtk.get_current_fpath()
-if not WIN32:
-    fpath = shrinkuser(fpath)
-vimtk.Clipboard.copy(fpath)
-vimtk.logger.info('copied fpath = {!r} to the clipboard'.format(fpath))
-EOF
+  " Copies the absolute path to the current file into your clipboard
+  " See vimtk.commands.copy_current_fpath for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('copy_current_fpath')
 endfunc
 
 
 
 func! vimtk#copy_current_module()
-python3 << EOF
-"""
-Assuming the current file is a Python module, this attempts to introspect the
-module name and copy it to your clipboard.
-
-Suggested Binding:
-    noremap <leader>f :call vimtk#copy_current_module()<Esc>
-"""
-import vimtk
-from vimtk.util import modpath_to_modname
-fpath = vimtk.get_current_fpath()
-if vimtk.Python.is_module_pythonfile():
-    import vim
-    modpath = vim.current.buffer.name
-    modname = modpath_to_modname(modpath)
-    vimtk.Clipboard.copy(modname)
-    vimtk.logger.info('copied modname = {!r} to the clipboard'.format(modname))
-else:
-    vimtk.logger.warn('file is not a python file. Copy the path instead')
-    vimtk.Clipboard.copy(fpath)
-    vimtk.logger.info('copied filepath = {!r} to the clipboard'.format(modname))
-EOF
+  " Copies the Python module name of the current file into your clipboard
+  " See vimtk.commands.copy_current_module for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('copy_current_module')
 endfunc
 
 
 
 func! vimtk#ipython_import_all()
-python3 << EOF
-"""
-Imports global variables from current module into IPython session
-
-Notes:
-    calls vimtk.execute_text_in_terminal, which depends on gVim
-
-Suggested Binding:
-    noremap <leader>M :call vimtk#ipython_import_all()<CR>
-"""
-import vimtk
-from vimtk import pyinspect
-from vimtk import util
-from vimtk.util import modpath_to_modname
-from vimtk.util import split_modpath
-from os.path import dirname, expanduser
-from os.path import basename, splitext
-import textwrap
-
-#import logging
-#logging.basicConfig()
-#logging.getLogger().setLevel(logging.DEBUG)
-#vimtk.reload()
-
-# TODO: mkinit will soon have a generate import * func
-# Use that instead.
-
-if vimtk.Python.is_module_pythonfile():
-    import vim
-    modpath = vim.current.buffer.name
-    modname = modpath_to_modname(modpath)
-
-    lines = []
-    if not pyinspect.in_pythonpath(modname):
-        # Module is not in PYTHONPATH, make this happen before we run
-        # (note this is based on Vim's python, not the terminals.
-        #  this check might not always work)
-        # 
-        # TODO: allow user to force adding to the pythonpath 
-        basepath = split_modpath(modpath)[0]
-        #lines.append('import sys')
-        #lines.append('sys.path.append(%r)' % (basepath,))
-
-        user_basepath = util.shrinkuser(basepath)
-        if user_basepath != basepath:
-            lines.append('import sys, ubelt')
-            lines.append('sys.path.append(ubelt.expandpath(%r))' % (user_basepath,))
-        else:
-            lines.append('import sys')
-            lines.append('sys.path.append(%r)' % (basepath,))
-
-    lines.append("from {} import *  # NOQA".format(modname))
-    # Add private and protected functions, even if they wouldnt be exposed
-    try:
-        sourcecode = open(modpath, 'r').read()
-        # TODO get classes and whatnot
-        try:
-            func_names = pyinspect.parse_function_names(sourcecode)
-            if '__all__' in sourcecode:
-                # completely disregard __all__
-                import_names, modules = pyinspect.parse_import_names(sourcecode, branch=False)
-                extra_names = list(func_names) + list(import_names)
-            else:
-                extra_names = [name for name in func_names if name.startswith('_')]
-        except SyntaxError as ex:
-            vimtk.logger.info('ex = {!r}'.format(ex))
-            extra_names = []
-            lines.append('# vimtk encountered a syntax error')
-
-        if len(extra_names) > 0:
-            extra = ', '.join(extra_names)
-            lines.append("from {} import {}".format(modname, extra))
-
-    except Exception as ex:
-        #vimtk.logger.info(repr(ex))
-        import traceback
-        tbtext = traceback.format_exc()
-        vimtk.logger.error(tbtext)
-        vimtk.logger.error(repr(ex))
-        raise
-    # Prepare to send text to xdotool
-    text = textwrap.dedent('\n'.join(lines))
-    vimtk.execute_text_in_terminal(text)
-else:
-    vimtk.logger.info('current file is not a pythonfile')
-EOF
+  " Imports global variables from current module into IPython session
+  " See vimtk.commands.ipython_import_all for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('ipython_import_all')
 endfunc
 
 
 
-func! vimtk#insert_auto_import() 
-python3 << EOF
-"""
-Introspects the current Python file, and attempts to automatically insert
-missing import statements.
-
-Suggested Binding:
-    command! AutoImport call vimtk#insert_auto_import()
-"""
-import vim
-import vimtk
-
-fpath = vimtk.get_current_fpath()
-
-vimtk.ensure_normalmode()
-if vimtk.Python.is_module_pythonfile():
-    import_block = vimtk.autogen_imports(fpath)
-    offset = import_block.count('\n')
-    # FIXME: doesnt work right when row=0
-    # Note: row is 1 indexed, and cannot be zero
-    with vimtk.CursorContext(offset=offset):
-        vimtk.Python.prepend_import_block(import_block)
-else:
-    vimtk.logger.info('current file is not a pythonfile')
-
-EOF
+func! vimtk#insert_auto_import()
+  " Inserts missing import statements into the current Python file
+  " See vimtk.commands.insert_auto_import for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('insert_auto_import')
 endfunc
 
 
 func! vimtk#insert_print_var_at_cursor(...)
-python3 << EOF
-"""
-Inserts a line of code that prints the current variable under the cursor
-
-Currently supports the following languages:
-    C++, Bash, CMake, Python
-
-Suggested Binding:
-    noremap <leader>pv :call vimtk#insert_print_var_at_cursor()<CR>
-"""
-import vim
-import vimtk
-from vimtk import util
-
-argv = vimtk.vim_argv(defaults=['repr'])
-
-if len(argv) != 1:
-    raise Exception('only one argument')
-else:
-    mode = argv[0]
-
-expr = vimtk.TextSelector.word_at_cursor()
-indent = vimtk.TextSelector.current_indent()
-
-filetype = vimtk.get_current_filetype()
-if filetype == 'sh':
-    language = 'sh'
-elif filetype in {'cmake'}:
-    language = 'cmake'
-elif filetype in {'cpp', 'cxx', 'h'}:
-    language = 'cpp'
-elif filetype in {'vue', 'js'}:
-    language = 'javascript'
-elif filetype in {'py'}:
-    language = 'py'
-else:
-    language = 'py'  # Default to python
-
-if language == 'sh':
-    statement = 'echo "{expr} = ${expr}"'.format(expr=expr)
-elif language == 'cmake':
-    statement = 'message(STATUS "{expr} = ${{{expr}}}")'.format(expr=expr)
-elif language == 'javascript':
-    statement = 'console.log("{expr} = " + {expr});'.format(expr=expr)
-    # try to play nice with js linter
-    maxlen = 80 - len(indent)
-    if len(statement) > maxlen:
-        parts = [
-            '"{expr} = " + '.format(expr=expr),
-            '{expr}'.format(expr=expr),
-        ]
-        body = '  ' + ''.join(parts)
-        header = 'console.log('
-        footer = ');'
-        if len(body) < maxlen:
-            statement = '\n'.join([header, body, footer])
-        else:
-            statement = '\n'.join([header, '  ' + parts[0], '    ' + parts[1], footer])
-elif language == 'py':
-    if mode == 'repr':
-        USE_FORMAT_STRING = sys.version_info[0:2] >= (3, 6)
-        if USE_FORMAT_STRING:
-            statement = "print(f'%s={%s}')" % (expr, expr,)
-            #USE_FORMAT_STRING_EQ = sys.version_info[0:2] >= (3, 8)
-            #if USE_FORMAT_STRING_EQ:
-            #    # TODO: determine when this is safe
-            #    statement = "print(f'%s={%s}')" % (expr, expr,)
-            #    #statement = "print(f'{%s=}')" % (expr,)
-            #    # = {{!r}}'.format({expr}))".format(expr=expr)
-        else:
-            statement = "print('{expr} = {{!r}}'.format({expr}))".format(expr=expr)
-    elif mode == 'repr2':
-        statement = "print('{expr} = {{}}'.format(ub.repr2({expr}, nl=1)))".format(expr=expr)
-        statement = "print('{expr} = {{}}'.format(ub.urepr({expr}, nl=1)))".format(expr=expr)
-    elif mode == 'urepr':
-        USE_F_STRING = sys.version_info[0:2] >= (3, 6)
-        if USE_F_STRING:
-            statement = "print(f'{expr} = {{ub.urepr({expr}, nl=1)}}')".format(expr=expr)
-        else:
-            statement = "print('{expr} = {{}}'.format(ub.urepr({expr}, nl=1)))".format(expr=expr)
-    else:
-        raise KeyError(mode)
-elif language == 'cpp':
-    current_fpath = vimtk.get_current_fpath()
-
-    # TODO: register a way to use loggers
-    REGISTRED_CPP_LOGGING_MODULES = ['kwiver', 'sprokit', 'vital']
-    # REGISTRED_CPP_LOGGING_MODULES = []
-
-    if any(n in current_fpath for n in REGISTRED_CPP_LOGGING_MODULES):
-        if vimtk.find_pattern_above_row(
-            '\\s*auto logger = kwiver::vital::get_logger.*') is None:
-            statement = util.codeblock(
-                '''
-                auto logger = kwiver::vital::get_logger("temp.logger");
-                LOG_INFO(logger, "{expr} = " << {expr} );
-                '''
-            ).format(expr=expr)
-        else:
-            statement = util.codeblock(
-                '''
-                LOG_INFO(logger, "{expr} = " << {expr} );
-                '''
-            ).format(expr=expr)
-    else:
-        cout = 'std::cout'
-        endl = 'std::endl'
-        #statement = '{cout} << "{expr} = \\"" << {expr} << "\\"" << {endl};'.format(
-        #    expr=expr, cout=cout, endl=endl)
-        statement = '{cout} << "{expr} = " << {expr} << {endl};'.format(
-            expr=expr, cout=cout, endl=endl)
-else:
-    raise KeyError(language)
-
-newline = indent + statement.replace('\n', '\n' + indent)
-vimtk.TextInsertor.insert_under_cursor(newline)
-EOF
+  " Inserts a line of code that prints the variable under the cursor
+  " Usage: vimtk#insert_print_var_at_cursor([repr|urepr])
+  " See vimtk.commands.insert_print_var_at_cursor for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('insert_print_var_at_cursor')
 endfunc
 
 
 func! vimtk#insert_timerit(...) range
-python3 << EOF
-"""
-Suggested Bindings:
-    noremap  <c-M-B> :call vimtk#insert_timerit(mode())<CR><Esc>
-    vnoremap <c-M-B> :call vimtk#insert_timerit(visualmode())<CR><Esc>
-"""
-import vim
-from vimtk import util
-mode = vim.eval('a:1')
-indent = vimtk.TextSelector.current_indent()
-newtext = '\n'.join([
-    indent + 'import timerit',
-    indent + 'ti = timerit.Timerit(100, bestof=10, verbose=2)',
-    indent + 'for timer in ti.reset(\'time\'):',
-    indent + '    with timer:',
-])
-if 'v' in mode.lower():
-    selected = vimtk.TextSelector.selected_text()
-    newtext += '\n' + util.indent(selected, ' ' * 8)
-    vimtk.TextInsertor.insert_over_selection(newtext)
-else:
-    vimtk.TextInsertor.insert_under_cursor(newtext)
-EOF
+  " Inserts a timerit block (around the selection in visual mode)
+  " Usage: vimtk#insert_timerit(mode)
+  " See vimtk.commands.insert_timerit for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('insert_timerit')
 endfunc
 
 
 
 func! vimtk#smart_search_word_at_cursor()
-python3 << EOF
-"""
-Determines if the word at the cursor is a url and opens it in a webbrowser
-
-Suggested Binding:
-    noremap <leader>es :call vimtk#smart_search_word_at_cursor()<CR>
-"""
-import vim
-import vimtk
-word = vimtk.TextSelector.word_at_cursor(url_ok=True)
-url = vimtk.extract_url_embeding(word)
-print('url = {!r}'.format(url))
-import webbrowser
-webbrowser.open(url)
-EOF
+  " Opens the url under the cursor in a webbrowser
+  " See vimtk.commands.smart_search_word_at_cursor for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('smart_search_word_at_cursor')
 endfunc
 
 
 
-func! vimtk#open_path_at_cursor(...) 
-python3 << EOF
-"""
-Does a fancy open of a path at the current cursor position in vim
-
-Args:
-    *argv: [command, [path]]
-        command is the type of way you open in vim, defaults to 'split'
-        path defaults to the current 'word' under cursor
-
-Behavior depends on path:
-   * If path isurl: open with OS webbrowser
-   * If path isdir: open directory
-   * If path isfile: open file
-   * If path looks like a python module: 
-       try to statically find and open that
-   * If path doesnt exist:
-       * Look down a few directories to see if its relative to something
-         else (really helps for navigating C++).
-
-
-Suggested Bindings:
-    " In current v/split or new tab
-    noremap <leader>go :call vimtk#open_path_at_cursor("e")<CR>
-    noremap <leader>gf :call vimtk#open_path_at_cursor("e")<CR>
-    noremap <leader>gi :call vimtk#open_path_at_cursor("split")<CR>
-    noremap <leader>gv :call vimtk#open_path_at_cursor("vsplit")<CR>
-    noremap <leader>gv :call vimtk#open_path_at_cursor("vsplit")<CR>
-    noremap <leader>gt :call vimtk#open_path_at_cursor("tabe")<CR>
-    noremap gi :call vimtk#open_path_at_cursor("split")<CR>
-
-Ignore:
-call vimtk#open_path_at_cursor('split', '~/local/vim/vimfiles/bundle/vimtk/autoload/vimtk.vim')
-call vimtk#open_path_at_cursor('split', '~')
-call vimtk#open_path_at_cursor('split', 'google.com')
-"""
-import vim
-import re
-from os.path import exists, expanduser
-import vimtk
-
-argv = vimtk.vim_argv(defaults=['split'])
-mode = argv[0]
-#print('argv = {!r}'.format(argv))
-
-if len(argv) >= 2:
-    path = argv[1]
-else:
-    path = vimtk.TextSelector.word_at_cursor(url_ok=True)
-
-#print = vimtk.logger.info
-#print('vimtk#open_path_at_cursor path = {!r}'.format(path))
-#print('exists = {!r}'.format(exists(path)))
-
-vimtk.find_and_open_path(path, mode=mode, verbose=0)
-EOF
+func! vimtk#open_path_at_cursor(...)
+  " Does a fancy open of a path at the current cursor position
+  " Usage: vimtk#open_path_at_cursor([command, [path]])
+  " See vimtk.commands.open_path_at_cursor for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('open_path_at_cursor')
 endfunc
 
 
@@ -679,74 +298,93 @@ endfu
 
 
 func! vimtk#py_format_doctest() range
-python3 << EOF
-"""
-Inserts docstring chevrons
-"""
-import vim
-import vimtk
-text = vimtk.TextSelector.selected_text()
-text2 = vimtk.Python.format_text_as_docstr(text)
-vimtk.TextInsertor.insert_over_selection(text2)
-EOF
+  " Inserts docstring chevrons
+  " See vimtk.commands.py_format_doctest for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('py_format_doctest')
 endfunc
 
 
 func! vimtk#py_unformat_doctest() range
-python3 << EOF
-"""
-Removes docstring chevrons
-"""
-import vim
-text = vimtk.TextSelector.selected_text()
-text2 = vimtk.Python.unformat_text_as_docstr(text)
-vimtk.TextInsertor.insert_over_selection(text2)
-EOF
+  " Removes docstring chevrons
+  " See vimtk.commands.py_unformat_doctest for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('py_unformat_doctest')
 endfunc
 
 
-func! vimtk#format_paragraph(...) 
+func! vimtk#format_paragraph(...)
+  " Rewraps the paragraph under the cursor with one sentence per line
+  " Usage: vimtk#format_paragraph([cfgstr])
+  " See vimtk.commands.format_paragraph for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('format_paragraph')
+endfunc
+
+
+func! vimtk#stats(...)
+  " Reports or controls the counters for vim bridge calls and process spawns
+  " Usage: vimtk#stats(['report' | 'on' | 'off' | 'reset'])
+  " See vimtk.stats for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('stats')
+endfunc
+
+
+func! vimtk#aio_start()
+  " Starts the timer that pumps the vimtk.aio event loop while it has work
+  " See vimtk.aio for details
+  if !exists('s:vimtk_aio_timer')
+    let s:vimtk_aio_timer = timer_start(5, 'vimtk#aio_pump', {'repeat': -1})
+  endif
+endfunc
+
+
+func! vimtk#aio_pump(timer)
+  " Runs one iteration of the vimtk.aio event loop
+  python3 import vimtk.aio
+  if py3eval('vimtk.aio.pump()') == 0
+    call timer_stop(a:timer)
+    unlet s:vimtk_aio_timer
+  endif
+endfunc
+
+
+func! vimtk#output_bufnr(height)
+  " Returns the scratch buffer that vimtk.output appends REPL output to and
+  " shows it in a window of a:height lines at the bottom (unless a:height is
+  " 0 or it is already shown) without moving the cursor
+  " See vimtk.output for details
+  if !exists('s:vimtk_output_bufnr') || !bufexists(s:vimtk_output_bufnr)
+    let s:vimtk_output_bufnr = bufadd('[vimtk output]')
+    call setbufvar(s:vimtk_output_bufnr, '&buftype', 'nofile')
+    call setbufvar(s:vimtk_output_bufnr, '&bufhidden', 'hide')
+    call setbufvar(s:vimtk_output_bufnr, '&swapfile', 0)
+    call setbufvar(s:vimtk_output_bufnr, '&buflisted', 0)
+    call bufload(s:vimtk_output_bufnr)
+  endif
+  if a:height > 0 && bufwinid(s:vimtk_output_bufnr) == -1
+    let l:winid = win_getid()
+    execute 'botright sbuffer ' . s:vimtk_output_bufnr
+    execute 'resize ' . a:height
+    setlocal winfixheight nobuflisted
+    call win_gotoid(l:winid)
+  endif
+  return s:vimtk_output_bufnr
+endfunc
+
+
+func! vimtk#output_follow()
+  " Scrolls the windows that show the vimtk output buffer to its last line
+  if exists('s:vimtk_output_bufnr')
+    for l:winid in win_findbuf(s:vimtk_output_bufnr)
+      call win_execute(l:winid, 'normal! G')
+    endfor
+  endif
+endfunc
 
-python3 << EOF
-import vim
-import vimtk
-from vimtk import util
-
-nargs = int(vim.eval('a:0'))
-# Simulate kwargs with cfgdict-like strings
-default_config = {
-    'max_width': 80,
-    'myprefix': True,
-    'sentence_break': True,
-}
-if nargs == 1:
-    import ast
-    cfgstr = vim.eval('a:1')
-    kwargs = ast.literal_eval(cfgstr) if cfgstr else {}
-    #cfgdict = ut.parse_cfgstr3(cfgstr)
-    #kwargs = ut.update_existing(default_kwargs, cfgdict, assert_exists=True)
-else:
-    kwargs = {}
-
-assert not util.dict_diff(kwargs, default_config), 'unknown args'
-config = util.dict_union(default_config, kwargs)
-
-# Remember curor location as best as possible
-(row, col) = vim.current.window.cursor
-
-row1, row2 = vimtk.TextSelector.paragraph_range_at_cursor()
-text = vimtk.TextSelector.text_between_lines(row1, row2)
-text = util.ensure_unicode(text)
-
-from vimtk._dirty import format_multiple_paragraph_sentences
-wrapped_text = format_multiple_paragraph_sentences(text, **kwargs)
-
-vimtk.TextInsertor.insert_between_lines(wrapped_text, row1, row2)
-
-# Reset cursor position as best as possible
-vimtk.Cursor.move(row, col)
-EOF
 
+func! vimtk#trace(...)
+  " Records timing spans of vimtk commands and exports them as a Chrome trace
+  " Usage: vimtk#trace(['dump' [, fpath]] | 'on' | 'off' | 'clear')
+  " See vimtk.tracing for details
+  python3 import vimtk.commands; vimtk.commands.dispatch('trace')
 endfunc
 
 
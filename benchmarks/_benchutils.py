@@ -0,0 +1,146 @@
+"""
+Shared helpers for the vimtk benchmark scripts.
+
+Each benchmark script measures a set of named cases, writes the measurements
+to a JSON file, and compares them against a stored baseline. A case fails
+when it is slower than ``tolerance`` times its baseline (plus a small absolute
+slack so that microsecond-level noise does not cause failures).
+"""
+import json
+import os
+import platform
+import sys
+import time
+
+
+def timeit(func, repeat=5, setup=None, teardown=None):
+    """
+    Times a function several times and returns summary statistics.
+
+    Args:
+        func (Callable): function to time
+        repeat (int): number of timed calls
+        setup (Callable | None): untimed function called before each call
+        teardown (Callable | None): untimed function called after each call
+
+    Returns:
+        Dict[str, float]: min, mean, and max duration in seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+        if teardown is not None:
+            teardown()
+    return {
+        'min': min(durations),
+        'mean': sum(durations) / len(durations),
+        'max': max(durations),
+        'repeat': repeat,
+    }
+
+
+def environment_info():
+    return {
+        'python': sys.version.split(' ')[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def write_results(fpath, results):
+    data = {
+        'environment': environment_info(),
+        'results': results,
+    }
+    with open(fpath, 'w') as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+    print('Wrote {}'.format(fpath))
+
+
+def load_results(fpath):
+    with open(fpath, 'r') as file:
+        data = json.load(file)
+    return data['results']
+
+
+def compare_to_baseline(results, baseline, tolerance=1.5, slack=1e-4):
+    """
+    Finds cases that regressed relative to the baseline. Cases that record
+    a ``spawns`` count also regress when they spawn more processes.
+
+    Args:
+        results (Dict[str, Dict]): new measurements keyed by case name
+        baseline (Dict[str, Dict]): stored measurements keyed by case name
+        tolerance (float): allowed slowdown factor
+        slack (float): allowed absolute slowdown in seconds
+
+    Returns:
+        List[str]: a description of each regression
+    """
+    regressions = []
+    for key, measure in sorted(results.items()):
+        if key not in baseline:
+            continue
+        new = measure['min']
+        old = baseline[key]['min']
+        limit = old * tolerance + slack
+        if new > limit:
+            regressions.append(
+                '{}: {:.6f}s > {:.6f}s (baseline {:.6f}s x {})'.format(
+                    key, new, limit, old, tolerance))
+        if measure.get('spawns', 0) > baseline[key].get('spawns', float('inf')):
+            regressions.append('{}: {} spawns > {} spawns'.format(
+                key, measure['spawns'], baseline[key]['spawns']))
+    return regressions
+
+
+def add_common_args(parser, default_baseline):
+    parser.add_argument('--out', default=None,
+                        help='where to write the JSON results')
+    parser.add_argument('--baseline', default=default_baseline,
+                        help='stored baseline to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='allowed slowdown factor relative to the baseline')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='overwrite the baseline with the new results')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timed calls per case')
+
+
+def finalize(args, results):
+    """
+    Writes results, updates or checks the baseline, and returns an exit code.
+    """
+    if args.out is not None:
+        write_results(args.out, results)
+
+    if args.update_baseline:
+        write_results(args.baseline, results)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}. Run with --update-baseline to create one'.format(
+            args.baseline))
+        return 0
+
+    baseline = load_results(args.baseline)
+    regressions = compare_to_baseline(results, baseline,
+                                      tolerance=args.tolerance)
+    if regressions:
+        print('Regressions relative to {}:'.format(args.baseline))
+        for line in regressions:
+            print('  ' + line)
+        return 1
+    print('No regressions relative to {}'.format(args.baseline))
+    return 0
+
+
+def print_table(results):
+    width = max(len(k) for k in results) if results else 0
+    for key, measure in sorted(results.items()):
+        print('{}  {:>12.3f} ms'.format(key.ljust(width), measure['min'] * 1e3))
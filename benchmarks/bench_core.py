@@ -0,0 +1,214 @@
+"""
+Latency benchmarks for the per-keypress vimtk commands.
+
+The commands run against :func:`vimtk.mockvim` buffers with synthetic content
+of 1k, 100k, and 1M lines, so the measurements include the buffer access
+patterns of each command, but not the cost of the real vim bridge.
+
+CommandLine:
+    # Run and compare against the stored baseline (non-zero exit on regression)
+    python benchmarks/bench_core.py
+
+    # Write the measurements somewhere
+    python benchmarks/bench_core.py --out bench_core.json
+
+    # Accept the current measurements as the new baseline
+    python benchmarks/bench_core.py --update-baseline
+
+    # Quick run on small buffers only
+    python benchmarks/bench_core.py --sizes 1000 --repeat 2
+"""
+import argparse
+import os
+import sys
+from os.path import dirname, join
+
+sys.path.insert(0, dirname(dirname(os.path.abspath(__file__))))
+sys.path.insert(0, dirname(os.path.abspath(__file__)))
+
+import _benchutils  # NOQA
+
+DEFAULT_BASELINE = join(dirname(os.path.abspath(__file__)), 'baseline_core.json')
+DEFAULT_SIZES = [1000, 100000, 1000000]
+
+
+HEADER_LINES = [
+    '"""',
+    'Synthetic module used by the vimtk benchmarks',
+    '"""',
+    'from __future__ import annotations',
+    'import os',
+    'import sys',
+    '',
+]
+
+BLOCK_LINES = [
+    'class Widget{i}(object):',
+    '    def __init__(self, value):',
+    '        self.value = value',
+    '        self.other_value = value + {i}',
+    '',
+    '    def compute(self, data):',
+    '        result = [self.value * x for x in data]',
+    '        return sum(result)',
+    '',
+    '# Far out in the uncharted backwaters of the unfashionable end of the',
+    '# western spiral arm of the Galaxy lies a small unregarded yellow sun.',
+    '# Orbiting this at a distance of roughly ninety-two million miles is an',
+    '# utterly insignificant little blue green planet.',
+    '',
+    'def helper_{i}(arg):',
+    '    return arg.attribute.method()',
+    '',
+]
+
+DOCTEST_LINES = [
+    '>>> import vimtk',
+    '>>> widget = Widget0(1)',
+    '>>> for x in range(3):',
+    '...     print(widget.compute([x]))',
+]
+
+PARAGRAPH = '\n'.join([
+    'Far out in the uncharted backwaters of the unfashionable end of the',
+    'western spiral arm of the Galaxy lies a small unregarded yellow sun.',
+    'Orbiting this at a distance of roughly ninety-two million miles is an',
+    'utterly insignificant little blue green planet whose ape-descended life',
+    'forms are so amazingly primitive that they still think digital watches',
+    'are a pretty neat idea. one. two three. four.',
+])
+
+
+def synthetic_lines(num_lines):
+    """
+    Builds a python-like buffer with exactly ``num_lines`` lines
+    """
+    lines = list(HEADER_LINES)
+    i = 0
+    while len(lines) < num_lines:
+        lines.extend(line.format(i=i) for line in BLOCK_LINES)
+        i += 1
+    return lines[:num_lines]
+
+
+def middle_row(lines, startswith):
+    """
+    Finds the first 1-based row in the second half of the buffer that starts
+    with a prefix.
+    """
+    start = len(lines) // 2
+    for idx in range(start, len(lines)):
+        if lines[idx].startswith(startswith):
+            return idx + 1
+    for idx in range(start, -1, -1):
+        if lines[idx].startswith(startswith):
+            return idx + 1
+    raise ValueError(startswith)
+
+
+def build_cases(vim, lines):
+    """
+    Returns a dictionary of case names to (func, setup, teardown) tuples that
+    operate on the mocked vim buffer.
+    """
+    import vimtk
+    from vimtk import _dirty
+
+    buf = vim.current.buffer
+    word_row = middle_row(lines, '        self.value = value')
+    func_row = middle_row(lines, '        return sum(result)')
+    par_row = middle_row(lines, '# western spiral')
+
+    def move(row, col=0):
+        def _move():
+            vim.move_cursor(row, col)
+        return _move
+
+    inserted = []
+
+    def insert():
+        vimtk.TextInsertor.insert_under_cursor('print(x)')
+        inserted.append(word_row)
+
+    def undo_insert():
+        while inserted:
+            del buf[inserted.pop()]
+
+    num_doctest = min(len(lines), 100000)
+    doctest_text = '\n'.join(
+        ('    ' + DOCTEST_LINES[i % len(DOCTEST_LINES)])
+        for i in range(num_doctest))
+
+    paragraph_text = '\n\n'.join([PARAGRAPH] * max(1, len(lines) // 1000))
+
+    cases = {
+        'TextSelector.word_at_cursor': (
+            lambda: vimtk.TextSelector.word_at_cursor(),
+            move(word_row, 14), None),
+        'TextSelector.paragraph_range_at_cursor': (
+            lambda: vimtk.TextSelector.paragraph_range_at_cursor(),
+            move(par_row), None),
+        'TextInsertor.insert_under_cursor': (
+            insert, move(word_row), undo_insert),
+        'Python.find_func_above_row': (
+            lambda: vimtk.Python.find_func_above_row(),
+            move(func_row), None),
+        'Python.find_import_row': (
+            lambda: vimtk.Python.find_import_row(),
+            None, None),
+        'preprocess_executable_text': (
+            lambda: vimtk.preprocess_executable_text(doctest_text),
+            None, None),
+        '_dirty.format_multiple_paragraph_sentences': (
+            lambda: _dirty.format_multiple_paragraph_sentences(paragraph_text),
+            None, None),
+        '_dirty.format_single_paragraph_sentences': (
+            lambda: _dirty.format_single_paragraph_sentences(PARAGRAPH),
+            None, None),
+    }
+    # Text processing cases do not depend on the buffer beyond a point, so
+    # cap the sizes they run at to keep the suite fast.
+    max_sizes = {
+        'preprocess_executable_text': 100000,
+        '_dirty.format_multiple_paragraph_sentences': 100000,
+        '_dirty.format_single_paragraph_sentences': 1000,
+    }
+    return cases, max_sizes
+
+
+def run(sizes, repeat=5, include=None):
+    import vimtk
+    results = {}
+    for size in sizes:
+        lines = synthetic_lines(size)
+        vim = vimtk.mockvim(fpath='synthetic.py', text='')
+        vim.current.buffer._lines = list(lines)
+        cases, max_sizes = build_cases(vim, lines)
+        for name, (func, setup, teardown) in cases.items():
+            if include is not None and not any(pat in name for pat in include):
+                continue
+            if size > max_sizes.get(name, size):
+                continue
+            key = '{}@{}'.format(name, size)
+            results[key] = _benchutils.timeit(
+                func, repeat=repeat, setup=setup, teardown=teardown)
+            print('{:<60} {:>12.3f} ms'.format(key, results[key]['min'] * 1e3))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    _benchutils.add_common_args(parser, DEFAULT_BASELINE)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated buffer sizes in lines')
+    parser.add_argument('--include', default=None,
+                        help='comma separated substrings of case names to run')
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',')]
+    include = args.include.split(',') if args.include else None
+    results = run(sizes, repeat=args.repeat, include=include)
+    return _benchutils.finalize(args, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
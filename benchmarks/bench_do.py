@@ -0,0 +1,140 @@
+"""
+Measures the end-to-end latency of :func:`vimtk.xctrl.XCtrl.do` scripts when
+each step spawns its own process versus when the script is compiled into
+chained ``xdotool`` invocations.
+
+Stub ``xdotool``, ``xset``, ``xprop`` and ``wmctrl`` executables that print
+canned output are put first on the PATH, so the measurements only include
+window resolution and process creation, and the benchmark runs without an X
+server. The scripts run without sleeps between steps (the stub ignores
+chained ``sleep`` commands), and the fixed settle sleep at the start of
+:func:`XCtrl.do` is excluded.
+
+CommandLine:
+    # 20 runs of each script, compared against the stored baseline
+    python benchmarks/bench_do.py
+
+    # Accept the current measurements as the new baseline
+    python benchmarks/bench_do.py --update-baseline
+
+    # Quick run
+    python benchmarks/bench_do.py --runs 5 --repeat 1
+"""
+import argparse
+import os
+import sys
+import tempfile
+from os.path import dirname, join
+
+sys.path.insert(0, dirname(dirname(os.path.abspath(__file__))))
+sys.path.insert(0, dirname(os.path.abspath(__file__)))
+
+import _benchutils  # NOQA
+
+DEFAULT_BASELINE = join(dirname(os.path.abspath(__file__)), 'baseline_do.json')
+
+STUBS = {
+    'xdotool': [
+        '#!/bin/sh',
+        'echo 62914567',
+    ],
+    'xset': [
+        '#!/bin/sh',
+    ],
+    'xprop': [
+        '#!/bin/sh',
+        'echo "_NET_CLIENT_LIST_STACKING(WINDOW): window id # 0x03c00007, 0x04200003"',
+        'echo "_NET_CURRENT_DESKTOP(CARDINAL) = 0"',
+    ],
+    'wmctrl': [
+        '#!/bin/sh',
+        'echo "0x03c00007  0 4051   gvim.Gvim             host a.py (~) - GVIM"',
+        'echo "0x04200003  0 4100   gnome-terminal-server.Gnome-terminal  host bash"',
+    ],
+}
+
+SCRIPTS = {
+    # The steps of XCtrl.copy_gvim_to_terminal_script for multiline text
+    'copy_gvim_to_terminal': [
+        ('remember_window_id', 'ACTIVE_WIN'),
+        ('focus', 'Gnome-terminal'),
+        ('key', 'ctrl+shift+v'),
+        ('key', 'KP_Enter'),
+        ('key', 'KP_Enter'),
+        ('focus_id', '$ACTIVE_WIN'),
+    ],
+    # The steps of XCtrl.current_gvim_edit
+    'current_gvim_edit': [
+        ('focus', 'gvim'),
+        ('key', 'Escape'),
+        ('type2', ';e ~/.bashrc'),
+        ('key', 'KP_Enter'),
+    ],
+}
+
+
+def install_stubs(dpath):
+    """
+    Writes the stub executables into ``dpath`` and puts it first on the PATH
+    """
+    for name, lines in STUBS.items():
+        fpath = join(dpath, name)
+        with open(fpath, 'w') as file:
+            file.write('\n'.join(lines + ['']))
+        os.chmod(fpath, 0o755)
+    os.environ['PATH'] = dpath + os.pathsep + os.environ['PATH']
+    # Use the command line backend even when python-xlib is installed
+    os.environ.pop('DISPLAY', None)
+
+
+def build_cases(num_runs):
+    from vimtk.xctrl import XCtrl
+
+    def make_case(script, chain):
+        def case():
+            for _ in range(num_runs):
+                steps = XCtrl.compile_do(*script, chain=chain)
+                XCtrl.run_compiled(steps)
+        return case
+
+    cases = {}
+    for name, script in SCRIPTS.items():
+        cases['{} per step'.format(name)] = make_case(script, chain=False)
+        cases['{} chained'.format(name)] = make_case(script, chain=True)
+    return cases
+
+
+def run(num_runs, repeat):
+    from vimtk import runner
+    results = {}
+    with tempfile.TemporaryDirectory() as dpath:
+        install_stubs(dpath)
+        runner.clear_which_cache()
+        cases = build_cases(num_runs)
+        for name, func in cases.items():
+            key = '{} x{}'.format(name, num_runs)
+            results[key] = _benchutils.timeit(func, repeat=repeat)
+            print('{:<45} {:>12.3f} ms  ({:.3f} ms per script)'.format(
+                key, results[key]['min'] * 1e3,
+                results[key]['min'] * 1e3 / num_runs))
+    for name in SCRIPTS:
+        old = results['{} per step x{}'.format(name, num_runs)]
+        new = results['{} chained x{}'.format(name, num_runs)]
+        print('{} speedup from chaining: {:.2f}x'.format(
+            name, old['min'] / new['min']))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    _benchutils.add_common_args(parser, DEFAULT_BASELINE)
+    parser.add_argument('--runs', type=int, default=20,
+                        help='number of script runs per timed call')
+    parser.set_defaults(repeat=3)
+    args = parser.parse_args(argv)
+    results = run(args.runs, repeat=args.repeat)
+    return _benchutils.finalize(args, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Compares the cost of spawning the X11 helper programs through
+:func:`vimtk.runner.run` against the previous :func:`ubelt.cmd` path.
+
+A stub ``xdotool`` executable that prints a window id is put first on the
+PATH, so the measurements only include process creation and output capture,
+and the benchmark runs without an X server.
+
+CommandLine:
+    # 1000 calls per case, compared against the stored baseline
+    python benchmarks/bench_runner.py
+
+    # Accept the current measurements as the new baseline
+    python benchmarks/bench_runner.py --update-baseline
+
+    # Quick run
+    python benchmarks/bench_runner.py --calls 100 --repeat 1
+"""
+import argparse
+import os
+import sys
+import tempfile
+from os.path import dirname, join
+
+sys.path.insert(0, dirname(dirname(os.path.abspath(__file__))))
+sys.path.insert(0, dirname(os.path.abspath(__file__)))
+
+import _benchutils  # NOQA
+
+DEFAULT_BASELINE = join(dirname(os.path.abspath(__file__)), 'baseline_runner.json')
+
+STUB_XDOTOOL = '\n'.join([
+    '#!/bin/sh',
+    'echo 62914566',
+    '',
+])
+
+
+def install_stub(dpath):
+    """
+    Writes a stub xdotool into ``dpath`` and puts it first on the PATH
+    """
+    fpath = join(dpath, 'xdotool')
+    with open(fpath, 'w') as file:
+        file.write(STUB_XDOTOOL)
+    os.chmod(fpath, 0o755)
+    os.environ['PATH'] = dpath + os.pathsep + os.environ['PATH']
+    return fpath
+
+
+def build_cases(num_calls):
+    import ubelt as ub
+    from vimtk import runner
+
+    def ubelt_cmd():
+        for _ in range(num_calls):
+            info = ub.cmd('xdotool getwindowfocus')
+            assert info['out'].strip() == '62914566'
+
+    def runner_run():
+        for _ in range(num_calls):
+            info = runner.run(['xdotool', 'getwindowfocus'])
+            assert info['out'].strip() == '62914566'
+
+    return {
+        'ubelt.cmd': ubelt_cmd,
+        'runner.run': runner_run,
+    }
+
+
+def run(num_calls, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as dpath:
+        install_stub(dpath)
+        cases = build_cases(num_calls)
+        for name, func in cases.items():
+            key = '{} xdotool getwindowfocus x{}'.format(name, num_calls)
+            results[key] = _benchutils.timeit(func, repeat=repeat)
+            print('{:<50} {:>12.3f} ms  ({:.3f} ms per call)'.format(
+                key, results[key]['min'] * 1e3,
+                results[key]['min'] * 1e3 / num_calls))
+    keys = sorted(results)
+    old = [k for k in keys if k.startswith('ubelt.cmd')][0]
+    new = [k for k in keys if k.startswith('runner.run')][0]
+    print('runner.run speedup over ubelt.cmd: {:.2f}x'.format(
+        results[old]['min'] / results[new]['min']))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    _benchutils.add_common_args(parser, DEFAULT_BASELINE)
+    parser.add_argument('--calls', type=int, default=1000,
+                        help='number of spawns per timed call')
+    parser.set_defaults(repeat=3)
+    args = parser.parse_args(argv)
+    results = run(args.calls, repeat=args.repeat)
+    return _benchutils.finalize(args, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
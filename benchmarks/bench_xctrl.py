@@ -0,0 +1,97 @@
+"""
+Measures the latency and the number of spawned processes of common
+:mod:`vimtk.xctrl` operations against the fake window manager in
+:mod:`vimtk._demo.fakewm`, so the benchmark runs without an X server.
+
+The stand-ins are python scripts, so each spawn costs more than a real
+``xdotool`` would. Compare the spawn counts as well as the timings. Use
+``--latency`` to model a slow window manager.
+
+CommandLine:
+    # Compare against the stored baseline
+    python benchmarks/bench_xctrl.py
+
+    # Accept the current measurements as the new baseline
+    python benchmarks/bench_xctrl.py --update-baseline
+
+    # Every stand-in call takes 5ms longer
+    python benchmarks/bench_xctrl.py --latency 0.005
+"""
+import argparse
+import os
+import sys
+from os.path import dirname, join
+
+sys.path.insert(0, dirname(dirname(os.path.abspath(__file__))))
+sys.path.insert(0, dirname(os.path.abspath(__file__)))
+
+import _benchutils  # NOQA
+
+DEFAULT_BASELINE = join(dirname(os.path.abspath(__file__)), 'baseline_xctrl.json')
+
+
+def build_cases(wm, ids):
+    from vimtk import core, xctrl
+
+    def cold_table():
+        xctrl.reset_backend()
+
+    def activate_gvim():
+        wm.activate(ids['gvim'])
+
+    cases = {
+        # name: (func, setup)
+        'windows_in_order cold': (
+            lambda: list(xctrl.windows_in_order()), cold_table),
+        'windows_in_order warm': (
+            lambda: list(xctrl.windows_in_order()), None),
+        'find_window_id warm': (
+            lambda: xctrl.XCtrl.find_window_id('Gnome-terminal'), None),
+        'XWindow.focus sync': (
+            lambda: xctrl.XWindow(ids['term']).focus(sync=True),
+            activate_gvim),
+        'execute_text_in_terminal': (
+            lambda: core.execute_text_in_terminal('print(1)'), activate_gvim),
+    }
+    return cases
+
+
+def run(repeat, latency):
+    from vimtk._demo.fakewm import FakeWM
+    results = {}
+    with FakeWM(latency=latency) as wm:
+        ids = {
+            'gvim': wm.add_window('gvim.Gvim', 'a.py (~) - GVIM'),
+            'term': wm.add_window('gnome-terminal-server.Gnome-terminal', 'bash'),
+            'browser': wm.add_window('Navigator.firefox', 'Mozilla Firefox'),
+        }
+        wm.activate(ids['gvim'])
+        for name, (func, setup) in build_cases(wm, ids).items():
+            # Warm up, then count the spawns of a single call
+            if setup is not None:
+                setup()
+            func()
+            if setup is not None:
+                setup()
+            wm.clear_calls()
+            func()
+            spawns = sum(wm.spawn_counts().values())
+            results[name] = _benchutils.timeit(func, repeat=repeat, setup=setup)
+            results[name]['spawns'] = spawns
+            print('{:<30} {:>10.3f} ms  {:>3} spawns'.format(
+                name, results[name]['min'] * 1e3, spawns))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    _benchutils.add_common_args(parser, DEFAULT_BASELINE)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds each stand-in call sleeps')
+    args = parser.parse_args(argv)
+    results = run(args.repeat, latency=args.latency)
+    return _benchutils.finalize(args, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -97,6 +97,20 @@ endfunction
 " Define top-level API commands
 "command! AutoImport call vimtk#insert_auto_import()
 
+" Counters for vim bridge calls and process spawns (see vimtk/stats.py)
+command! -nargs=? -complete=customlist,s:vimtk_stats_complete VimtkStats call vimtk#stats(<f-args>)
+
+func! s:vimtk_stats_complete(arglead, cmdline, cursorpos)
+  return filter(['report', 'on', 'off', 'reset'], 'v:val =~# "^" . a:arglead')
+endfunc
+
+" Timing spans with Chrome trace export (see vimtk/tracing.py)
+command! -nargs=* -complete=customlist,s:vimtk_trace_complete VimtkTrace call vimtk#trace(<f-args>)
+
+func! s:vimtk_trace_complete(arglead, cmdline, cursorpos)
+  return filter(['dump', 'on', 'off', 'clear'], 'v:val =~# "^" . a:arglead')
+endfunc
+
 
 " We may want to discourage this in favor of explicitly defining the mappings.
 " Not sure.
@@ -118,6 +132,29 @@ sys.path.insert(0, vimtk_repodir)
 ENDPYTHON
 
 
+" The python side keeps a snapshot of all g:vimtk_* variables (see
+" vimtk.core.Config). Every vimtk command starts with a fresh one, and it is
+" also dropped whenever a command line or a sourced script might have changed
+" one of them, for code that reads it outside of a command (timers).
+func! s:vimtk_invalidate_config()
+python3 << ENDPYTHON
+import sys
+if 'vimtk.core' in sys.modules:
+    sys.modules['vimtk.core'].CONFIG.invalidate()
+ENDPYTHON
+endfunc
+
+augroup vimtk_config
+  autocmd!
+  if exists('##CmdlineLeave')
+    autocmd CmdlineLeave : if getcmdline() =~# 'vimtk_' | call s:vimtk_invalidate_config() | endif
+  endif
+  if exists('##SourcePost')
+    autocmd SourcePost * call s:vimtk_invalidate_config()
+  endif
+augroup END
+
+
 func! QUICKOPEN_leader_tvio(...)
     " TODO: remove for plugin
     " Maps <leader>t<key> to tab open a filename
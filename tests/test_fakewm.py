@@ -0,0 +1,482 @@
+"""
+Exercises :mod:`vimtk.xctrl` against the fake window manager in
+:mod:`vimtk._demo.fakewm`, so no X server is needed.
+"""
+import sys
+
+import pytest
+
+if not sys.platform.startswith('linux'):
+    pytest.skip('the fake window manager needs fcntl', allow_module_level=True)
+
+
+def _demo_wm(**kwargs):
+    from vimtk._demo.fakewm import FakeWM
+    wm = FakeWM(**kwargs)
+    ids = {
+        'gvim': wm.add_window('gvim.Gvim', 'a.py (~/code) - GVIM'),
+        'term2': wm.add_window('gnome-terminal-server.Gnome-terminal',
+                               'htop', desktop=1),
+        'term': wm.add_window('gnome-terminal-server.Gnome-terminal', 'bash'),
+        'browser': wm.add_window('Navigator.firefox', 'Mozilla Firefox'),
+    }
+    wm.activate(ids['gvim'])
+    return wm, ids
+
+
+def test_windows_in_order_follows_stacking():
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        wm.activate(ids['term'])
+        order = [win.wm_id for win in xctrl.windows_in_order()]
+        # most recently used first
+        assert order == list(reversed(wm.stacking))
+        assert order[:2] == [ids['term'], ids['gvim']]
+        assert xctrl.XWindow.current().wm_id == ids['term']
+        titles = {win.wm_id: win.title() for win in xctrl.windows_in_order()}
+        assert titles[ids['browser']] == 'Mozilla Firefox'
+
+
+def test_titles_keep_their_spaces():
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    title = 'make  -j4   all '
+    wm_id = wm.add_window('xterm.XTerm', title)
+    with wm:
+        assert xctrl.wmctrl_list()[wm_id]['title'] == title
+        assert xctrl.XCtrl.findall_window_ids('-j4   all') == [wm_id]
+        assert xctrl.XWindow(wm_id).title() == title
+
+
+def test_window_table_reuses_snapshot_until_change():
+    import time
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        assert xctrl.XCtrl.find_window_id('firefox') == ids['browser']
+        wm.clear_calls()
+        for _ in range(5):
+            assert xctrl.XWindow.find_query('class~firefox').wm_id == ids['browser']
+        # The xprop spy reports no change, so nothing is spawned
+        assert wm.spawn_counts() == {}
+        # Line patterns include the title, which is read again
+        assert xctrl.XCtrl.find_window_id('firefox') == ids['browser']
+        assert wm.spawn_counts() == {'wmctrl': 1}
+        wm.clear_calls()
+        wm.activate(ids['browser'])
+        # The spy polls the fake every 10ms
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            top = next(xctrl.windows_in_order())
+            if top.wm_id == ids['browser']:
+                break
+            time.sleep(0.01)
+        assert top.wm_id == ids['browser']
+        # A restack is applied from the spy output without a new query
+        assert wm.spawn_counts() == {}
+        wm.add_window('xterm.XTerm', 'new')
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and not wm.spawn_counts():
+            xctrl.window_table().snapshot()
+            time.sleep(0.01)
+        assert wm.spawn_counts() == {'wmctrl': 1, 'xprop': 1}
+
+
+def test_mru_follows_focus_not_stacking():
+    import time
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        # Start tracking before the user switches windows
+        xctrl.window_table().snapshot()
+        wm.activate(ids['term2'])
+        wm.activate(ids['term'])
+        wm.activate(ids['gvim'])
+        # A new terminal is mapped on top of the stack without the focus
+        new_term = wm.add_window('gnome-terminal-server.Gnome-terminal', 'new')
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            snapshot = xctrl.window_table().snapshot()
+            if new_term in snapshot.records and snapshot.focus[:1] == (ids['gvim'],):
+                break
+            time.sleep(0.01)
+        assert snapshot.stacking[-1] == new_term
+        wm.clear_calls()
+        terms = xctrl.query_windows('class~Gnome-terminal')
+        assert terms[0].wm_id == ids['term']
+        assert xctrl.XCtrl.sorted_window_ids()[:3] == [
+            ids['gvim'], ids['term'], ids['term2']]
+        assert wm.spawn_counts() == {}
+
+
+def test_query_desktop_and_focus():
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        found = [w.wm_id for w in xctrl.query_windows(
+            'class~Gnome-terminal & desktop=current')]
+        assert found == [ids['term']]
+        win = xctrl.XWindow(ids['term2'])
+        assert win.focus(sync=True)
+        assert wm.active == ids['term2']
+        assert wm.current_desktop == 1
+        assert wm.calls('xdotool')[-1] == [
+            'xdotool', 'windowactivate', '--sync', str(ids['term2'])]
+
+
+def test_apply_layout_batches_wmctrl_calls():
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        wm.update_window(ids['gvim'], maximized=True)
+        xctrl.window_table().snapshot()
+        wm.clear_calls()
+        applied = xctrl.apply_layout({
+            'class~(?i)gvim': (0, 0, 640, 480),
+            'class~firefox': (640, 0, 640, 480),
+            'class~nothing': (0, 0, 1, 1),
+        })
+        assert applied == {
+            'class~(?i)gvim': ids['gvim'],
+            'class~firefox': ids['browser'],
+            'class~nothing': None,
+        }
+        assert wm.window(ids['gvim'])['geometry'] == [0, 0, 640, 480]
+        assert wm.window(ids['browser'])['geometry'] == [640, 0, 640, 480]
+        assert not wm.window(ids['gvim'])['maximized']
+        # One wmctrl call to unmaximize and one to move each window
+        assert wm.spawn_counts() == {'wmctrl': 4}
+
+
+def test_apply_layout_reports_each_failed_window(caplog):
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        missing = 0x7fff0001
+        with caplog.at_level('WARNING', logger='vimtk.xctrl'):
+            xctrl._move_resize_windows({
+                missing: (0, 0, 1, 1),
+                ids['gvim']: (0, 0, 640, 480),
+            }, unmaximize=False)
+        assert wm.window(ids['gvim'])['geometry'] == [0, 0, 640, 480]
+        # The failure is reported even though a later call succeeded
+        assert '0x7fff0001' in caplog.text
+
+
+def test_compiled_do_chains_xdotool():
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        xctrl.window_table().snapshot()
+        wm.clear_calls()
+        xctrl.XCtrl.do(
+            ('remember_window_id', 'ACTIVE_WIN'),
+            ('focus', 'Gnome-terminal'),
+            ('key', 'ctrl+shift+v'),
+            ('key', 'KP_Enter'),
+            ('focus_id', '$ACTIVE_WIN'),
+        )
+        assert wm.active == ids['gvim']
+        assert [entry[1:] for entry in wm.input] == [
+            ['paste', ''], ['key', 'KP_Enter']]
+        assert all(entry[0] == ids['term'] for entry in wm.input)
+        counts = wm.spawn_counts()
+        assert counts['xset'] == 2
+        assert counts['xdotool'] <= 2
+
+
+def test_execute_text_in_terminal():
+    from vimtk import core
+    wm, ids = _demo_wm()
+    with wm:
+        core.execute_text_in_terminal('print("hello")\nprint("world")')
+        assert wm.active == ids['gvim']
+        assert wm.autorepeat
+        assert wm.clipboard == 'print("hello")\nprint("world")'
+        pasted = [e for e in wm.input if e[1] == 'paste']
+        assert pasted == [[ids['term'], 'paste', wm.clipboard]]
+        enters = [e for e in wm.input if e[1:] == ['key', 'KP_Enter']]
+        # One after the paste, then vimtk_multiline_num_press_enter more
+        assert len(enters) == 4
+        assert all(e[0] == ids['term'] for e in wm.input)
+        counts = wm.spawn_counts()
+        assert counts['xclip'] == 1
+        assert counts['xset'] == 2
+        # Window lookups are served by the window table
+        assert counts['wmctrl'] == 1
+
+
+def test_latency_is_applied():
+    import time
+    from vimtk import xctrl
+    wm, ids = _demo_wm(latency={'xdotool': 0.1})
+    with wm:
+        start = time.perf_counter()
+        xctrl.XCtrl.current_window_id()
+        assert time.perf_counter() - start >= 0.1
+
+
+def test_tmux_backend_leaves_clipboard_and_focus_alone():
+    import os
+    import sys
+    import vimtk
+    from vimtk import terminal_backend
+    wm, ids = _demo_wm()
+    text = 'for i in range(3):\n    print(i)\n'
+    with wm:
+        vim = vimtk.mockvim()
+        try:
+            vim.eval("let g:vimtk_terminal_backend = 'tmux'")
+            vim.eval("let g:vimtk_tmux_target = 'work:1.0'")
+            vimtk.CONFIG.invalidate()
+            vimtk.execute_text_in_terminal(text)
+        finally:
+            sys.modules.pop('vim', None)
+            vimtk.CONFIG.invalidate()
+        # One tmux process, nothing else
+        assert wm.spawn_counts() == {'tmux': 1}
+        argv = wm.calls('tmux')[0]
+        # The text is streamed through stdin, not passed on the argv
+        assert text.strip() not in ' '.join(argv)
+        assert wm.input == [
+            ['tmux:work:1.0', 'paste', text.rstrip()],
+            ['tmux:work:1.0', 'key', 'Enter'],
+            ['tmux:work:1.0', 'key', 'Enter'],
+        ]
+        assert wm.clipboard == ''
+        assert wm.active == ids['gvim']
+        assert wm.state['tmux_buffers'] == {}
+
+        # Without a configured target inside tmux, paste into the last pane
+        environ = os.environ.copy()
+        os.environ['TMUX'] = '/tmp/tmux-1000/default,1,0'
+        try:
+            wm.clear_input()
+            terminal_backend.get('tmux').send('x = 1')
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+        assert wm.input == [['tmux:{last}', 'paste', 'x = 1'],
+                            ['tmux:{last}', 'key', 'Enter']]
+
+
+def test_large_selection_is_streamed_in_chunks():
+    import sys
+    import vimtk
+    from vimtk import commands
+    wm, ids = _demo_wm()
+    lines = []
+    for i in range(3000):
+        if i % 500 == 0:
+            lines += ['def f{}(x):'.format(i), '', '    return x']
+        lines.append('data.append({{"id": {}, "name": "row{}"}})'.format(i, i))
+    with wm:
+        vim = vimtk.mockvim(text='\n'.join(lines))
+        try:
+            vim.eval("let g:vimtk_terminal_backend = 'tmux'")
+            vim.eval("let g:vimtk_stream_min_lines = 2000")
+            vim.eval("let g:vimtk_stream_chunk_size = 8192")
+            vimtk.CONFIG.invalidate()
+            vim.current.buffer._visual_select(1, len(lines))
+            commands.execute_text_in_terminal('V')
+            messages = vim._messages
+        finally:
+            sys.modules.pop('vim', None)
+            vimtk.CONFIG.invalidate()
+        pastes = [e[2] for e in wm.input if e[1] == 'paste']
+        assert len(pastes) > 10
+        assert wm.spawn_counts() == {'tmux': len(pastes)}
+        assert max(map(len, pastes)) <= 8192
+        # Each chunk ends between statements, and trailing newlines are
+        # pressed as enter instead of pasted
+        assert all(p.startswith(('data', 'def')) for p in pastes)
+        assert '\n'.join(pastes) == '\n'.join(lines)
+        assert messages[-1] == 'redraw | echo "vimtk: sent {0} / {0} lines"'.format(len(lines))
+
+
+def test_large_selection_is_sent_at_once_by_default():
+    import sys
+    import vimtk
+    from vimtk import commands
+    wm, ids = _demo_wm()
+    lines = ['data.append({})'.format(i) for i in range(3000)]
+    with wm:
+        vim = vimtk.mockvim(text='\n'.join(lines))
+        try:
+            vim.eval("let g:vimtk_terminal_backend = 'tmux'")
+            vimtk.CONFIG.invalidate()
+            vim.current.buffer._visual_select(1, len(lines))
+            commands.execute_text_in_terminal('V')
+        finally:
+            sys.modules.pop('vim', None)
+            vimtk.CONFIG.invalidate()
+        pastes = [e[2] for e in wm.input if e[1] == 'paste']
+        assert len(pastes) == 1
+
+
+def _pump_until_done():
+    import time
+    from vimtk import aio
+    deadline = time.monotonic() + 10
+    while aio.pump():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_async_sends_are_queued_and_merged():
+    import sys
+    import vimtk
+    from vimtk import commands, send_queue
+    wm, ids = _demo_wm()
+    with wm:
+        vim = vimtk.mockvim(text='x = 1\nfor i in range(x):\n    print(i)\nprint(x)')
+        try:
+            vim.eval("let g:vimtk_terminal_backend = 'tmux'")
+            vim.eval("let g:vimtk_tmux_target = 'work:1.0'")
+            vim.eval("let g:vimtk_async_send = 1")
+            vimtk.CONFIG.invalidate()
+            # Three quick presses return before anything is sent
+            for row in [1, 4, 1]:
+                vim.move_cursor(row)
+                commands.execute_text_in_terminal('n')
+            assert wm.spawn_counts() == {}
+            assert len(send_queue.QUEUE) == 3
+            _pump_until_done()
+            messages = vim._messages
+        finally:
+            sys.modules.pop('vim', None)
+            vimtk.CONFIG.invalidate()
+        # The worker thread used the queued configuration, and the three
+        # texts went out as one paste
+        assert wm.spawn_counts() == {'tmux': 1}
+        assert [e for e in wm.input if e[1] == 'paste'] == [
+            ['tmux:work:1.0', 'paste', 'x = 1\nprint(x)\nx = 1']]
+        assert messages[-1].startswith('echo "vimtk: sent 3 texts in')
+
+
+def test_async_send_failure_is_echoed_as_error():
+    import sys
+    import pytest
+    import vimtk
+    from vimtk import send_queue
+
+    class Broken(object):
+        def send(self, text, return_to_vim=True):
+            raise OSError('pane "work" is gone')
+
+        def wait(self, handle, timeout=None):
+            pass
+
+    vim = vimtk.mockvim()
+    try:
+        future = send_queue.SendQueue().submit('x = 1', backend=Broken())
+        _pump_until_done()
+        messages = vim._messages
+    finally:
+        sys.modules.pop('vim', None)
+        vimtk.CONFIG.invalidate()
+    with pytest.raises(OSError):
+        future.result()
+    assert messages == [
+        'echohl ErrorMsg | echomsg "vimtk send failed: '
+        'OSError(\'pane \\"work\\" is gone\')" | echohl None']
+
+
+def test_async_gui_send_merges_pending_texts():
+    from vimtk import aio, send_queue
+    wm, ids = _demo_wm()
+    with wm:
+        queue = send_queue.SendQueue()
+        first = queue.submit('print(1)')
+        # The first send starts on the next pump, the others queue behind it
+        aio.pump()
+        rest = [queue.submit('print({})'.format(i)) for i in [2, 3]]
+        _pump_until_done()
+        assert first.result() == 1
+        assert [f.result() for f in rest] == [2, 2]
+        pasted = [e for e in wm.input if e[1] == 'paste']
+        assert pasted == [[ids['term'], 'paste', 'print(1)'],
+                          [ids['term'], 'paste', 'print(2)\nprint(3)']]
+        assert wm.active == ids['gvim']
+        assert (queue.num_texts, queue.num_sends) == (3, 2)
+
+
+def test_tmux_output_is_captured_into_scratch_buffer():
+    import sys
+    import vimtk
+    from vimtk import commands
+    wm, ids = _demo_wm()
+    with wm:
+        wm.tmux_print('work:1.0', '>>> ')
+        vim = vimtk.mockvim(text='x = 1\nprint(x)')
+        try:
+            vim.eval("let g:vimtk_terminal_backend = 'tmux'")
+            vim.eval("let g:vimtk_tmux_target = 'work:1.0'")
+            vim.eval("let g:vimtk_capture_output = 1")
+            vim.eval("let g:vimtk_capture_idle_time = 0.2")
+            vimtk.CONFIG.invalidate()
+            vim.move_cursor(2)
+            commands.execute_text_in_terminal('n')
+            # The position of the paste is read in the same tmux call
+            assert wm.spawn_counts() == {'tmux': 1}
+            # The program in the pane answers and shows the next prompt
+            wm.tmux_print('work:1.0', '1\n>>> ')
+            _pump_until_done()
+            buffers = {buf.name: buf for buf in vim.buffers}
+            lines = list(buffers['[vimtk output]'])
+        finally:
+            sys.modules.pop('vim', None)
+            vimtk.CONFIG.invalidate()
+        # The prompt line with the cursor is not complete yet
+        assert wm.tmux_pane('work:1.0')[-3:] == ['>>> print(x)', '1', '>>> ']
+        assert lines[0].startswith('# ') and lines[0].endswith(' print(x)')
+        assert lines[1:] == ['>>> print(x)', '1', '']
+
+
+def test_gui_send_restores_autorepeat_when_no_terminal_is_found():
+    from vimtk import core
+    from vimtk._demo.fakewm import FakeWM
+    with FakeWM() as wm:
+        gvim = wm.add_window('gvim.Gvim', 'a.py (~) - GVIM')
+        wm.activate(gvim)
+        with pytest.raises(Exception):
+            core._execute_text_in_gui_terminal('x = 1')
+        assert wm.autorepeat
+        assert ['xset', 'r', 'off'] in wm.calls('xset')
+
+
+def test_async_gui_send_restores_autorepeat_when_no_terminal_is_found(monkeypatch):
+    import asyncio
+    from vimtk import aio
+
+    async def find_window_id(query=None, pattern=None, method='mru'):
+        raise ValueError('No window matches')
+
+    monkeypatch.setattr(aio.AsyncXCtrl, 'find_window_id', find_window_id)
+    wm, ids = _demo_wm()
+    with wm:
+        with pytest.raises(ValueError):
+            aio.run_sync(aio.execute_text('x = 1'))
+        # Give a step that outlived the failure the time to finish
+        aio.run_sync(asyncio.sleep(0.5))
+        assert wm.autorepeat
+        assert wm.calls('xset')[-1] == ['xset', 'r', 'on']
+
+
+def test_title_changes_are_seen_by_title_lookups():
+    from vimtk import xctrl
+    wm, ids = _demo_wm()
+    with wm:
+        assert xctrl.XWindow(ids['term']).title() == 'bash'
+        assert xctrl.XCtrl.findall_window_ids('ipython') == []
+        # Starting IPython renames the terminal but leaves the client list
+        wm.update_window(ids['term'], title='ipython ~/proj')
+        assert xctrl.XWindow(ids['term']).title() == 'ipython ~/proj'
+        assert xctrl.XCtrl.findall_window_ids('ipython') == [ids['term']]
+        assert [w.wm_id for w in xctrl.find_windows(title='ipython')] == [ids['term']]
+        assert xctrl.XWindow.find_query('title~ipython').wm_id == ids['term']
+        # Lookups by class still use the cached table
+        wm.clear_calls()
+        assert xctrl.XWindow.find_query('class~firefox').wm_id == ids['browser']
+        assert wm.spawn_counts() == {}
@@ -1,2 +1,62 @@
 def test_import():
-    import vimtk
\ No newline at end of file
+    import vimtk
+
+
+def _fresh_import_info(code):
+    """
+    Runs code in a new interpreter and returns the json it prints
+    """
+    import json
+    import subprocess
+    import sys
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(out.decode('utf8').strip().split('\n')[-1])
+
+
+def test_import_is_lazy():
+    """
+    Importing vimtk, or using a pure-vim helper like TextSelector, must not
+    pull in ubelt, pyperclip, or the platform backends.
+    """
+    code = '\n'.join([
+        'import json, sys',
+        'import vimtk',
+        'vimtk.TextSelector',
+        'mods = ["ubelt", "pyperclip", "vimtk.xctrl", "vimtk.cplat", "vimtk.win32_ctrl"]',
+        'print(json.dumps([m for m in mods if m in sys.modules]))',
+    ])
+    loaded = _fresh_import_info(code)
+    assert loaded == [], 'import vimtk eagerly loaded {}'.format(loaded)
+
+
+def test_backends_load_on_first_use():
+    code = '\n'.join([
+        'import json, sys',
+        'import vimtk',
+        'before = "vimtk.cplat" in sys.modules',
+        'vimtk.cplat',
+        'after = "vimtk.cplat" in sys.modules',
+        'print(json.dumps([before, after]))',
+    ])
+    before, after = _fresh_import_info(code)
+    assert not before and after
+
+
+def test_import_time_budget():
+    """
+    ``import vimtk`` happens in every vim session, so keep it cheap.
+    """
+    # The budget is generous to avoid flaky failures on slow CI machines. An
+    # eager import of ubelt and the backends is typically well over this.
+    budget = 0.05
+    code = '\n'.join([
+        'import json, time',
+        'start = time.perf_counter()',
+        'import vimtk',
+        'duration = time.perf_counter() - start',
+        'print(json.dumps(duration))',
+    ])
+    # Take the best of a few runs to reduce noise from a cold disk cache
+    duration = min(_fresh_import_info(code) for _ in range(3))
+    assert duration < budget, (
+        'import vimtk took {:.4f}s, budget is {:.4f}s'.format(duration, budget))
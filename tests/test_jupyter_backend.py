@@ -0,0 +1,107 @@
+"""
+Runs the jupyter terminal backend against a locally started ipykernel, and
+its output capture against a client that plays back scripted messages.
+"""
+import pytest
+
+
+def test_execute_in_local_kernel():
+    pytest.importorskip('jupyter_client')
+    pytest.importorskip('ipykernel')
+    from jupyter_client.manager import start_new_kernel
+    from vimtk import terminal_backend
+    km, kc = start_new_kernel(kernel_name='python3')
+    try:
+        backend = terminal_backend.JupyterBackend(km.connection_file)
+        msg_id = backend.send('x = 40 + 2')
+        client = backend.client()
+        # The request was sent without waiting, wait for it here
+        assert backend.wait(msg_id, timeout=10)['status'] == 'ok'
+        with pytest.raises(Exception):
+            backend.wait(backend.send('1 / 0'), timeout=10)
+        # The client is reused for the next send
+        assert backend.client() is client
+        # The output of a request is read from what the kernel published
+        pieces = list(backend.iter_output(backend.send('print("hi"); x'),
+                                          timeout=10))
+        assert pieces[0] == 'hi\n'
+        assert pieces[-1].endswith(': 42\n')
+        reply = kc.execute_interactive('', user_expressions={'x': 'x'},
+                                       timeout=10)
+        found = reply['content']['user_expressions']['x']['data']['text/plain']
+        assert found == '42'
+    finally:
+        client = terminal_backend._KERNEL_CLIENTS.pop(km.connection_file, None)
+        if client is not None:
+            client.stop_channels()
+        kc.stop_channels()
+        km.shutdown_kernel(now=True)
+
+
+def test_missing_connection_file():
+    pytest.importorskip('jupyter_client')
+    from vimtk import terminal_backend
+    backend = terminal_backend.JupyterBackend('kernel-does-not-exist-*.json')
+    with pytest.raises(OSError):
+        backend.send('x = 1')
+
+
+class _ScriptedClient(object):
+    """
+    Plays back iopub messages, then reports an empty queue
+    """
+
+    def __init__(self, messages, alive=True):
+        self.messages = list(messages)
+        self.alive = alive
+        self.timeouts = []
+
+    def get_iopub_msg(self, timeout=None):
+        import queue
+        self.timeouts.append(timeout)
+        if not self.messages:
+            raise queue.Empty
+        return self.messages.pop(0)
+
+    def is_alive(self):
+        return self.alive
+
+
+def _message(msg_type, parent, **content):
+    return {'msg_type': msg_type, 'parent_header': {'msg_id': parent},
+            'content': content}
+
+
+def test_capture_stops_when_the_kernel_died():
+    from vimtk import terminal_backend
+    backend = terminal_backend.JupyterBackend('unused.json')
+    client = _ScriptedClient([
+        _message('stream', 'other', name='stdout', text='skipped\n'),
+        _message('stream', 'req', name='stdout', text='partial\n'),
+    ], alive=False)
+    backend.client = lambda: client
+    # The idle status never arrives, the capture must still end
+    assert list(backend.iter_output('req')) == ['partial\n']
+    assert None not in client.timeouts
+
+
+def test_capture_stops_when_the_kernel_restarted():
+    from vimtk import terminal_backend
+    backend = terminal_backend.JupyterBackend('unused.json')
+    client = _ScriptedClient([
+        _message('stream', 'req', name='stdout', text='before\n'),
+        _message('status', None, execution_state='starting'),
+        _message('stream', 'req', name='stdout', text='never\n'),
+    ])
+    backend.client = lambda: client
+    assert list(backend.iter_output('req')) == ['before\n']
+
+
+def test_capture_times_out_while_the_kernel_is_alive():
+    import queue
+    from vimtk import terminal_backend
+    backend = terminal_backend.JupyterBackend('unused.json')
+    client = _ScriptedClient([])
+    backend.client = lambda: client
+    with pytest.raises(queue.Empty):
+        list(backend.iter_output('req', timeout=0.5))
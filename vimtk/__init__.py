@@ -3,10 +3,10 @@ The VimTK module
 """
 
 __mkinit__ = """
-python -c "import ubelt._internal as a; a.autogen_init('vimtk', attrs=True)"
+mkinit vimtk --lazy -w
 
 TODO: exclude backends like win32 and xctrl
-mkinit ~/local/vim/vimfiles/bundle/vimtk/vimtk/__init__.py -w
+mkinit ~/local/vim/vimfiles/bundle/vimtk/vimtk/__init__.py --lazy -w
 
 Note:
 
@@ -16,18 +16,120 @@ And make notes in : ~/code/vimtk/CHANGELOG.md
 # flake8: noqa
 __version__ = '0.5.2'
 
+# Used by vimtk.reloader to find modules edited since they were imported
+import time as _time
+_IMPORT_TIME = _time.time()
+
 __submodules__ = ['core']
 
-from vimtk.core import (CONFIG, Clipboard, Config, Cursor, CursorContext, Mode,
-                        Python, TextInsertor, TextSelector, autogen_imports,
-                        ensure_normalmode, execute_text_in_terminal,
-                        extract_url_embeding, find_and_open_path,
-                        find_pattern_above_row, get_current_filetype,
-                        get_current_fpath,
-                        get_first_nonempty_line_after_cursor, get_indentation,
-                        get_minimum_indentation, is_url, logger, mockvim,
-                        open_path, preprocess_executable_text, reload,
-                        reload_vimtk, sys_executable, vim_argv,)
+
+def lazy_import(module_name, submodules, submod_attrs):
+    """
+    Boilerplate to define PEP 562 __getattr__ for lazy import
+    https://www.python.org/dev/peps/pep-0562/
+
+    Nothing (not even vimtk.core) is imported until one of its attributes is
+    accessed. This keeps ``import vimtk`` cheap inside short-lived vim
+    sessions.
+    """
+    import importlib
+    import os
+    name_to_submod = {
+        func: mod for mod, funcs in submod_attrs.items()
+        for func in funcs
+    }
+
+    def __getattr__(name):
+        if name in submodules:
+            attr = importlib.import_module(
+                '{module_name}.{name}'.format(
+                    module_name=module_name, name=name)
+            )
+        elif name in name_to_submod:
+            submodname = name_to_submod[name]
+            module = importlib.import_module(
+                '{module_name}.{submodname}'.format(
+                    module_name=module_name, submodname=submodname)
+            )
+            attr = getattr(module, name)
+        else:
+            raise AttributeError(
+                'No {module_name} attribute {name}'.format(
+                    module_name=module_name, name=name))
+        globals()[name] = attr
+        return attr
+
+    if os.environ.get('EAGER_IMPORT', ''):
+        for name in submodules:
+            __getattr__(name)
+
+        for attrs in submod_attrs.values():
+            for attr in attrs:
+                __getattr__(attr)
+    return __getattr__
+
+
+__getattr__ = lazy_import(
+    __name__,
+    submodules={
+        'aio',
+        'commands',
+        'core',
+        'cplat',
+        'output',
+        'procinfo',
+        'pyinspect',
+        'reloader',
+        'runner',
+        'send_queue',
+        'stats',
+        'streaming',
+        'terminal_backend',
+        'tracing',
+        'util',
+        'win32_ctrl',
+        'window_table',
+        'xctrl',
+        'xlib_backend',
+    },
+    submod_attrs={
+        'core': [
+            'CONFIG',
+            'Clipboard',
+            'Config',
+            'Cursor',
+            'CursorContext',
+            'Mode',
+            'Python',
+            'TextInsertor',
+            'TextSelector',
+            'autogen_imports',
+            'ensure_normalmode',
+            'execute_text_in_terminal',
+            'extract_url_embeding',
+            'find_and_open_path',
+            'find_pattern_above_row',
+            'get_current_filetype',
+            'get_current_fpath',
+            'get_first_nonempty_line_after_cursor',
+            'get_indentation',
+            'get_minimum_indentation',
+            'is_url',
+            'logger',
+            'mockvim',
+            'open_path',
+            'preprocess_executable_text',
+            'reload',
+            'reload_vimtk',
+            'sys_executable',
+            'vim_argv',
+        ],
+    },
+)
+
+
+def __dir__():
+    return __all__
 
 __all__ = ['CONFIG', 'Clipboard', 'Config', 'Cursor', 'CursorContext', 'Mode',
            'Python', 'TextInsertor', 'TextSelector', 'autogen_imports',
@@ -0,0 +1,43 @@
+from vimtk import aio
+from vimtk import commands
+from vimtk import core
+from vimtk import cplat
+from vimtk import output
+from vimtk import procinfo
+from vimtk import pyinspect
+from vimtk import reloader
+from vimtk import runner
+from vimtk import send_queue
+from vimtk import stats
+from vimtk import streaming
+from vimtk import terminal_backend
+from vimtk import tracing
+from vimtk import util
+from vimtk import win32_ctrl
+from vimtk import window_table
+from vimtk import xctrl
+from vimtk import xlib_backend
+
+from vimtk.core import (CONFIG, Clipboard, Config, Cursor, CursorContext, Mode,
+                        Python, TextInsertor, TextSelector, autogen_imports,
+                        ensure_normalmode, execute_text_in_terminal,
+                        extract_url_embeding, find_and_open_path,
+                        find_pattern_above_row, get_current_filetype,
+                        get_current_fpath,
+                        get_first_nonempty_line_after_cursor, get_indentation,
+                        get_minimum_indentation, is_url, logger, mockvim,
+                        open_path, preprocess_executable_text, reload,
+                        reload_vimtk, sys_executable, vim_argv,)
+
+__version__: str
+__submodules__: list
+
+__all__ = ['CONFIG', 'Clipboard', 'Config', 'Cursor', 'CursorContext', 'Mode',
+           'Python', 'TextInsertor', 'TextSelector', 'autogen_imports',
+           'ensure_normalmode', 'execute_text_in_terminal',
+           'extract_url_embeding', 'find_and_open_path',
+           'find_pattern_above_row', 'get_current_filetype',
+           'get_current_fpath', 'get_first_nonempty_line_after_cursor',
+           'get_indentation', 'get_minimum_indentation', 'is_url', 'logger',
+           'mockvim', 'open_path', 'preprocess_executable_text', 'reload',
+           'reload_vimtk', 'sys_executable', 'vim_argv']
@@ -0,0 +1,330 @@
+"""
+A fake window manager for exercising :mod:`vimtk.xctrl` without an X server.
+
+:class:`FakeWM` writes stand-in ``wmctrl``, ``xprop``, ``xdotool``, ``xset``,
+``xclip`` and ``tmux`` executables into a temporary directory and, while it
+is active, puts them first on the PATH. The stand-ins (see :mod:`.standin`)
+read and modify a scriptable window model stored as JSON, sleep for a
+configurable per-program latency and record every call. Tests and benchmarks can then
+check what was typed or pasted into which window, and how many processes an
+operation spawned.
+
+Only the command line backend of :mod:`vimtk.xctrl` is exercised. ``DISPLAY``
+is removed from the environment while the fake is active, so the python-xlib
+backend is never selected.
+
+Example:
+    >>> # xdoctest: +REQUIRES(LINUX)
+    >>> from vimtk._demo.fakewm import FakeWM
+    >>> from vimtk import xctrl
+    >>> with FakeWM() as wm:
+    >>>     gvim = wm.add_window('gvim.Gvim', 'a.py (~) - GVIM')
+    >>>     term = wm.add_window('gnome-terminal-server.Gnome-terminal', 'bash')
+    >>>     wm.activate(gvim)
+    >>>     win = xctrl.XWindow.find_query('class~Gnome-terminal')
+    >>>     assert win.wm_id == term
+    >>>     assert win.focus(sync=True)
+    >>>     xctrl.XCtrl.send_keys('KP_Enter')
+    >>>     print(wm.active == term, wm.input)
+    >>>     print(wm.spawn_counts()['xdotool'])
+    True [[..., 'key', 'KP_Enter']]
+    2
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import Counter
+from os.path import dirname, join
+
+from vimtk._demo.fakewm import standin
+
+__all__ = ['FakeWM']
+
+#: Programs the fake provides
+PROGRAMS = sorted(standin.PROGRAMS)
+
+_SCRIPT_TEMPLATE = '''#!{exe} -SE
+import sys
+sys.path.insert(0, {standin_dpath!r})
+import standin
+sys.exit(standin.main({dpath!r}, {prog!r}, sys.argv[1:]))
+'''
+
+
+class FakeWM(object):
+    """
+    A window model served to :mod:`vimtk.xctrl` through stand-in programs.
+
+    Args:
+        latency (float | Dict[str, float]): seconds each stand-in sleeps
+            before it does anything, either for all programs or per program
+            name. Use this to model a slow X server or window manager.
+        dpath (str | None): directory for the state, the call log and the
+            executables. Defaults to a new temporary directory that is
+            removed by :func:`cleanup`.
+    """
+
+    def __init__(self, latency=0, dpath=None):
+        self._owns_dpath = dpath is None
+        if dpath is None:
+            dpath = tempfile.mkdtemp(prefix='vimtk_fakewm_')
+        self.dpath = dpath
+        self.bin_dpath = join(dpath, 'bin')
+        self._next_id = 0x03c00007
+        self._saved = None
+        os.makedirs(self.bin_dpath, exist_ok=True)
+        state = standin.empty_state()
+        standin.save_state(self.dpath, state)
+        self.set_latency(latency)
+        self._write_executables()
+
+    def _write_executables(self):
+        standin_dpath = dirname(os.path.abspath(standin.__file__))
+        for prog in PROGRAMS:
+            fpath = join(self.bin_dpath, prog)
+            with open(fpath, 'w') as file:
+                file.write(_SCRIPT_TEMPLATE.format(
+                    exe=sys.executable, standin_dpath=standin_dpath,
+                    dpath=self.dpath, prog=prog))
+            os.chmod(fpath, 0o755)
+
+    def _modify(self):
+        return standin.locked_state(self.dpath)
+
+    @property
+    def state(self):
+        """
+        Dict: a copy of the current window model
+        """
+        return standin.load_state(self.dpath)
+
+    def set_latency(self, latency):
+        """
+        Args:
+            latency (float | Dict[str, float]): see :class:`FakeWM`
+        """
+        if not isinstance(latency, dict):
+            latency = {prog: latency for prog in PROGRAMS}
+        with self._modify() as state:
+            state['latency'].update(latency)
+
+    def add_window(self, wm_class, title='', pid=None, desktop=0,
+                   client='fakehost', geometry=(0, 0, 800, 600)):
+        """
+        Maps a new window on top of the stacking order. It does not take the
+        focus, see :func:`activate`.
+
+        Args:
+            wm_class (str): the ``instance.Class`` pair shown by ``wmctrl -lx``
+            title (str): the window title
+            pid (int | None): the owning process, defaults to this process so
+                process lookups succeed
+            desktop (int): the desktop index, -1 for sticky windows
+            client (str): the client machine name
+            geometry (Tuple[int, int, int, int]): x, y, width and height
+
+        Returns:
+            int: the window id
+        """
+        with self._modify() as state:
+            wm_id = self._next_id
+            while str(wm_id) in state['windows']:
+                wm_id += 0x100000
+            self._next_id = wm_id + 0x100000
+            state['windows'][str(wm_id)] = {
+                'wm_class': wm_class,
+                'title': title,
+                'pid': os.getpid() if pid is None else pid,
+                'desktop': desktop,
+                'client': client,
+                'geometry': list(geometry),
+                'maximized': False,
+            }
+            state['clients'].append(wm_id)
+            state['stacking'].append(wm_id)
+        return wm_id
+
+    def remove_window(self, wm_id):
+        """
+        Unmaps a window
+        """
+        with self._modify() as state:
+            del state['windows'][str(wm_id)]
+            state['clients'].remove(wm_id)
+            state['stacking'].remove(wm_id)
+            if state['active'] == wm_id:
+                state['active'] = state['stacking'][-1] if state['stacking'] else None
+
+    def update_window(self, wm_id, **attrs):
+        """
+        Changes attributes of a window, e.g. its ``title`` or ``maximized``
+        state.
+        """
+        with self._modify() as state:
+            state['windows'][str(wm_id)].update(attrs)
+
+    def activate(self, wm_id):
+        """
+        Focuses a window and raises it, like the window manager would
+        """
+        with self._modify() as state:
+            standin.activate(state, wm_id)
+
+    def set_current_desktop(self, desktop):
+        with self._modify() as state:
+            state['current_desktop'] = desktop
+
+    def window(self, wm_id):
+        """
+        Returns:
+            Dict: the attributes of a window
+        """
+        return self.state['windows'][str(wm_id)]
+
+    @property
+    def stacking(self):
+        """
+        List[int]: window ids from the bottom to the top of the stack
+        """
+        return self.state['stacking']
+
+    @property
+    def active(self):
+        """
+        int | None: the id of the focused window
+        """
+        return self.state['active']
+
+    @property
+    def current_desktop(self):
+        return self.state['current_desktop']
+
+    @property
+    def autorepeat(self):
+        return self.state['autorepeat']
+
+    @property
+    def clipboard(self):
+        return self.state['clipboard']
+
+    @property
+    def input(self):
+        """
+        List[List]: ``[wm_id, kind, value]`` entries for each key press
+        (``key``), typed string (``type``) and ``ctrl+shift+v`` press
+        (``paste``, with the clipboard contents at that time), in order.
+        Input sent to a tmux pane has ``'tmux:<target>'`` instead of a window
+        id.
+        """
+        return self.state['input']
+
+    def clear_input(self):
+        with self._modify() as state:
+            state['input'] = []
+
+    def tmux_print(self, target, text):
+        """
+        Writes text into a tmux pane as if the program running in it printed
+        it.
+
+        Args:
+            target (str): the ``-t`` target the pane is addressed with, ``''``
+                for the pane tmux picks without one
+            text (str): the output
+        """
+        with self._modify() as state:
+            standin.tmux_pane_write(state, target, text)
+
+    def tmux_pane(self, target):
+        """
+        Returns:
+            List[str]: every line of a tmux pane, the last one has the cursor
+        """
+        return self.state['tmux_panes'].get(target, [''])
+
+    def calls(self, prog=None):
+        """
+        Args:
+            prog (str | None): only return calls of this program
+
+        Returns:
+            List[List[str]]: the argv of each stand-in invocation, in order
+        """
+        fpath = join(self.dpath, standin.CALLS_FNAME)
+        if not os.path.exists(fpath):
+            return []
+        with open(fpath, 'r') as file:
+            records = [json.loads(line) for line in file if line.strip()]
+        return [[r['prog']] + r['args'] for r in records
+                if prog is None or r['prog'] == prog]
+
+    def spawn_counts(self):
+        """
+        Returns:
+            Counter: number of spawned processes per program
+        """
+        return Counter(argv[0] for argv in self.calls())
+
+    def clear_calls(self):
+        fpath = join(self.dpath, standin.CALLS_FNAME)
+        if os.path.exists(fpath):
+            os.remove(fpath)
+
+    def install(self):
+        """
+        Puts the stand-ins first on the PATH and resets the cached vimtk
+        state that depends on it: the xctrl backend and window table, the
+        executable lookup cache and the clipboard backend.
+        """
+        import pyperclip
+        from vimtk import runner, xctrl
+        if self._saved is not None:
+            return
+        self._saved = {
+            'PATH': os.environ.get('PATH', None),
+            'DISPLAY': os.environ.pop('DISPLAY', None),
+            'clipboard': getattr(pyperclip, '_vimtk_monkey_backend', None),
+        }
+        os.environ['PATH'] = self.bin_dpath + os.pathsep + (self._saved['PATH'] or '')
+        pyperclip._vimtk_monkey_backend = 'xclip'
+        xctrl.reset_backend()
+        runner.clear_which_cache()
+
+    def uninstall(self):
+        """
+        Restores the environment and vimtk state saved by :func:`install`
+        """
+        import pyperclip
+        from vimtk import runner, xctrl
+        if self._saved is None:
+            return
+        saved, self._saved = self._saved, None
+        xctrl.reset_backend()
+        runner.clear_which_cache()
+        for key in ['PATH', 'DISPLAY']:
+            if saved[key] is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = saved[key]
+        if saved['clipboard'] is None:
+            if hasattr(pyperclip, '_vimtk_monkey_backend'):
+                del pyperclip._vimtk_monkey_backend
+        else:
+            pyperclip._vimtk_monkey_backend = saved['clipboard']
+
+    def cleanup(self):
+        """
+        Uninstalls the fake and removes its temporary directory
+        """
+        self.uninstall()
+        if self._owns_dpath:
+            shutil.rmtree(self.dpath, ignore_errors=True)
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
@@ -0,0 +1,407 @@
+"""
+Stand-in implementations of ``wmctrl``, ``xprop``, ``xdotool``, ``xset``,
+``xclip`` and ``tmux`` backed by the JSON window model of
+:class:`vimtk._demo.fakewm.FakeWM`.
+
+The executables that :class:`FakeWM` installs run this file directly with
+``python -S -E``, so it only depends on the standard library and starts
+quickly. Every invocation is appended to ``calls.jsonl`` and may sleep for a
+configured per-program latency first.
+
+State layout (``state.json``)::
+
+    windows: {str(wm_id): {wm_class, title, pid, desktop, client, geometry,
+                           maximized}}
+    clients: [wm_id, ...] in mapping order (_NET_CLIENT_LIST)
+    stacking: [wm_id, ...] from bottom to top (_NET_CLIENT_LIST_STACKING)
+    active: wm_id or null
+    focus_log: [wm_id, ...] every activation, so ``xprop -spy`` can report
+        each focus change like the real one does
+    current_desktop: int
+    autorepeat: bool
+    clipboard: str
+    input: [[wm_id, kind, value], ...] key presses and typed text. Input
+        sent to a tmux pane has the target string instead of a window id.
+    tmux_buffers: {name: text} tmux paste buffers
+    tmux_panes: {target: [line, ...]} what each tmux pane shows, including
+        its history. Pasted text and program output are appended to the last
+        line, where the cursor is, and ``Enter`` starts a new line.
+    latency: {program: seconds}
+"""
+import fcntl
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+STATE_FNAME = 'state.json'
+CALLS_FNAME = 'calls.jsonl'
+
+#: xdotool commands the stand-in understands, used to split chains
+XDOTOOL_COMMANDS = {
+    'getwindowfocus', 'getactivewindow', 'getwindowname', 'windowactivate',
+    'key', 'keyup', 'keydown', 'type', 'sleep', 'windowsize',
+}
+
+
+def empty_state():
+    return {
+        'windows': {},
+        'clients': [],
+        'stacking': [],
+        'active': None,
+        'focus_log': [],
+        'current_desktop': 0,
+        'autorepeat': True,
+        'clipboard': '',
+        'input': [],
+        'tmux_buffers': {},
+        'tmux_panes': {},
+        'latency': {},
+    }
+
+
+def load_state(dpath):
+    with open(os.path.join(dpath, STATE_FNAME), 'r') as file:
+        return json.load(file)
+
+
+def save_state(dpath, state):
+    fpath = os.path.join(dpath, STATE_FNAME)
+    tmp_fpath = fpath + '.tmp'
+    with open(tmp_fpath, 'w') as file:
+        json.dump(state, file)
+    os.replace(tmp_fpath, fpath)
+
+
+@contextmanager
+def locked_state(dpath, write=True):
+    """
+    Loads the state under an exclusive lock and saves it afterwards
+    """
+    with open(os.path.join(dpath, 'state.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            state = load_state(dpath)
+            yield state
+            if write:
+                save_state(dpath, state)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def log_call(dpath, prog, args):
+    line = json.dumps({'prog': prog, 'args': args, 'time': time.time()})
+    with open(os.path.join(dpath, CALLS_FNAME), 'a') as file:
+        file.write(line + '\n')
+
+
+def activate(state, wm_id):
+    info = state['windows'][str(wm_id)]
+    state['active'] = wm_id
+    state['focus_log'].append(wm_id)
+    state['stacking'] = [w for w in state['stacking'] if w != wm_id] + [wm_id]
+    if info['desktop'] >= 0:
+        state['current_desktop'] = info['desktop']
+
+
+def _hexid(wm_id):
+    return '0x{:08x}'.format(wm_id)
+
+
+def _window_list_line(wm_id, info, with_pid=True, with_class=True):
+    parts = [_hexid(wm_id), '{:>2}'.format(info['desktop'])]
+    if with_pid:
+        parts.append('{:<6}'.format(info['pid']))
+    if with_class:
+        parts.append('{:<20}'.format(info['wm_class']))
+    parts.extend([info['client'], info['title']])
+    return ' '.join(parts)
+
+
+def _active_line(wm_id):
+    return '_NET_ACTIVE_WINDOW(WINDOW): window id # {}'.format(hex(wm_id or 0))
+
+
+def _property_line(state, prop):
+    if prop in {'_NET_CLIENT_LIST', '_NET_CLIENT_LIST_STACKING'}:
+        key = 'clients' if prop == '_NET_CLIENT_LIST' else 'stacking'
+        ids = ', '.join(hex(w) for w in state[key])
+        return '{}(WINDOW): window id # {}'.format(prop, ids)
+    elif prop == '_NET_ACTIVE_WINDOW':
+        return _active_line(state['active'])
+    elif prop == '_NET_CURRENT_DESKTOP':
+        return '{}(CARDINAL) = {}'.format(prop, state['current_desktop'])
+    return '{}:  not found.'.format(prop)
+
+
+def wmctrl(dpath, args):
+    if args and args[0] in {'-l', '-lx', '-lxp', '-lp'}:
+        flag = args[0]
+        state = load_state(dpath)
+        for wm_id in state['clients']:
+            info = state['windows'][str(wm_id)]
+            print(_window_list_line(wm_id, info, with_pid='p' in flag,
+                                    with_class='x' in flag))
+        return 0
+    if args[:1] == ['-ia']:
+        with locked_state(dpath) as state:
+            wm_id = int(args[1], 16)
+            if str(wm_id) not in state['windows']:
+                return 1
+            activate(state, wm_id)
+        return 0
+    if args[:1] == ['-xa']:
+        pattern = args[1].lower()
+        with locked_state(dpath) as state:
+            for wm_id in reversed(state['stacking']):
+                if pattern in state['windows'][str(wm_id)]['wm_class'].lower():
+                    activate(state, wm_id)
+                    return 0
+        return 1
+    if args[:1] == ['-ir']:
+        with locked_state(dpath) as state:
+            info = state['windows'].get(str(int(args[1], 16)), None)
+            if info is None:
+                return 1
+            if args[2] == '-b':
+                action, *props = args[3].split(',')
+                if action == 'remove' and any(p.startswith('maximized') for p in props):
+                    info['maximized'] = False
+            elif args[2] == '-e':
+                values = [int(v) for v in args[3].split(',')[1:]]
+                info['geometry'] = [new if new >= 0 else old for new, old in
+                                    zip(values, info['geometry'])]
+        return 0
+    sys.stderr.write('fake wmctrl: unsupported arguments {}\n'.format(args))
+    return 1
+
+
+def xprop(dpath, args):
+    if args[:1] != ['-root']:
+        sys.stderr.write('fake xprop: only -root is supported\n')
+        return 1
+    args = args[1:]
+    spy = '-spy' in args
+    props = [a for a in args if a != '-spy']
+    state = load_state(dpath)
+    previous = {prop: _property_line(state, prop) for prop in props}
+    for line in previous.values():
+        print(line)
+    if not spy:
+        return 0
+    sys.stdout.flush()
+    num_focus = len(state['focus_log'])
+    while os.getppid() != 1:
+        time.sleep(0.01)
+        try:
+            state = load_state(dpath)
+        except (OSError, ValueError):
+            continue
+        for prop in props:
+            if prop == '_NET_ACTIVE_WINDOW':
+                # Report every activation since the last poll in order
+                for wm_id in state['focus_log'][num_focus:]:
+                    print(_active_line(wm_id))
+                num_focus = len(state['focus_log'])
+                continue
+            line = _property_line(state, prop)
+            if line != previous[prop]:
+                previous[prop] = line
+                print(line)
+        sys.stdout.flush()
+    return 0
+
+
+def _take_options(args, idx, valued=('--window', '--delay', '--repeat')):
+    while idx < len(args) and args[idx].startswith('--'):
+        idx += 2 if args[idx] in valued else 1
+    return idx
+
+
+def xdotool(dpath, args):
+    with locked_state(dpath) as state:
+        idx = 0
+        while idx < len(args):
+            command = args[idx]
+            idx += 1
+            if command in {'getwindowfocus', 'getactivewindow'}:
+                print(state['active'] or 0)
+            elif command == 'getwindowname':
+                info = state['windows'].get(str(state['active']), {})
+                print(info.get('title', ''))
+            elif command == 'windowactivate':
+                idx = _take_options(args, idx)
+                if idx < len(args) and args[idx] not in XDOTOOL_COMMANDS:
+                    wm_id = int(args[idx], 0)
+                    idx += 1
+                    if str(wm_id) not in state['windows']:
+                        sys.stderr.write('fake xdotool: no window {}\n'.format(wm_id))
+                        return 1
+                    activate(state, wm_id)
+            elif command in {'key', 'keyup', 'keydown'}:
+                idx = _take_options(args, idx)
+                while idx < len(args) and args[idx] not in XDOTOOL_COMMANDS:
+                    if command == 'key':
+                        keys = args[idx]
+                        if keys == 'ctrl+shift+v':
+                            entry = [state['active'], 'paste', state['clipboard']]
+                        else:
+                            entry = [state['active'], 'key', keys]
+                        state['input'].append(entry)
+                    idx += 1
+            elif command == 'type':
+                idx = _take_options(args, idx)
+                text = ' '.join(args[idx:])
+                state['input'].append([state['active'], 'type', text])
+                idx = len(args)
+            elif command == 'sleep':
+                time.sleep(float(args[idx]))
+                idx += 1
+            elif command == 'windowsize':
+                wm_id, w, h = int(args[idx], 0), int(args[idx + 1]), int(args[idx + 2])
+                idx += 3
+                geometry = state['windows'][str(wm_id)]['geometry']
+                geometry[2:] = [w, h]
+            else:
+                sys.stderr.write('fake xdotool: unsupported command {}\n'.format(command))
+                return 1
+    return 0
+
+
+def xset(dpath, args):
+    if args[:1] == ['r'] and args[1:2] in (['on'], ['off']):
+        with locked_state(dpath) as state:
+            state['autorepeat'] = args[1] == 'on'
+        return 0
+    sys.stderr.write('fake xset: unsupported arguments {}\n'.format(args))
+    return 1
+
+
+def xclip(dpath, args):
+    if '-o' in args:
+        sys.stdout.write(load_state(dpath)['clipboard'])
+        return 0
+    text = sys.stdin.read()
+    with locked_state(dpath) as state:
+        state['clipboard'] = text
+    return 0
+
+
+def _tmux_options(args, flags, valued):
+    options = {}
+    positional = []
+    idx = 0
+    while idx < len(args):
+        arg = args[idx]
+        if arg in valued:
+            options[arg] = args[idx + 1]
+            idx += 2
+        elif arg in flags:
+            options[arg] = True
+            idx += 1
+        else:
+            positional.append(arg)
+            idx += 1
+    return options, positional
+
+
+#: Number of visible lines of a fake tmux pane, the rest is history
+TMUX_PANE_HEIGHT = 24
+
+
+def tmux_pane_write(state, target, text):
+    """
+    Appends text at the cursor of a pane, like a program printing it
+    """
+    lines = state['tmux_panes'].setdefault(target, [''])
+    first, *rest = text.split('\n')
+    lines[-1] += first
+    lines.extend(rest)
+
+
+def _tmux_pane_geometry(lines):
+    history_size = max(len(lines) - TMUX_PANE_HEIGHT, 0)
+    cursor_y = len(lines) - 1 - history_size
+    return history_size, cursor_y
+
+
+def tmux(dpath, args):
+    # Split the command sequence on ";" like tmux does
+    commands = [[]]
+    for arg in args:
+        if arg == ';':
+            commands.append([])
+        else:
+            commands[-1].append(arg)
+    with locked_state(dpath) as state:
+        buffers = state['tmux_buffers']
+        for command, *rest in filter(None, commands):
+            if command == 'load-buffer':
+                options, (path,) = _tmux_options(rest, set(), {'-b'})
+                if path != '-':
+                    with open(path, 'r') as file:
+                        text = file.read()
+                else:
+                    text = sys.stdin.read()
+                buffers[options.get('-b', 'buffer0')] = text
+            elif command == 'paste-buffer':
+                options, _ = _tmux_options(rest, {'-d', '-p', '-r'}, {'-b', '-t', '-s'})
+                name = options.get('-b', 'buffer0')
+                if name not in buffers:
+                    sys.stderr.write('no buffer {}\n'.format(name))
+                    return 1
+                text = buffers.pop(name) if '-d' in options else buffers[name]
+                target = 'tmux:' + options.get('-t', '')
+                state['input'].append([target, 'paste', text])
+                tmux_pane_write(state, options.get('-t', ''), text)
+            elif command == 'send-keys':
+                options, keys = _tmux_options(rest, {'-l'}, {'-t'})
+                target = 'tmux:' + options.get('-t', '')
+                for key in keys:
+                    state['input'].append([target, 'key', key])
+                    if key == 'Enter':
+                        tmux_pane_write(state, options.get('-t', ''), '\n')
+            elif command == 'display-message':
+                options, (fmt,) = _tmux_options(rest, {'-p'}, {'-t'})
+                lines = state['tmux_panes'].get(options.get('-t', ''), [''])
+                history_size, cursor_y = _tmux_pane_geometry(lines)
+                sys.stdout.write(fmt.replace(
+                    '#{history_size}', str(history_size)).replace(
+                    '#{cursor_y}', str(cursor_y)) + '\n')
+            elif command == 'capture-pane':
+                options, _ = _tmux_options(rest, {'-p', '-J'}, {'-t', '-S', '-E'})
+                lines = state['tmux_panes'].get(options.get('-t', ''), [''])
+                # Line numbers are relative to the top of the visible lines
+                history_size, _ = _tmux_pane_geometry(lines)
+                start = history_size + int(options.get('-S', 0))
+                stop = history_size + int(options.get('-E', TMUX_PANE_HEIGHT - 1)) + 1
+                for line in lines[max(start, 0):max(stop, 0)]:
+                    sys.stdout.write(line + '\n')
+            else:
+                sys.stderr.write('fake tmux: unsupported command {}\n'.format(command))
+                return 1
+    return 0
+
+
+PROGRAMS = {
+    'wmctrl': wmctrl,
+    'xprop': xprop,
+    'xdotool': xdotool,
+    'xset': xset,
+    'xclip': xclip,
+    'tmux': tmux,
+}
+
+
+def main(dpath, prog, args):
+    log_call(dpath, prog, args)
+    latency = load_state(dpath)['latency'].get(prog, 0)
+    if latency:
+        time.sleep(latency)
+    return PROGRAMS[prog](dpath, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], sys.argv[2], sys.argv[3:]))
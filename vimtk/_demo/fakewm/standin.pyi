@@ -0,0 +1,68 @@
+from typing import Dict, List
+from _typeshed import Incomplete
+
+STATE_FNAME: str
+CALLS_FNAME: str
+XDOTOOL_COMMANDS: set
+
+
+def empty_state() -> Dict:
+    ...
+
+
+def load_state(dpath: str) -> Dict:
+    ...
+
+
+def save_state(dpath: str, state: Dict) -> None:
+    ...
+
+
+def locked_state(dpath: str, write: bool = True) -> Incomplete:
+    ...
+
+
+def log_call(dpath: str, prog: str, args: List[str]) -> None:
+    ...
+
+
+def activate(state: Dict, wm_id: int) -> None:
+    ...
+
+
+def wmctrl(dpath: str, args: List[str]) -> int:
+    ...
+
+
+def xprop(dpath: str, args: List[str]) -> int:
+    ...
+
+
+def xdotool(dpath: str, args: List[str]) -> int:
+    ...
+
+
+def xset(dpath: str, args: List[str]) -> int:
+    ...
+
+
+def xclip(dpath: str, args: List[str]) -> int:
+    ...
+
+
+TMUX_PANE_HEIGHT: int
+
+
+def tmux_pane_write(state: Dict, target: str, text: str) -> None:
+    ...
+
+
+def tmux(dpath: str, args: List[str]) -> int:
+    ...
+
+
+PROGRAMS: Dict
+
+
+def main(dpath: str, prog: str, args: List[str]) -> int:
+    ...
@@ -39,6 +39,10 @@ endpython
 """
 
 
+import re  # NOQA
+import sys  # NOQA
+
+
 class VimErrorMock(Exception):
     pass
 
@@ -314,6 +318,11 @@ class VimMock(object):
         self.global_variables = {}
         self._function_stack = []
         self._mode = 'n'
+        # Record of every expression passed to eval (useful for counting
+        # bridge calls in tests)
+        self._eval_log = []
+        # Record of every message echoed with command
+        self._messages = []
 
     def _push_function_stack(self, name, named={}, positional=[]):
         """
@@ -370,6 +379,15 @@ class VimMock(object):
         if command == 'ESC':
             # Switch to normal mode
             self._mode = 'n'
+        elif command.startswith(('echo ', 'echohl ', 'redraw')):
+            # Messages are recorded instead of shown
+            self._messages.append(command)
+        elif command == 'call vimtk#aio_start()':
+            # There are no timers, tests pump the vimtk.aio loop themselves
+            pass
+        elif command == 'call vimtk#output_follow()':
+            # Windows are not modeled, so there is nothing to scroll
+            pass
         else:
             raise NotImplementedError(command)
 
@@ -380,6 +398,7 @@ class VimMock(object):
         This only handles very specific commands.
         """
         # print('command = {!r}'.format(command))
+        self._eval_log.append(command)
         if command == '&ft':
             from os.path import splitext
             return splitext(self.current.buffer.name)[1].lstrip('.')
@@ -394,6 +413,39 @@ class VimMock(object):
             arg = command[8:-2]
             return arg in self.global_variables
 
+        if command.startswith('filter(copy(g:), '):
+            # Only handles the prefix filter used by vimtk.core.Config
+            match = re.match(r'filter\(copy\(g:\), \'v:key =~# "\^(.*)"\'\)$', command)
+            if match is None:
+                raise NotImplementedError(command)
+            prefix = match.group(1)
+            return {
+                varname[2:]: value
+                for varname, value in self.global_variables.items()
+                if varname.startswith('g:' + prefix)
+            }
+
+        if command.startswith('vimtk#output_bufnr('):
+            # The scratch buffer of vimtk.output, created on first use
+            for buf in self.buffers:
+                if buf.name == '[vimtk output]':
+                    break
+            else:
+                buf = BufferMock()
+                buf.name = '[vimtk output]'
+                # An empty vim buffer still has one line
+                buf._lines = ['']
+                buf.number = max(b.number for b in self.buffers) + 1
+                self.buffers.append(buf)
+            return str(buf.number)
+
+        if command == "get(a:, '000', [])":
+            # The varargs of the current function (or nothing)
+            if not self._function_stack:
+                return []
+            stack_frame = self._function_stack[-1]
+            return list(stack_frame['args']['positional'])
+
         if command.startswith('get(') and command.endswith(')'):
             inner = command[4:-1]
             context, arg = inner.split(':, ')
@@ -469,3 +521,10 @@ class VimMock(object):
         import ast
         varvalue = ast.literal_eval(rhs)
         self.global_variables[varname] = varvalue
+
+        if key.startswith('vimtk_'):
+            # Emulate the autocmd in plugin/vimtk.vim that invalidates the
+            # vimtk config snapshot when a vimtk variable is assigned.
+            vimtk_core = sys.modules.get('vimtk.core', None)
+            if vimtk_core is not None:
+                vimtk_core.CONFIG.invalidate()
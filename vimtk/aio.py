@@ -0,0 +1,374 @@
+"""
+An asyncio variant of the :class:`vimtk.xctrl.XCtrl` primitives and of
+:func:`vimtk.core.execute_text_in_terminal`.
+
+The synchronous pipeline runs every step in turn: clipboard copy, reading the
+active window, finding the terminal, focusing it, pressing keys and focusing
+vim again. The first four steps do not depend on each other, so
+:func:`execute_text` runs them concurrently. Helper programs are started
+with :func:`asyncio.create_subprocess_exec`, and window table refills run in
+the default executor. Calls into the python-xlib backend stay on the event
+loop thread because an X connection must not be shared between threads.
+
+Vim has no asyncio event loop of its own. :func:`submit` schedules a
+coroutine on a private loop, and a vim timer (``vimtk#aio_start``) calls
+:func:`pump` every few milliseconds to run one iteration of that loop until
+no work is left. Set ``let g:vimtk_async_send = 1`` to make
+``vimtk#execute_text_in_terminal`` return to vim immediately and send through
+:mod:`vimtk.send_queue`, which uses this pipeline for the ``gui`` backend.
+
+Example:
+    >>> import sys
+    >>> from vimtk import aio
+    >>> async def main():
+    >>>     import asyncio
+    >>>     code = 'import sys; print(sys.argv[1])'
+    >>>     return await asyncio.gather(*[
+    >>>         aio.run([sys.executable, '-c', code, str(i)]) for i in range(3)])
+    >>> infos = aio.run_sync(main())
+    >>> [info['out'].strip() for info in infos]
+    ['0', '1', '2']
+    >>> # Submitted work progresses whenever the loop is pumped
+    >>> future = aio.submit(aio.run([sys.executable, '-c', 'print("hi")']))
+    >>> while aio.pump():
+    >>>     pass
+    >>> print(future.result()['out'].strip())
+    hi
+"""
+import asyncio
+import logging
+import os
+import shlex
+import subprocess
+import time
+
+from vimtk import runner
+from vimtk.stats import STATS
+
+logger = logging.getLogger(__name__)
+
+_LOOP = None
+_PENDING = set()
+
+
+def event_loop():
+    """
+    Returns:
+        asyncio.AbstractEventLoop: the private event loop of this session
+    """
+    global _LOOP
+    if _LOOP is None or _LOOP.is_closed():
+        _LOOP = asyncio.new_event_loop()
+    return _LOOP
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine on the session loop until it is done. For use outside
+    of vim, or when the caller has to wait anyway.
+    """
+    return event_loop().run_until_complete(coro)
+
+
+def submit(coro):
+    """
+    Schedules a coroutine on the session loop and returns immediately. Inside
+    vim this starts the timer that pumps the loop.
+
+    Returns:
+        asyncio.Future
+    """
+    future = asyncio.ensure_future(coro, loop=event_loop())
+    _PENDING.add(future)
+    future.add_done_callback(_on_done)
+    try:
+        import vim
+    except ImportError:
+        pass
+    else:
+        vim.command('call vimtk#aio_start()')
+    return future
+
+
+def _on_done(future):
+    _PENDING.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        ex = future.exception()
+        # Nobody awaits submitted work, so report failures here
+        _echo_error('vimtk async task failed: {!r}'.format(ex))
+
+
+def _echo_error(message):
+    """
+    Shows an error message in vim (and in ``:messages``), or logs it outside
+    of vim.
+    """
+    try:
+        import vim
+    except ImportError:
+        logger.error(message)
+    else:
+        message = message.replace('\\', '\\\\').replace('"', '\\"')
+        vim.command('echohl ErrorMsg | echomsg "{}" | echohl None'.format(message))
+
+
+def pump():
+    """
+    Runs one iteration of the session loop without blocking.
+
+    Returns:
+        int: the number of submitted tasks that are not done yet. Vim stops
+        the pump timer when this is zero.
+    """
+    loop = event_loop()
+    loop.call_soon(loop.stop)
+    loop.run_forever()
+    return len(_PENDING)
+
+
+async def run(command, input=None, timeout=runner.DEFAULT_TIMEOUT,
+              capture=True, check=False):
+    """
+    Like :func:`vimtk.runner.run`, but awaits the process.
+
+    Returns:
+        Dict: with keys ``out``, ``err``, ``ret``, ``command``,
+        ``timed_out``, ``spawn_time`` and ``elapsed``
+    """
+    if isinstance(command, str):
+        argv = shlex.split(command)
+    else:
+        argv = list(command)
+    name = os.path.basename(argv[0])
+    exe = runner.which(argv[0])
+    if exe is None:
+        raise FileNotFoundError('Cannot find executable {!r}'.format(argv[0]))
+    pipe = subprocess.PIPE if capture else subprocess.DEVNULL
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        exe, *argv[1:],
+        stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+        stdout=pipe, stderr=pipe)
+    spawn_time = time.perf_counter() - start
+    data = None if input is None else input.encode('utf8')
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(data), timeout)
+        timed_out = False
+    except asyncio.TimeoutError:
+        logger.warning('Killing {} after {}s'.format(argv, timeout))
+        proc.kill()
+        out, err = await proc.communicate()
+        timed_out = True
+    elapsed = time.perf_counter() - start
+    STATS.record('spawn', name, elapsed)
+    info = {
+        'out': out.decode('utf8', errors='replace') if out else '',
+        'err': err.decode('utf8', errors='replace') if err else '',
+        'ret': proc.returncode,
+        'command': argv,
+        'timed_out': timed_out,
+        'spawn_time': spawn_time,
+        'elapsed': elapsed,
+    }
+    if check and info['ret'] != 0:
+        raise subprocess.CalledProcessError(
+            info['ret'], argv, output=info['out'], stderr=info['err'])
+    return info
+
+
+async def copy_text_to_clipboard(text):
+    """
+    Like :func:`vimtk.cplat.copy_text_to_clipboard`. The xclip and xsel
+    backends are awaited as processes. The other pyperclip backends (qt, gtk,
+    klipper) copy on the loop thread, because those toolkits only allow
+    clipboard calls from the thread that owns them.
+    """
+    from vimtk import cplat
+    cplat._ensure_clipboard_backend()
+    pyperclip = cplat._import_pyperclip()
+    if pyperclip is None:
+        raise Exception(
+            'pyperclip is not appear to be installed. '
+            'See also: https://github.com/Erotemic/vimtk/issues/5')
+    backend = getattr(pyperclip, '_vimtk_monkey_backend', None)
+    if backend in cplat._CLI_CLIPBOARD_ARGV:
+        await run(cplat._CLI_CLIPBOARD_ARGV[backend]['copy'], input=text,
+                  capture=False, check=True)
+    else:
+        pyperclip.copy(text)
+
+
+class AsyncXCtrl(object):
+    """
+    Coroutine versions of the :class:`vimtk.xctrl.XCtrl` primitives used to
+    send text to a terminal.
+    """
+
+    @staticmethod
+    async def snapshot(titles=False):
+        """
+        Args:
+            titles (bool): see :func:`vimtk.window_table.WindowTable.snapshot`
+
+        Returns:
+            vimtk.window_table.WindowSnapshot: the session window snapshot,
+            refilled in the default executor if it is stale
+        """
+        from vimtk import xctrl
+        table = xctrl.window_table()
+        if xctrl._native_backend() is not None:
+            return table.snapshot(titles)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, table.snapshot, titles)
+
+    @staticmethod
+    async def find_window_id(query=None, pattern=None, method='mru'):
+        """
+        Finds the most recently used window that matches a
+        :func:`vimtk.xctrl.query_windows` query or a wmctrl line pattern.
+        """
+        from vimtk.window_table import query_uses_titles
+        if query is not None:
+            titles = query_uses_titles(query)
+        else:
+            titles = pattern is not None
+        snapshot = await AsyncXCtrl.snapshot(titles)
+        if query is not None:
+            wm_ids = [r.wm_id for r in snapshot.query(query, order=method)]
+        else:
+            wm_ids = snapshot.sort_ids(snapshot.find_ids(pattern), method)
+        if not wm_ids:
+            available_windows = '\n'.join(
+                record.line() for record in snapshot.records.values())
+            msg = 'No window matches {!r}'.format(
+                query if query is not None else pattern)
+            msg += '\navailable windows are:\n%s' % (available_windows,)
+            raise Exception(msg)
+        return wm_ids[0]
+
+    @staticmethod
+    async def current_window_id():
+        from vimtk import xctrl
+        native = xctrl._native_backend()
+        if native is not None:
+            return native.active_window()
+        info = await run(['xdotool', 'getwindowfocus'])
+        return int(info['out'].strip())
+
+    @staticmethod
+    async def focus(wm_id, sync=True, timeout=0.5, sleeptime=0.01):
+        """
+        Activates a window, see :func:`vimtk.xctrl.XWindow.focus`.
+
+        Returns:
+            bool: True if the focus change was confirmed
+        """
+        from vimtk import xctrl
+        native = xctrl._native_backend()
+        confirmed = False
+        if native is not None:
+            native.activate(wm_id)
+            if sync:
+                deadline = time.monotonic() + timeout
+                while not confirmed and time.monotonic() < deadline:
+                    confirmed = native.active_window() == wm_id
+                    if not confirmed:
+                        await asyncio.sleep(0.001)
+        elif sync:
+            info = await run(['xdotool', 'windowactivate', '--sync',
+                              str(wm_id)], timeout=timeout)
+            confirmed = info['ret'] == 0 and not info['timed_out']
+        else:
+            await run(['wmctrl', '-ia', hex(wm_id)])
+        if not confirmed:
+            await asyncio.sleep(sleeptime)
+        return confirmed
+
+    @staticmethod
+    async def send_keys(key):
+        from vimtk import xctrl
+        native = xctrl._native_backend()
+        if native is not None:
+            native.send_keys(str(key))
+        else:
+            await run(['xdotool', 'key', str(key)])
+
+    @staticmethod
+    async def set_autorepeat(enabled):
+        from vimtk import xctrl
+        native = xctrl._native_backend()
+        if native is not None:
+            native.set_autorepeat(enabled)
+        else:
+            await run(['xset', 'r', 'on' if enabled else 'off'])
+
+    @staticmethod
+    async def wait_keys_released(timeout=0.05):
+        from vimtk import xctrl
+        native = xctrl._native_backend()
+        if native is None:
+            await asyncio.sleep(timeout)
+            return
+        deadline = time.monotonic() + timeout
+        while any(native.display.query_keymap()):
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.001)
+
+
+async def execute_text(text, return_to_vim=True):
+    """
+    Coroutine version of :func:`vimtk.core.execute_text_in_terminal` for X11.
+
+    The clipboard copy, the lookup of the active window and of the terminal,
+    and the wait for released keys run concurrently. Focusing and key
+    presses then happen in order.
+
+    Args:
+        text (str): text to paste into the terminal
+        return_to_vim (bool): if True, focus the previous window afterwards
+    """
+    from vimtk import xctrl
+    from vimtk.core import CONFIG
+    terminal_pattern = CONFIG.get('vimtk_terminal_pattern', None)
+    terminal_query = CONFIG.get('vimtk_terminal_query', None)
+    if terminal_query is None and terminal_pattern is None:
+        terminal_query = xctrl._terminal_query()
+    num_press_enter = CONFIG.get('vimtk_multiline_num_press_enter', 3)
+    focus_timeout = float(CONFIG.get('vimtk_focus_timeout', 0.5))
+    paste_settle_time = float(CONFIG.get('vimtk_paste_settle_time', 0.1))
+    paste_keypress = 'ctrl+shift+v'
+
+    async def prepare_keyboard():
+        await AsyncXCtrl.wait_keys_released(timeout=.05)
+        await AsyncXCtrl.set_autorepeat(False)
+
+    try:
+        # Every step finishes before a failure is raised, otherwise a
+        # prepare_keyboard still running would turn auto-repeat off after
+        # the finally turned it back on
+        results = await asyncio.gather(
+            copy_text_to_clipboard(text),
+            AsyncXCtrl.current_window_id(),
+            AsyncXCtrl.find_window_id(terminal_query, terminal_pattern),
+            prepare_keyboard(),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        _, active_id, terminal_id, _ = results
+        await AsyncXCtrl.focus(terminal_id, timeout=focus_timeout)
+        await AsyncXCtrl.send_keys(paste_keypress)
+        await AsyncXCtrl.send_keys('KP_Enter')
+        # The terminal fetches the pasted text from the clipboard owner
+        # asynchronously, see execute_text_in_terminal
+        await asyncio.sleep(paste_settle_time)
+        await AsyncXCtrl.send_keys('KP_Enter')
+        if '\n' in text:
+            for _ in range(int(num_press_enter) - 1):
+                await AsyncXCtrl.send_keys('KP_Enter')
+        if return_to_vim:
+            await AsyncXCtrl.focus(active_id, timeout=focus_timeout)
+    finally:
+        await AsyncXCtrl.set_autorepeat(True)
@@ -0,0 +1,73 @@
+import asyncio
+from typing import Any, Coroutine, Dict, List
+from _typeshed import Incomplete
+
+logger: Incomplete
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    ...
+
+
+def run_sync(coro: Coroutine) -> Any:
+    ...
+
+
+def submit(coro: Coroutine) -> asyncio.Future:
+    ...
+
+
+def pump() -> int:
+    ...
+
+
+async def run(command: List[str] | str,
+              input: str | None = None,
+              timeout: float | None = ...,
+              capture: bool = True,
+              check: bool = False) -> Dict:
+    ...
+
+
+async def copy_text_to_clipboard(text: str) -> None:
+    ...
+
+
+class AsyncXCtrl:
+
+    @staticmethod
+    async def snapshot(titles: bool = False) -> Incomplete:
+        ...
+
+    @staticmethod
+    async def find_window_id(query: str | None = None,
+                             pattern: str | None = None,
+                             method: str = 'mru') -> int:
+        ...
+
+    @staticmethod
+    async def current_window_id() -> int:
+        ...
+
+    @staticmethod
+    async def focus(wm_id: int,
+                    sync: bool = True,
+                    timeout: float = 0.5,
+                    sleeptime: float = 0.01) -> bool:
+        ...
+
+    @staticmethod
+    async def send_keys(key: str) -> None:
+        ...
+
+    @staticmethod
+    async def set_autorepeat(enabled: bool) -> None:
+        ...
+
+    @staticmethod
+    async def wait_keys_released(timeout: float = 0.05) -> None:
+        ...
+
+
+async def execute_text(text: str, return_to_vim: bool = True) -> None:
+    ...
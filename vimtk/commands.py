@@ -0,0 +1,770 @@
+"""
+Python entry points for the ``vimtk#...`` functions in ``autoload/vimtk.vim``.
+
+Each vimscript function is a one line call to :func:`dispatch`, which looks up
+the registered Python function by name and calls it with the arguments of the
+enclosing vimscript function. This means the command logic is compiled once
+when this module is imported (instead of recompiling a ``python3 << EOF``
+block on every keypress), and it can be called, tested, and benchmarked
+outside of vim using :func:`vimtk.mockvim`.
+
+To add a new command, decorate a function with :func:`register` and add a
+vimscript wrapper:
+
+.. code:: vim
+
+    func! vimtk#my_command(...)
+      python3 import vimtk.commands; vimtk.commands.dispatch('my_command')
+    endfunc
+
+SeeAlso:
+    ../autoload/vimtk.vim
+
+Example:
+    >>> import vimtk
+    >>> from vimtk import commands
+    >>> vim = vimtk.mockvim(fpath='foo.py', text='x = 1')
+    >>> vim.move_cursor(1, 0)
+    >>> vim._push_function_stack(name='vimtk#insert_print_var_at_cursor',
+    >>>                          positional=['repr'])
+    >>> commands.dispatch('insert_print_var_at_cursor')
+    >>> _ = vim._function_stack.pop()
+    >>> print(vim.current.buffer._text)
+    x = 1
+    print(f'x={x}')
+"""
+import logging
+import sys
+from vimtk.stats import STATS
+from vimtk.tracing import span
+
+logger = logging.getLogger(__name__)
+
+#: Mapping from command names to the Python functions that implement them
+COMMANDS = {}
+
+
+def register(func):
+    """
+    Decorator that registers a function as a vimtk command under its name.
+
+    Args:
+        func (Callable): the command implementation
+
+    Returns:
+        Callable: the same function
+    """
+    COMMANDS[func.__name__] = func
+    return func
+
+
+def dispatch(name, *args):
+    """
+    Calls a registered command. The snapshot of ``g:vimtk_*`` variables is
+    dropped first, so the command sees their current values.
+
+    When ``args`` are not given, this must be called from inside a vimscript
+    function, and the arguments of that function (``a:000``) are fetched in a
+    single ``vim.eval`` call and passed along positionally.
+
+    Args:
+        name (str): the name of a registered command
+        *args: explicit arguments, mainly for use outside of vim
+
+    Returns:
+        Any: whatever the command returns
+
+    Example:
+        >>> import vimtk
+        >>> from vimtk import commands
+        >>> vim = vimtk.mockvim(text='foo.bar = 1')
+        >>> vim.move_cursor(1, 5)
+        >>> commands.dispatch('insert_print_var_at_cursor', 'repr')
+        >>> print(vim.current.buffer._text)
+        foo.bar = 1
+        print(f'foo.bar={foo.bar}')
+    """
+    try:
+        func = COMMANDS[name]
+    except KeyError:
+        raise KeyError('Unknown vimtk command {!r}. Known commands are: {}'.format(
+            name, sorted(COMMANDS)))
+    # A g:vimtk_* variable may have been set by anything since the last
+    # command (a function, a <Cmd> mapping, an autocmd), so each command
+    # starts from a fresh snapshot. It is read at most once per command.
+    from vimtk.core import CONFIG
+    CONFIG.invalidate()
+    with STATS.command(name), span(name):
+        if not args:
+            args = _vim_function_args()
+        return func(*args)
+
+
+def _vim_function_args():
+    """
+    Returns the arguments of the enclosing vimscript function in one call.
+
+    Example:
+        >>> import vimtk
+        >>> vim = vimtk.mockvim()
+        >>> vim._push_function_stack(name='foo', positional=['val1', 'val2'])
+        >>> _vim_function_args()
+        ['val1', 'val2']
+        >>> _ = vim._function_stack.pop()
+        >>> _vim_function_args()
+        []
+    """
+    import vim
+    # a:000 only exists for functions with varargs, so go through the a:
+    # dictionary to make this safe for any vimscript function
+    return list(vim.eval("get(a:, '000', [])"))
+
+
+def _text_for_mode(mode):
+    """
+    Grabs the text that a terminal command should operate on.
+
+    Args:
+        mode (str): clipboard, word, line, or a visual mode
+    """
+    import vimtk
+    logger.debug('Get text from mode={}'.format(mode))
+    if mode == 'clipboard':
+        logger.debug('Text is already in clipboard')
+        text = vimtk.Clipboard.paste()
+        logger.debug('got text')
+        logger.debug('text = %r' % (text,))
+    elif mode == 'word':
+        text = vimtk.TextSelector.word_at_cursor()
+    elif 'v' in mode.lower():
+        text = vimtk.TextSelector.selected_text()
+    else:
+        text = vimtk.TextSelector.line_at_cursor()
+    return text
+
+
+def _large_selection_source(mode, min_lines):
+    """
+    Returns:
+        Tuple[Callable, int] | None: a line source (see
+        :mod:`vimtk.streaming`) for the visual selection and its number of
+        lines, if ``mode`` is a visual mode and at least ``min_lines`` are
+        selected
+    """
+    import vim
+    import vimtk
+    if not min_lines or mode in {'clipboard', 'word'} or 'v' not in mode.lower():
+        return None
+    buf = vim.current.buffer
+    pos1 = buf.mark('<')
+    pos2 = buf.mark('>')
+    if not (pos1 and pos2):
+        return None
+    (lnum1, col1), (lnum2, col2) = pos1, pos2
+    num_lines = lnum2 - lnum1 + 1
+    if num_lines < min_lines:
+        return None
+
+    def source():
+        return vimtk.TextSelector.iter_lines_between(lnum1, lnum2, col1, col2)
+    return source, num_lines
+
+
+def _echo_progress(num_chunks, num_lines, total_lines):
+    import vim
+    vim.command('redraw | echo "vimtk: sent {} / {} lines"'.format(
+        num_lines, total_lines))
+
+
+def _send_streamed(source, num_lines, return_to_vim=True, backend=None):
+    r"""
+    Preprocesses and sends a large text chunk by chunk, see
+    :func:`vimtk.streaming.send_chunked`.
+
+    Example:
+        >>> import vimtk
+        >>> from vimtk import streaming
+        >>> from vimtk.commands import _send_streamed
+        >>> vim = vimtk.mockvim()
+        >>> class Recorder(object):
+        >>>     sent = []
+        >>>     def send(self, text, return_to_vim=True):
+        >>>         self.sent.append(text)
+        >>>     def wait(self, handle, timeout=None):
+        >>>         pass
+        >>> text = ''.join('>>> x{} = 1\n'.format(i) for i in range(5000))
+        >>> source = lambda: streaming.iter_text_lines(text)
+        >>> _send_streamed(source, 5000, backend=Recorder())
+        >>> print(len(Recorder.sent), Recorder.sent[0][:6])
+        1 x0 = 1
+        >>> print(vim._messages[-1])
+        redraw | echo "vimtk: sent 5000 / 5000 lines"
+    """
+    from vimtk import streaming
+    lines = streaming.iter_preprocessed_lines(source)
+    streaming.send_chunked(lines, backend=backend, return_to_vim=return_to_vim,
+                           total_lines=num_lines, progress=_echo_progress)
+
+
+@register
+def execute_text_in_terminal(mode='clipboard', return_to_vim='1'):
+    """
+    Interactive scripting function. Takes part of the file you are editing
+    and pastes it into a terminal and then returns the editor to focus.
+
+    Args:
+        mode (str): clipboard, word, line, or visual
+        return_to_vim (str): if not '0', returns focus to vim after we paste
+            (defaults to '1')
+
+    Suggested Binding:
+      noremap  <leader>a :call vimtk#execute_text_in_terminal(mode())<CR>
+      vnoremap <leader>a :call vimtk#execute_text_in_terminal(visualmode())<CR>
+      noremap  <leader>m :call vimtk#execute_text_in_terminal('word')<CR>
+
+    Notes:
+        With ``g:vimtk_async_send`` the text is queued on
+        :data:`vimtk.send_queue.QUEUE` and this returns immediately. If
+        ``g:vimtk_stream_min_lines`` is set, texts of at least that many
+        lines are sent in chunks by :func:`vimtk.streaming.send_chunked`
+        instead, which always blocks until the last chunk was sent.
+    """
+    import vimtk
+    return_to_vim = str(return_to_vim) != '0'
+    logger.debug(('CALL FUNCTION vimtk#execute_text_in_terminal('
+                  'mode={mode!r}, return_to_vim={return_to_vim!r}'
+                  ')').format(**locals()))
+    min_lines = int(vimtk.CONFIG.get('vimtk_stream_min_lines', 0) or 0)
+    source = _large_selection_source(mode, min_lines)
+    if source is None:
+        text = _text_for_mode(mode)
+        num_lines = text.count('\n') + 1
+        if min_lines and num_lines >= min_lines:
+            from vimtk import streaming
+            source = (lambda: streaming.iter_text_lines(text)), num_lines
+    if source is not None:
+        _send_streamed(*source, return_to_vim=return_to_vim)
+        return
+    text = vimtk.preprocess_executable_text(text)
+    use_async = str(vimtk.CONFIG.get('vimtk_async_send', 0)) not in {'0', ''}
+    if use_async:
+        from vimtk import send_queue
+        send_queue.QUEUE.submit(text, return_to_vim=return_to_vim)
+    else:
+        vimtk.execute_text_in_terminal(text, return_to_vim=return_to_vim)
+
+
+@register
+def copy_current_fpath():
+    """
+    Copies the absolute path to the current file into your clipboard
+
+    Suggested Binding:
+        noremap <leader>C :call vimtk#copy_current_fpath()<Esc>
+    """
+    import vimtk
+    from vimtk.util import shrinkuser
+    fpath = vimtk.get_current_fpath()
+    if not sys.platform.startswith('win32'):
+        fpath = shrinkuser(fpath)
+    vimtk.Clipboard.copy(fpath)
+    vimtk.logger.info('copied fpath = {!r} to the clipboard'.format(fpath))
+
+
+@register
+def copy_current_module():
+    """
+    Assuming the current file is a Python module, this attempts to introspect
+    the module name and copy it to your clipboard.
+
+    Suggested Binding:
+        noremap <leader>f :call vimtk#copy_current_module()<Esc>
+    """
+    import vimtk
+    from vimtk.util import modpath_to_modname
+    fpath = vimtk.get_current_fpath()
+    if vimtk.Python.is_module_pythonfile():
+        modname = modpath_to_modname(fpath)
+        vimtk.Clipboard.copy(modname)
+        vimtk.logger.info('copied modname = {!r} to the clipboard'.format(modname))
+    else:
+        vimtk.logger.warn('file is not a python file. Copy the path instead')
+        vimtk.Clipboard.copy(fpath)
+        vimtk.logger.info('copied filepath = {!r} to the clipboard'.format(fpath))
+
+
+def _ipython_import_all_text(modpath):
+    """
+    Builds the code that imports everything from a module into IPython.
+
+    Args:
+        modpath (str): path to a python module
+
+    Returns:
+        str: the import code
+
+    Example:
+        >>> import vimtk
+        >>> from vimtk.commands import _ipython_import_all_text
+        >>> modpath = vimtk.commands.__file__
+        >>> text = _ipython_import_all_text(modpath)
+        >>> print(text)
+        >>> assert 'from vimtk.commands import *  # NOQA' in text
+        >>> assert '_vim_function_args' in text
+    """
+    import textwrap
+    from vimtk import pyinspect
+    from vimtk import util
+    from vimtk.util import modpath_to_modname
+    from vimtk.util import split_modpath
+    modname = modpath_to_modname(modpath)
+
+    lines = []
+    if not pyinspect.in_pythonpath(modname):
+        # Module is not in PYTHONPATH, make this happen before we run
+        # (note this is based on Vim's python, not the terminals.
+        #  this check might not always work)
+        #
+        # TODO: allow user to force adding to the pythonpath
+        basepath = split_modpath(modpath)[0]
+        user_basepath = util.shrinkuser(basepath)
+        if user_basepath != basepath:
+            lines.append('import sys, ubelt')
+            lines.append('sys.path.append(ubelt.expandpath(%r))' % (user_basepath,))
+        else:
+            lines.append('import sys')
+            lines.append('sys.path.append(%r)' % (basepath,))
+
+    lines.append("from {} import *  # NOQA".format(modname))
+    # Add private and protected functions, even if they wouldnt be exposed
+    with open(modpath, 'r') as file:
+        sourcecode = file.read()
+    # TODO get classes and whatnot
+    try:
+        func_names = pyinspect.parse_function_names(sourcecode)
+        if '__all__' in sourcecode:
+            # completely disregard __all__
+            import_names, modules = pyinspect.parse_import_names(sourcecode, branch=False)
+            extra_names = list(func_names) + list(import_names)
+        else:
+            extra_names = [name for name in func_names if name.startswith('_')]
+    except SyntaxError as ex:
+        logger.info('ex = {!r}'.format(ex))
+        extra_names = []
+        lines.append('# vimtk encountered a syntax error')
+
+    if len(extra_names) > 0:
+        extra = ', '.join(extra_names)
+        lines.append("from {} import {}".format(modname, extra))
+    text = textwrap.dedent('\n'.join(lines))
+    return text
+
+
+@register
+def ipython_import_all():
+    """
+    Imports global variables from current module into IPython session
+
+    Notes:
+        calls vimtk.execute_text_in_terminal, so the imports go to the
+        target of ``g:vimtk_terminal_backend``, e.g. a Jupyter kernel
+
+    Suggested Binding:
+        noremap <leader>M :call vimtk#ipython_import_all()<CR>
+    """
+    import vimtk
+    # TODO: mkinit will soon have a generate import * func
+    # Use that instead.
+    if vimtk.Python.is_module_pythonfile():
+        modpath = vimtk.get_current_fpath()
+        try:
+            text = _ipython_import_all_text(modpath)
+        except Exception as ex:
+            import traceback
+            tbtext = traceback.format_exc()
+            vimtk.logger.error(tbtext)
+            vimtk.logger.error(repr(ex))
+            raise
+        vimtk.execute_text_in_terminal(text)
+    else:
+        vimtk.logger.info('current file is not a pythonfile')
+
+
+@register
+def insert_auto_import():
+    """
+    Introspects the current Python file, and attempts to automatically insert
+    missing import statements.
+
+    Suggested Binding:
+        command! AutoImport call vimtk#insert_auto_import()
+    """
+    import vimtk
+    fpath = vimtk.get_current_fpath()
+    vimtk.ensure_normalmode()
+    if vimtk.Python.is_module_pythonfile():
+        import_block = vimtk.autogen_imports(fpath)
+        offset = import_block.count('\n')
+        # FIXME: doesnt work right when row=0
+        # Note: row is 1 indexed, and cannot be zero
+        with vimtk.CursorContext(offset=offset):
+            vimtk.Python.prepend_import_block(import_block)
+    else:
+        vimtk.logger.info('current file is not a pythonfile')
+
+
+def _filetype_language(filetype):
+    """
+    Maps a vim filetype to the language used by print statements
+    """
+    if filetype == 'sh':
+        language = 'sh'
+    elif filetype in {'cmake'}:
+        language = 'cmake'
+    elif filetype in {'cpp', 'cxx', 'h'}:
+        language = 'cpp'
+    elif filetype in {'vue', 'js'}:
+        language = 'javascript'
+    elif filetype in {'py'}:
+        language = 'py'
+    else:
+        language = 'py'  # Default to python
+    return language
+
+
+def _print_var_statement(expr, language, mode='repr', indent='',
+                         current_fpath=''):
+    """
+    Builds a statement that prints ``expr`` in the given language.
+
+    Example:
+        >>> from vimtk.commands import _print_var_statement
+        >>> print(_print_var_statement('x', 'sh'))
+        echo "x = $x"
+        >>> print(_print_var_statement('x', 'cmake'))
+        message(STATUS "x = ${x}")
+        >>> print(_print_var_statement('x', 'py', 'urepr'))
+        print(f'x = {ub.urepr(x, nl=1)}')
+        >>> print(_print_var_statement('x', 'cpp'))
+        std::cout << "x = " << x << std::endl;
+    """
+    import vimtk
+    from vimtk import util
+    if language == 'sh':
+        statement = 'echo "{expr} = ${expr}"'.format(expr=expr)
+    elif language == 'cmake':
+        statement = 'message(STATUS "{expr} = ${{{expr}}}")'.format(expr=expr)
+    elif language == 'javascript':
+        statement = 'console.log("{expr} = " + {expr});'.format(expr=expr)
+        # try to play nice with js linter
+        maxlen = 80 - len(indent)
+        if len(statement) > maxlen:
+            parts = [
+                '"{expr} = " + '.format(expr=expr),
+                '{expr}'.format(expr=expr),
+            ]
+            body = '  ' + ''.join(parts)
+            header = 'console.log('
+            footer = ');'
+            if len(body) < maxlen:
+                statement = '\n'.join([header, body, footer])
+            else:
+                statement = '\n'.join([header, '  ' + parts[0], '    ' + parts[1], footer])
+    elif language == 'py':
+        if mode == 'repr':
+            statement = "print(f'%s={%s}')" % (expr, expr,)
+        elif mode == 'repr2':
+            statement = "print('{expr} = {{}}'.format(ub.urepr({expr}, nl=1)))".format(expr=expr)
+        elif mode == 'urepr':
+            statement = "print(f'{expr} = {{ub.urepr({expr}, nl=1)}}')".format(expr=expr)
+        else:
+            raise KeyError(mode)
+    elif language == 'cpp':
+        # TODO: register a way to use loggers
+        REGISTRED_CPP_LOGGING_MODULES = ['kwiver', 'sprokit', 'vital']
+        if any(n in current_fpath for n in REGISTRED_CPP_LOGGING_MODULES):
+            if vimtk.find_pattern_above_row(
+                    '\\s*auto logger = kwiver::vital::get_logger.*') is None:
+                statement = util.codeblock(
+                    '''
+                    auto logger = kwiver::vital::get_logger("temp.logger");
+                    LOG_INFO(logger, "{expr} = " << {expr} );
+                    '''
+                ).format(expr=expr)
+            else:
+                statement = util.codeblock(
+                    '''
+                    LOG_INFO(logger, "{expr} = " << {expr} );
+                    '''
+                ).format(expr=expr)
+        else:
+            cout = 'std::cout'
+            endl = 'std::endl'
+            statement = '{cout} << "{expr} = " << {expr} << {endl};'.format(
+                expr=expr, cout=cout, endl=endl)
+    else:
+        raise KeyError(language)
+    return statement
+
+
+@register
+def insert_print_var_at_cursor(mode='repr'):
+    """
+    Inserts a line of code that prints the current variable under the cursor
+
+    Currently supports the following languages:
+        C++, Bash, CMake, Python
+
+    Suggested Binding:
+        noremap <leader>pv :call vimtk#insert_print_var_at_cursor()<CR>
+    """
+    import vimtk
+    expr = vimtk.TextSelector.word_at_cursor()
+    indent = vimtk.TextSelector.current_indent()
+    filetype = vimtk.get_current_filetype()
+    language = _filetype_language(filetype)
+    current_fpath = vimtk.get_current_fpath()
+    statement = _print_var_statement(expr, language, mode=mode, indent=indent,
+                                     current_fpath=current_fpath)
+    newline = indent + statement.replace('\n', '\n' + indent)
+    vimtk.TextInsertor.insert_under_cursor(newline)
+
+
+@register
+def insert_timerit(mode):
+    """
+    Suggested Bindings:
+        noremap  <c-M-B> :call vimtk#insert_timerit(mode())<CR><Esc>
+        vnoremap <c-M-B> :call vimtk#insert_timerit(visualmode())<CR><Esc>
+
+    Example:
+        >>> import vimtk
+        >>> from vimtk import commands
+        >>> vim = vimtk.mockvim(text='x = 1')
+        >>> commands.dispatch('insert_timerit', 'n')
+        >>> print(vim.current.buffer._text)
+        x = 1
+        import timerit
+        ti = timerit.Timerit(100, bestof=10, verbose=2)
+        for timer in ti.reset('time'):
+            with timer:
+    """
+    import vimtk
+    from vimtk import util
+    indent = vimtk.TextSelector.current_indent()
+    newtext = '\n'.join([
+        indent + 'import timerit',
+        indent + 'ti = timerit.Timerit(100, bestof=10, verbose=2)',
+        indent + 'for timer in ti.reset(\'time\'):',
+        indent + '    with timer:',
+    ])
+    if 'v' in mode.lower():
+        selected = vimtk.TextSelector.selected_text()
+        newtext += '\n' + util.indent(selected, ' ' * 8)
+        vimtk.TextInsertor.insert_over_selection(newtext)
+    else:
+        vimtk.TextInsertor.insert_under_cursor(newtext)
+
+
+@register
+def smart_search_word_at_cursor():
+    """
+    Determines if the word at the cursor is a url and opens it in a webbrowser
+
+    Suggested Binding:
+        noremap <leader>es :call vimtk#smart_search_word_at_cursor()<CR>
+    """
+    import vimtk
+    import webbrowser
+    word = vimtk.TextSelector.word_at_cursor(url_ok=True)
+    url = vimtk.extract_url_embeding(word)
+    print('url = {!r}'.format(url))
+    webbrowser.open(url)
+
+
+@register
+def open_path_at_cursor(mode='split', path=None):
+    """
+    Does a fancy open of a path at the current cursor position in vim
+
+    Args:
+        mode (str):
+            the type of way you open in vim, defaults to 'split'
+
+        path (str | None):
+            defaults to the current 'word' under cursor
+
+    Behavior depends on path:
+       * If path isurl: open with OS webbrowser
+       * If path isdir: open directory
+       * If path isfile: open file
+       * If path looks like a python module:
+           try to statically find and open that
+       * If path doesnt exist:
+           * Look down a few directories to see if its relative to something
+             else (really helps for navigating C++).
+
+    Suggested Bindings:
+        " In current v/split or new tab
+        noremap <leader>go :call vimtk#open_path_at_cursor("e")<CR>
+        noremap <leader>gf :call vimtk#open_path_at_cursor("e")<CR>
+        noremap <leader>gi :call vimtk#open_path_at_cursor("split")<CR>
+        noremap <leader>gv :call vimtk#open_path_at_cursor("vsplit")<CR>
+        noremap <leader>gt :call vimtk#open_path_at_cursor("tabe")<CR>
+        noremap gi :call vimtk#open_path_at_cursor("split")<CR>
+
+    Ignore:
+        call vimtk#open_path_at_cursor('split', '~/local/vim/vimfiles/bundle/vimtk/autoload/vimtk.vim')
+        call vimtk#open_path_at_cursor('split', '~')
+        call vimtk#open_path_at_cursor('split', 'google.com')
+    """
+    import vimtk
+    if path is None:
+        path = vimtk.TextSelector.word_at_cursor(url_ok=True)
+    vimtk.find_and_open_path(path, mode=mode, verbose=0)
+
+
+@register
+def py_format_doctest():
+    """
+    Inserts docstring chevrons
+    """
+    import vimtk
+    text = vimtk.TextSelector.selected_text()
+    text2 = vimtk.Python.format_text_as_docstr(text)
+    vimtk.TextInsertor.insert_over_selection(text2)
+
+
+@register
+def py_unformat_doctest():
+    """
+    Removes docstring chevrons
+    """
+    import vimtk
+    text = vimtk.TextSelector.selected_text()
+    text2 = vimtk.Python.unformat_text_as_docstr(text)
+    vimtk.TextInsertor.insert_over_selection(text2)
+
+
+@register
+def format_paragraph(cfgstr=''):
+    """
+    Rewraps the paragraph under the cursor with one sentence per line.
+
+    Args:
+        cfgstr (str):
+            a Python dictionary literal with overrides for ``max_width``,
+            ``myprefix``, and ``sentence_break``.
+    """
+    import ast
+    import vimtk
+    from vimtk import util
+    # Simulate kwargs with cfgdict-like strings
+    default_config = {
+        'max_width': 80,
+        'myprefix': True,
+        'sentence_break': True,
+    }
+    kwargs = ast.literal_eval(cfgstr) if cfgstr else {}
+    assert not util.dict_diff(kwargs, default_config), 'unknown args'
+
+    # Remember curor location as best as possible
+    (row, col) = vimtk.Cursor.position()
+
+    row1, row2 = vimtk.TextSelector.paragraph_range_at_cursor()
+    text = vimtk.TextSelector.text_between_lines(row1, row2)
+    text = util.ensure_unicode(text)
+
+    from vimtk._dirty import format_multiple_paragraph_sentences
+    wrapped_text = format_multiple_paragraph_sentences(text, **kwargs)
+
+    vimtk.TextInsertor.insert_between_lines(wrapped_text, row1, row2)
+
+    # Reset cursor position as best as possible
+    vimtk.Cursor.move(row, col)
+
+
+@register
+def reload():
+    """
+    Reloads the vimtk python modules. Used for development.
+    """
+    import vimtk
+    vimtk.reload()
+
+
+@register
+def stats(action='report'):
+    """
+    Controls the counters in :mod:`vimtk.stats`. Backs ``:VimtkStats``.
+
+    Args:
+        action (str): one of "report", "on", "off", or "reset"
+
+    Example:
+        >>> import vimtk
+        >>> from vimtk import commands
+        >>> vim = vimtk.mockvim(text='foo = bar')
+        >>> commands.dispatch('stats', 'reset')
+        >>> commands.dispatch('stats', 'on')
+        >>> commands.dispatch('insert_print_var_at_cursor', 'repr')
+        >>> commands.dispatch('stats', 'off')
+        >>> assert 'insert_print_var_at_cursor' in STATS.summary()
+        >>> commands.dispatch('stats', 'reset')
+    """
+    if action == 'on':
+        STATS.enable()
+    elif action == 'off':
+        STATS.disable()
+    elif action == 'reset':
+        STATS.reset()
+    elif action == 'report':
+        print(STATS.report())
+        if not STATS.enabled:
+            print('Use :VimtkStats on to start collecting')
+    else:
+        raise ValueError('Unknown action {!r}. Expected one of: '
+                         'report, on, off, reset'.format(action))
+
+
+@register
+def trace(action='dump', fpath=None):
+    """
+    Controls the span recorder in :mod:`vimtk.tracing`. Backs ``:VimtkTrace``.
+
+    Args:
+        action (str): one of "dump", "on", "off", or "clear"
+        fpath (str | None): where "dump" writes the Chrome trace JSON.
+            Defaults to ``vimtk_trace.json`` in the current directory.
+
+    Example:
+        >>> import vimtk
+        >>> import ubelt as ub
+        >>> import json
+        >>> from vimtk import commands, tracing
+        >>> vim = vimtk.mockvim(text='foo = bar')
+        >>> commands.dispatch('trace', 'on')
+        >>> commands.dispatch('insert_print_var_at_cursor', 'repr')
+        >>> commands.dispatch('trace', 'off')
+        >>> dpath = ub.Path.appdir('vimtk/tests/trace').ensuredir()
+        >>> fpath = dpath / 'trace.json'
+        >>> commands.dispatch('trace', 'dump', str(fpath))
+        >>> names = [e['name'] for e in json.loads(fpath.read_text())['traceEvents']]
+        >>> assert 'insert_print_var_at_cursor' in names
+        >>> commands.dispatch('trace', 'clear')
+    """
+    from vimtk import tracing
+    if action == 'on':
+        tracing.enable()
+    elif action == 'off':
+        tracing.disable()
+    elif action == 'clear':
+        tracing.clear()
+    elif action == 'dump':
+        if fpath is None:
+            fpath = 'vimtk_trace.json'
+        tracing.dump(fpath)
+        print('Wrote {} spans to {}'.format(len(tracing.TRACER.events), fpath))
+    else:
+        raise ValueError('Unknown action {!r}. Expected one of: '
+                         'dump, on, off, clear'.format(action))
@@ -6,6 +6,7 @@ SeeAlso:
     ../autoload/vimtk.vim
 
 """
+import contextlib
 import itertools as it
 from os.path import join
 from os.path import isdir
@@ -13,32 +14,13 @@ from os.path import exists
 from os.path import expanduser
 import re
 import sys
-import pathlib
 import logging
+import threading
 from vimtk import util
+from vimtk.tracing import span, traced
 from vimtk.util import (
     dict_union, ensure_unicode, indent, codeblock, group_items, expandpath)
 
-try:
-    import ubelt as ub
-except Exception:
-    print('Warning: Unable to import ubelt')
-    print('Note: vim has inconsistent interactions with which python it chooses')
-    print('\nsys.prefix = {}\n'.format(sys.prefix))
-    _sys_exe = pathlib.Path(sys.executable)
-    _real_exe = _sys_exe.resolve()
-    if _sys_exe == _real_exe:
-        print('\nsys.executable = {}  # not a symlink\n'.format(_sys_exe))
-    else:
-        print('\nsys.executable = {} -> {}\n'.format(_sys_exe, _real_exe))
-    print('\nsys.path = {}\n'.format(sys.path))
-    ub = None
-    # raise
-
-from vimtk import xctrl
-from vimtk import cplat
-import sys
-
 logger = logging.getLogger(__name__)
 
 
@@ -108,6 +90,11 @@ def mockvim(fpath=None, text=None):
     import os
     from vimtk._demo import vimmock
     vim = vimmock.patch_vim()
+    # A new vim instance has a new variable namespace
+    CONFIG.invalidate()
+    from vimtk.stats import STATS
+    if STATS.enabled:
+        STATS.wrap_vim()
     if text is not None:
         if fpath is None:
             fpath = ''
@@ -117,32 +104,25 @@ def mockvim(fpath=None, text=None):
     return vim
 
 
-def reload_vimtk():
+def reload_vimtk(force=False):
     """
-    Used for development
+    Used for development.
+
+    Only reloads the vimtk modules that changed on disk and the modules that
+    depend on them. See :mod:`vimtk.reloader`.
+
+    Args:
+        force (bool): if True reload every loaded vimtk module
+
+    Returns:
+        List[str]: the names of the reloaded modules
     """
-    try:
-        import importlib
-        reload = importlib.reload
-    except (AttributeError, ImportError):
-        import imp
-        reload = imp.reload
-        logger.debug('Reloading vimtk')
-    import vimtk
-    import vimtk.core
-    import vimtk.xctrl
-    import vimtk.pyinspect
-    import vimtk.cplat
-
-    reload(vimtk.pyinspect)
-    reload(vimtk.cplat)
-    reload(vimtk.core)
-    reload(vimtk.xctrl)
-    reload(vimtk)
-
-    if WIN32:
-        import vimtk.win32_ctrl
-        reload(vimtk.win32_ctrl)
+    from vimtk import reloader
+    logger.debug('Reloading vimtk')
+    reloaded = reloader.reload_stale('vimtk', force=force)
+    logger.info('Reloaded {} vimtk modules: {}'.format(
+        len(reloaded), ', '.join(reloaded)))
+    return reloaded
 
 
 reload = reload_vimtk
@@ -152,6 +132,14 @@ class Config(object):
     """
     Query the state of the vim variable namespace.
 
+    All ``g:vimtk_*`` variables are read from vim in a single bridge call and
+    kept in a Python-side snapshot. The snapshot is dropped by
+    :func:`Config.invalidate`, which :func:`vimtk.commands.dispatch` calls at
+    the start of every command, so each command reads the variables at most
+    once. The plugin also calls it from an autocmd whenever a command line
+    or sourced script could have changed one of these variables (see
+    ``plugin/vimtk.vim``).
+
     Notes:
         >>> import vimtk
         >>> vim = vimtk.mockvim()
@@ -161,12 +149,37 @@ class Config(object):
         >>> # Should the vim variable override or update the default config?
         >>> vim.eval("let g:vimtk_auto_importable_modules = {'spam': 'import spam'}")
         >>> vimtk.CONFIG['vimtk_auto_importable_modules']
+
+    Example:
+        >>> import vimtk
+        >>> vim = vimtk.mockvim()
+        >>> vim.eval("let g:vimtk_multiline_num_press_enter = 2")
+        >>> vim.eval("let g:vimtk_sys_path = ['foo']")
+        >>> vimtk.CONFIG.invalidate()
+        >>> vim._eval_log.clear()
+        >>> vimtk.CONFIG['vimtk_multiline_num_press_enter']
+        2
+        >>> vimtk.CONFIG['vimtk_sys_path']
+        ['foo']
+        >>> # Both reads were served by one snapshot query
+        >>> assert len(vim._eval_log) == 1
+        >>> # Assignments to vimtk variables invalidate the snapshot
+        >>> vim.eval("let g:vimtk_multiline_num_press_enter = 4")
+        >>> vimtk.CONFIG['vimtk_multiline_num_press_enter']
+        4
     """
+    #: vim expression that returns every ``g:vimtk_*`` variable as a dict
+    _SNAPSHOT_EXPR = 'filter(copy(g:), \'v:key =~# "^vimtk_"\')'
+
     def __init__(self):
         # TODO: use scriptconfig to add helps?
         self.default = {
             'vimtk_terminal_pattern': None,
 
+            # A vimtk.window_table query like "class~kitty & desktop=current"
+            # used to find the terminal instead of vimtk_terminal_pattern.
+            'vimtk_terminal_query': None,
+
             'vimtk_multiline_num_press_enter': 3,
 
             'vimtk_auto_importable_modules': {
@@ -186,9 +199,61 @@ class Config(object):
 
             # Additional paths to search when resolving python modnames
             'vimtk_sys_path': [],
+
+            # How vimtk.xctrl talks to X: 'auto', 'xlib', or 'cli'
+            'vimtk_xctrl_backend': 'auto',
+
+            # Seconds after which the cached window table is refilled even if
+            # the root window did not report a change. None means never.
+            'vimtk_window_table_ttl': None,
+
+            # Seconds to wait for the window manager to confirm a focus
+            # change before falling back to a fixed sleep.
+            'vimtk_focus_timeout': 0.5,
+
+            # Seconds between pasting into the terminal and pressing enter
+            # again, which gives the terminal time to request the clipboard.
+            'vimtk_paste_settle_time': 0.1,
+
+            # If true, vimtk#execute_text_in_terminal returns immediately and
+            # the text is sent by the vimtk.send_queue worker, which merges
+            # texts that are queued while a send runs.
+            'vimtk_async_send': 0,
+
+            # How execute_text_in_terminal reaches the terminal: 'gui'
+            # (clipboard and key presses), 'tmux' or 'jupyter'. See
+            # vimtk.terminal_backend.
+            'vimtk_terminal_backend': 'gui',
+
+            # The tmux pane the tmux backend pastes into, e.g. 'work:1.0'.
+            # None means the last pane when vim runs in tmux.
+            'vimtk_tmux_target': None,
+
+            # The kernel the jupyter backend executes in: a connection file
+            # path or a pattern like 'kernel-1234*.json'. None means the most
+            # recently started kernel.
+            'vimtk_jupyter_connection_file': None,
+
+            # If set, selections of at least this many lines are sent in
+            # statement aligned chunks of at most vimtk_stream_chunk_size
+            # characters, see vimtk.streaming. 0 (the default) never streams.
+            'vimtk_stream_min_lines': 0,
+            'vimtk_stream_chunk_size': 65536,
+
+            # If true, the output of each send through the tmux and jupyter
+            # backends is appended to the [vimtk output] scratch buffer, see
+            # vimtk.output. The buffer is shown in a window of
+            # vimtk_output_height lines (0 never opens one), and a tmux pane
+            # is read until it printed nothing for vimtk_capture_idle_time
+            # seconds.
+            'vimtk_capture_output': 0,
+            'vimtk_output_height': 10,
+            'vimtk_capture_idle_time': 1.0,
         }
         self.state = self.default.copy()
-        pass
+        self._snapshot = None
+        # Snapshots that worker threads read instead of calling into vim
+        self._frozen = threading.local()
 
     def __getitem__(self, key):
         value = self.get(key, default=self.state[key])
@@ -197,17 +262,84 @@ class Config(object):
     def __setitem__(self, key, value):
         self.state[key] = value
 
+    def invalidate(self):
+        """
+        Forget the cached snapshot of ``g:vimtk_*`` variables so the next
+        lookup reads them from vim again.
+        """
+        self._snapshot = None
+
+    def snapshot(self):
+        """
+        Returns a dictionary of all ``g:vimtk_*`` variables.
+
+        The variables are fetched in a single ``vim.eval`` call and cached
+        until :func:`Config.invalidate` is called.
+
+        Returns:
+            Dict[str, Any]
+        """
+        if self._snapshot is None:
+            import vim
+            self._snapshot = vim.eval(self._SNAPSHOT_EXPR) or {}
+        return self._snapshot
+
+    @contextlib.contextmanager
+    def frozen(self, snapshot):
+        """
+        Serves lookups on the current thread from a snapshot taken earlier,
+        e.g. on the main thread. The vim module must only be used from the
+        main thread, so code that runs in a worker thread and reads the
+        config has to run in this context.
+
+        Args:
+            snapshot (Dict[str, Any]): the result of :func:`snapshot`, or an
+                empty dict outside of vim
+
+        Example:
+            >>> import threading
+            >>> from vimtk.core import Config
+            >>> config = Config()
+            >>> found = []
+            >>> def worker():
+            >>>     with config.frozen({'vimtk_tmux_target': 'work:1.0'}):
+            >>>         found.append(config.get('vimtk_tmux_target'))
+            >>> thread = threading.Thread(target=worker)
+            >>> thread.start()
+            >>> thread.join()
+            >>> print(found, config.get('vimtk_tmux_target'))
+            ['work:1.0'] None
+        """
+        prev = getattr(self._frozen, 'snapshot', None)
+        self._frozen.snapshot = snapshot
+        try:
+            yield self
+        finally:
+            self._frozen.snapshot = prev
+
     def get(self, key, default=None, context='g'):
         """ gets the value of a vim variable and defaults if it does not exist """
-        try:
-            import vim
-        except ImportError:
-            return default
+        frozen = getattr(self._frozen, 'snapshot', None)
+        if frozen is None:
+            try:
+                import vim
+            except ImportError:
+                return default
         assert key in self.default
-        varname = '{}:{}'.format(context, key)
-        var_exists = int(vim.eval('exists("{}")'.format(varname)))
+        if context == 'g':
+            snapshot = self.snapshot() if frozen is None else frozen
+            var_exists = key in snapshot
+            if var_exists:
+                value = snapshot[key]
+        elif frozen is not None:
+            # Only g: variables are frozen
+            var_exists = False
+        else:
+            varname = '{}:{}'.format(context, key)
+            var_exists = int(vim.eval('exists("{}")'.format(varname)))
+            if var_exists:
+                value = vim.eval('get({}:, "{}")'.format(context, key))
         if var_exists:
-            value = vim.eval('get({}:, "{}")'.format(context, key))
             # Hack: for dictionaries, update instead of overriding?
             # Not sure if this is a good idea
             if isinstance(value, dict):
@@ -220,6 +352,7 @@ class Config(object):
 class Clipboard(object):
     @staticmethod
     def copy(text):
+        from vimtk import cplat
         return cplat.copy_text_to_clipboard(text)
 
     @staticmethod
@@ -230,6 +363,7 @@ class Clipboard(object):
             import vim
             text = vim.eval('@+')
         except ImportError:
+            from vimtk import cplat
             text = cplat.get_clipboard()
         return text
 
@@ -446,6 +580,32 @@ class TextSelector(object):
             raise
         return text
 
+    @staticmethod
+    def iter_lines_between(lnum1, lnum2, col1=0, col2=sys.maxsize - 1,
+                           blocksize=1024):
+        r"""
+        Like :func:`text_between_lines`, but yields the lines with their
+        line endings and reads the buffer a block at a time, so a huge range
+        is never copied at once.
+
+        Example:
+            >>> import vimtk
+            >>> vim = vimtk.mockvim(text='a\nbb\nccc\ndddd')
+            >>> lines = TextSelector.iter_lines_between(2, 4, 1, blocksize=2)
+            >>> list(lines)
+            ['b\n', 'cc\n', 'ddd']
+        """
+        import vim
+        buf = vim.current.buffer
+        for start in range(lnum1 - 1, lnum2, blocksize):
+            stop = min(start + blocksize, lnum2)
+            for lnum, line in enumerate(buf[start:stop], start=start + 1):
+                # Not ensure_unicode, which is slow enough to matter here
+                if isinstance(line, bytes):
+                    line = line.decode('utf8')
+                line = line[col1:col2 + 1]
+                yield line if lnum == lnum2 else line + '\n'
+
     @staticmethod
     def line_at_cursor():
         """
@@ -1061,6 +1221,9 @@ def sys_executable():
 def preprocess_executable_text(text):
     """
     Handles the case where we are trying to docstrings paste into IPython.
+
+    See :func:`vimtk.streaming.iter_preprocessed_lines` for the version that
+    works on a stream of lines.
     """
     import textwrap
     logger.debug('preprocesing executable text')
@@ -1099,6 +1262,7 @@ def preprocess_executable_text(text):
     return text
 
 
+@traced
 def execute_text_in_terminal(text, return_to_vim=True):
     """
     Execute the current text currently selected **vim** text
@@ -1134,14 +1298,32 @@ def execute_text_in_terminal(text, return_to_vim=True):
              register our window as the active vim, and then paste into
              the second mru terminal)
 
+    The steps above are the default ``gui`` backend. Set
+    ``g:vimtk_terminal_backend`` to ``'tmux'`` to paste into a tmux pane or
+    to ``'jupyter'`` to run the text in a Jupyter kernel instead, see
+    :mod:`vimtk.terminal_backend`. With ``g:vimtk_capture_output`` the
+    output of these two backends is appended to a scratch buffer, see
+    :mod:`vimtk.output`.
+
     Ignore:
         from vimtk.core import execute_text_in_terminal
         execute_text_in_terminal('print("hello")')
 
     """
+    from vimtk import output, terminal_backend
     logger.debug('execute_text_in_terminal')
+    backend = terminal_backend.get()
+    handle = backend.send(text, return_to_vim=return_to_vim)
+    output.capture(backend, handle, text)
+
+
+def _execute_text_in_gui_terminal(text, return_to_vim=True):
+    """
+    The ``gui`` backend of :func:`execute_text_in_terminal`
+    """
     # Copy the text to the clipboard
-    Clipboard.copy(text)
+    with span('clipboard copy'):
+        Clipboard.copy(text)
 
     terminal_pattern = CONFIG.get('vimtk_terminal_pattern', None)
     vimtk_multiline_num_press_enter = CONFIG.get('vimtk_multiline_num_press_enter', 3)
@@ -1151,7 +1333,8 @@ def execute_text_in_terminal(text, return_to_vim=True):
     if sys.platform.startswith('win32'):
         from vimtk import win32_ctrl
         import pywinauto
-        active_gvim = win32_ctrl.find_window('gvim.exe')
+        with span('find vim window'):
+            active_gvim = win32_ctrl.find_window('gvim.exe')
         # TODO: custom terminal spec
         # Make sure regexes are bash escaped
         if terminal_pattern is None:
@@ -1159,50 +1342,80 @@ def execute_text_in_terminal(text, return_to_vim=True):
                 'cmd.exe',
                 'Cmder',
             ]))
-        terminal = win32_ctrl.find_window(terminal_pattern)
-        terminal.focus()
+        with span('find terminal window'):
+            terminal = win32_ctrl.find_window(terminal_pattern)
+        with span('focus terminal'):
+            terminal.focus()
         # TODO: some terminals paste with a right click on win32
         # support these.
         if hasattr(pywinauto.keyboard, 'send_keys'):
             send_keys = pywinauto.keyboard.send_keys
         else:
             send_keys = pywinauto.keyboard.SendKeys
-        send_keys('^v')
-        send_keys('{ENTER}')
-        send_keys('{ENTER}')
-        if '\n' in text:
-            for _ in range(vimtk_multiline_num_press_enter - 2):
-                send_keys('{ENTER}')
+        with span('send keys', keys='^v'):
+            send_keys('^v')
+        with span('send keys', keys='{ENTER}'):
+            send_keys('{ENTER}')
+            send_keys('{ENTER}')
+            if '\n' in text:
+                for _ in range(vimtk_multiline_num_press_enter - 2):
+                    send_keys('{ENTER}')
         if return_to_vim:
-            active_gvim.focus()
+            with span('focus vim'):
+                active_gvim.focus()
     else:
-        if terminal_pattern is None:
-            terminal_pattern = xctrl._wmctrl_terminal_patterns()
+        from vimtk import xctrl
+        terminal_query = CONFIG.get('vimtk_terminal_query', None)
+        if terminal_query is None and terminal_pattern is None:
+            terminal_query = xctrl._terminal_query()
 
         # Sequence of key presses that will trigger a paste event
         paste_keypress = 'ctrl+shift+v'
 
+        # Focus changes are confirmed by the window manager and key presses
+        # are synced with the X server, so the sleeps are only fallbacks.
         sleeptime = .01
+        focus_timeout = float(CONFIG.get('vimtk_focus_timeout', 0.5))
+        paste_settle_time = float(CONFIG.get('vimtk_paste_settle_time', 0.1))
         import time
-        time.sleep(.05)
-
-        xctrl.XCtrl.cmd('xset r off')
-        active_gvim = xctrl.XWindow.current()
-        xctrl.XWindow.find(terminal_pattern).focus(sleeptime)
-        xctrl.XCtrl.send_keys(paste_keypress, sleeptime)
-        xctrl.XCtrl.send_keys('KP_Enter', sleeptime)
-        # Need to time the enter key press correctly.
-        # TODO: is there a better method to do this?
-        time.sleep(0.1)
-        xctrl.XCtrl.send_keys('KP_Enter', sleeptime)
-        if '\n' in text:
-            # Press enter multiple times for multiline texts
-            for _ in range(vimtk_multiline_num_press_enter - 1):
-                xctrl.XCtrl.send_keys('KP_Enter', sleeptime)
-        if return_to_vim:
-            active_gvim.focus(sleeptime)
+        with span('wait keys released', timeout=.05):
+            xctrl.XCtrl.wait_keys_released(timeout=.05)
 
-        xctrl.XCtrl.cmd('xset r on')
+        with span('autorepeat off'):
+            xctrl.XCtrl.set_autorepeat(False)
+        # Auto-repeat is turned back on even if no terminal was found or a
+        # focus change failed, otherwise it stays off for the X session
+        try:
+            with span('find vim window'):
+                active_gvim = xctrl.XWindow.current()
+            with span('find terminal window'):
+                if terminal_query is not None:
+                    terminal = xctrl.XWindow.find_query(terminal_query)
+                else:
+                    terminal = xctrl.XWindow.find(terminal_pattern)
+            with span('focus terminal'):
+                terminal.focus(sleeptime, sync=True, timeout=focus_timeout)
+            with span('send keys', keys=paste_keypress):
+                xctrl.XCtrl.send_keys(paste_keypress, 0)
+            with span('send keys', keys='KP_Enter'):
+                xctrl.XCtrl.send_keys('KP_Enter', 0)
+            # Need to time the enter key press correctly. The terminal fetches
+            # the pasted text from the clipboard owner asynchronously.
+            # TODO: is there a better method to do this?
+            with span('sleep', seconds=paste_settle_time):
+                time.sleep(paste_settle_time)
+            with span('send keys', keys='KP_Enter'):
+                xctrl.XCtrl.send_keys('KP_Enter', 0)
+                if '\n' in text:
+                    # Press enter multiple times for multiline texts
+                    for _ in range(vimtk_multiline_num_press_enter - 1):
+                        xctrl.XCtrl.send_keys('KP_Enter', 0)
+            if return_to_vim:
+                with span('focus vim'):
+                    active_gvim.focus(sleeptime, sync=True, timeout=focus_timeout)
+        finally:
+            with span('autorepeat on'):
+                xctrl.XCtrl.set_autorepeat(True)
 
 
 def vim_argv(defaults=None):
@@ -1367,6 +1580,7 @@ def extract_url_embeding(word):
     return word
 
 
+@traced
 def find_and_open_path(path, mode='split', verbose=0,
                        enable_python=True,
                        enable_url=True, enable_cli=True):
@@ -1384,13 +1598,14 @@ def find_and_open_path(path, mode='split', verbose=0,
     def try_open(path, step=''):
         # base = '/home/joncrall/code/VIAME/packages/kwiver/sprokit/src/bindings/python/sprokit/pipeline'
         # base = '/home'
-        if path and exists(path):
-            if verbose:
-                print('EXISTS path = {!r}\n'.format(path))
-            open_path(path, mode=mode, verbose=verbose)
-            return True
-        else:
-            print(f'Tried {step}, but failed: path={path}')
+        with span('try_open', step=step):
+            if path and exists(path):
+                if verbose:
+                    print('EXISTS path = {!r}\n'.format(path))
+                open_path(path, mode=mode, verbose=verbose)
+                return True
+            else:
+                print(f'Tried {step}, but failed: path={path}')
 
     def expand_module(path):
         # TODO: use ubelt util_import instead
@@ -1440,7 +1655,8 @@ def find_and_open_path(path, mode='split', verbose=0,
 
     if enable_url:
         # https://github.com/Erotemic
-        url = extract_url_embeding(path)
+        with span('extract url'):
+            url = extract_url_embeding(path)
         if is_url(url):
             import webbrowser
             webbrowser.open(url)
@@ -1593,7 +1809,8 @@ def find_and_open_path(path, mode='split', verbose=0,
         start = os.getcwd()
         candidates += list(ancestor_paths(start, limit=limit))
     candidates += os.environ['PATH'].split(os.sep)
-    result = search_candidate_paths(candidates, [path], verbose=verbose)
+    with span('search candidate paths', num_candidates=len(candidates)):
+        result = search_candidate_paths(candidates, [path], verbose=verbose)
     if result is not None:
         path = result
 
@@ -1601,27 +1818,29 @@ def find_and_open_path(path, mode='split', verbose=0,
     if os.path.islink(current_fpath):
         newbase = os.path.dirname(os.path.realpath(current_fpath))
         resolved_path = os.path.join(newbase, path)
-        if try_open(resolved_path):
+        if try_open(resolved_path, 'after resolving symlinks'):
             return
 
-    if try_open(path):
+    if try_open(path, 'after candidate search'):
         return
     else:
         print('enable_python = {!r}'.format(enable_python))
         if enable_python:
-            pypath = expand_module(path)
+            with span('expand module'):
+                pypath = expand_module(path)
             print('pypath = {!r}'.format(pypath))
-            if try_open(pypath):
+            if try_open(pypath, 'as a python module'):
                 return
-            pypath = expand_module_prefix(path)
+            with span('expand module prefix'):
+                pypath = expand_module_prefix(path)
             print('pypath = {!r}'.format(pypath))
-            if try_open(pypath):
+            if try_open(pypath, 'as a python module prefix'):
                 return
 
         if re.match(r'--\w*=.*', path):
             # try and open if its a command line arg
             stripped_path = expanduser(re.sub(r'--\w*=', '', path))
-            if try_open(stripped_path):
+            if try_open(stripped_path, 'as a command line argument'):
                 return
         #vim.command('echoerr "Could not find path={}"'.format(path))
         print('Could not find path={!r}'.format(path))
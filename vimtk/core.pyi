@@ -1,4 +1,5 @@
 from os import PathLike
+from typing import Any, ContextManager, Dict, Iterator, List
 from _typeshed import Incomplete
 
 import vimtk._demo.vimmock
@@ -12,7 +13,7 @@ def mockvim(fpath: PathLike | None = None,
     ...
 
 
-def reload_vimtk() -> None:
+def reload_vimtk(force: bool = False) -> List[str]:
     ...
 
 
@@ -32,6 +33,16 @@ class Config:
     def __setitem__(self, key, value) -> None:
         ...
 
+    def invalidate(self) -> None:
+        ...
+
+    def snapshot(self) -> Dict[str, Any]:
+        ...
+
+    def frozen(self,
+               snapshot: Dict[str, Any]) -> ContextManager[Config]:
+        ...
+
     def get(self, key, default: Incomplete | None = ..., context: str = ...):
         ...
 
@@ -72,6 +83,14 @@ class TextSelector:
     def text_between_lines(lnum1, lnum2, col1: int = ..., col2=...):
         ...
 
+    @staticmethod
+    def iter_lines_between(lnum1: int,
+                           lnum2: int,
+                           col1: int = ...,
+                           col2: int = ...,
+                           blocksize: int = ...) -> Iterator[str]:
+        ...
+
     @staticmethod
     def line_at_cursor():
         ...
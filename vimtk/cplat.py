@@ -2,23 +2,40 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 from collections import OrderedDict
 from vimtk import util
+from vimtk.stats import STATS
 import sys
 import logging
 logger = logging.getLogger(__name__)
 
 
-try:
-    import pyperclip
-except (ImportError, Exception) as ex:
-    msg = ('Warning: Python cannot import pyperclip: '
-           'python version={}, prefix={}, ex={!r}').format(
-               sys.version_info, sys.prefix, ex)
-    logger.warn(msg)
-    pyperclip = None
-    # raise
-
 __PyQt__ = None
 
+# Sentinel meaning pyperclip has not been imported yet
+_NOT_IMPORTED = object()
+pyperclip = _NOT_IMPORTED
+
+
+def _import_pyperclip():
+    """
+    Lazy import of pyperclip, which is only needed the first time the
+    clipboard is used.
+
+    Returns:
+        ModuleType | None: the pyperclip module or None if it is unavailable
+    """
+    global pyperclip
+    if pyperclip is _NOT_IMPORTED:
+        try:
+            import pyperclip as pyperclip_
+        except (ImportError, Exception) as ex:
+            msg = ('Warning: Python cannot import pyperclip: '
+                   'python version={}, prefix={}, ex={!r}').format(
+                       sys.version_info, sys.prefix, ex)
+            logger.warn(msg)
+            pyperclip_ = None
+        pyperclip = pyperclip_
+    return pyperclip
+
 
 class _PyQtWraper(object):
     """
@@ -143,6 +160,7 @@ def _ensure_clipboard_backend():
         >>> assert pasted2 == text2
         >>> copy_text_to_clipboard(prev)
     """
+    pyperclip = _import_pyperclip()
     if getattr(pyperclip, '_vimtk_monkey_backend', 'no') != 'no':
         return
 
@@ -176,16 +194,40 @@ def _ensure_clipboard_backend():
             print('warning %r not installed' % (backend,))
 
 
+#: argv for the command line clipboard backends. These are run directly with
+#: :mod:`vimtk.runner` instead of through pyperclip.
+_CLI_CLIPBOARD_ARGV = {
+    'xclip': {
+        'copy': ['xclip', '-selection', 'c'],
+        'paste': ['xclip', '-selection', 'c', '-o'],
+    },
+    'xsel': {
+        'copy': ['xsel', '-b', '-i'],
+        'paste': ['xsel', '-b', '-o'],
+    },
+}
+
+
 def copy_text_to_clipboard(text):
     """
     Copies text to the clipboard
     """
     _ensure_clipboard_backend()
+    pyperclip = _import_pyperclip()
     if pyperclip is None:
         raise Exception(
             'pyperclip is not appear to be installed. '
             'See also: https://github.com/Erotemic/vimtk/issues/5')
-    pyperclip.copy(text)
+    backend = getattr(pyperclip, '_vimtk_monkey_backend', None)
+    if backend in _CLI_CLIPBOARD_ARGV:
+        from vimtk import runner
+        # xclip forks a child that owns the selection and keeps the output
+        # pipes open, so do not capture them.
+        runner.run(_CLI_CLIPBOARD_ARGV[backend]['copy'], input=text,
+                   capture=False, check=True)
+        return
+    with STATS.timed('clipboard', 'copy'):
+        pyperclip.copy(text)
 
 
 def get_clipboard():
@@ -194,11 +236,18 @@ def get_clipboard():
         http://stackoverflow.com/questions/11063458/python-script-to-copy-text-to-clipboard
     """
     _ensure_clipboard_backend()
+    pyperclip = _import_pyperclip()
     if pyperclip is None:
         raise Exception(
             'pyperclip is not appear to be installed. '
             'See also: https://github.com/Erotemic/vimtk/issues/5')
-    text = pyperclip.paste()
+    backend = getattr(pyperclip, '_vimtk_monkey_backend', None)
+    if backend in _CLI_CLIPBOARD_ARGV:
+        from vimtk import runner
+        info = runner.run(_CLI_CLIPBOARD_ARGV[backend]['paste'], check=True)
+        return info['out']
+    with STATS.timed('clipboard', 'paste'):
+        text = pyperclip.paste()
     return text
 
 
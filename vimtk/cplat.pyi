@@ -1,8 +1,12 @@
 from _typeshed import Incomplete
 
 logger: Incomplete
-msg: Incomplete
 __PyQt__: Incomplete
+pyperclip: Incomplete
+
+
+def _import_pyperclip():
+    ...
 
 
 class _PyQtWraper:
@@ -0,0 +1,245 @@
+r"""
+Captures what the REPL prints for each text sent to the terminal and appends
+it to a scratch buffer in vim.
+
+With ``let g:vimtk_capture_output = 1`` every send through a terminal
+backend that owns the REPL channel is followed by a capture of its output:
+
+* The ``jupyter`` backend reads what the kernel publishes for the request:
+  printed streams, the plain text of results and display data, and
+  tracebacks.
+
+* The ``tmux`` backend reads the lines that appear in the pane after the
+  paste with ``capture-pane``, including the echo of the pasted text, until
+  the pane printed nothing for ``g:vimtk_capture_idle_time`` seconds.
+
+The ``gui`` backend cannot read the terminal, so nothing is captured for it.
+
+The output goes to the ``[vimtk output]`` buffer (``buftype=nofile``), which
+is shown in a window of ``g:vimtk_output_height`` lines at the bottom without
+taking the focus. Each send starts with a ``#`` header line with the time
+and the first line of the text, so results can be searched like any buffer.
+
+Captures run one after another in a worker thread, in the order of the
+sends, and hand each piece of output to the :mod:`vimtk.aio` event loop. The
+vim timer that pumps the loop appends the pieces to the buffer as they
+arrive, so long running code streams its output while vim stays responsive.
+
+Example:
+    >>> import vimtk
+    >>> from vimtk import aio, output
+    >>> class Echo(object):
+    >>>     def send(self, text, return_to_vim=True):
+    >>>         return text
+    >>>     def iter_output(self, handle, timeout=None):
+    >>>         yield 'Out: '
+    >>>         yield handle.upper() + '\n'
+    >>> vim = vimtk.mockvim()
+    >>> vim.eval('let g:vimtk_capture_output = 1')
+    >>> vimtk.CONFIG.invalidate()
+    >>> buffer = output.ScratchBuffer(lines=[''])
+    >>> backend = Echo()
+    >>> for text in ['x = 1', 'y = 2']:
+    >>>     future = output.capture(backend, backend.send(text), text, buffer=buffer)
+    >>> while aio.pump():
+    >>>     pass
+    >>> # Each send has a header with the time and the text
+    >>> import re
+    >>> [re.sub('[0-9:]{8} ', '', line) for line in buffer.lines]
+    ['# x = 1', 'Out: X = 1', '# y = 2', 'Out: Y = 2', '']
+    >>> import sys
+    >>> _ = sys.modules.pop('vim', None)
+    >>> vimtk.CONFIG.invalidate()
+"""
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def capture_enabled():
+    """
+    Returns:
+        bool: if ``g:vimtk_capture_output`` is set
+    """
+    from vimtk.core import CONFIG
+    return str(CONFIG.get('vimtk_capture_output', 0)) not in {'0', ''}
+
+
+# Escape sequences that color or move the cursor, e.g. in IPython tracebacks
+_ANSI = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b[@-Z\\-_]')
+
+
+def strip_ansi(text):
+    r"""
+    Args:
+        text (str): terminal output
+
+    Returns:
+        str: the text without ANSI escape sequences
+
+    Example:
+        >>> from vimtk.output import strip_ansi
+        >>> strip_ansi('\x1b[0;31mZeroDivisionError\x1b[0m: division by zero')
+        'ZeroDivisionError: division by zero'
+    """
+    return _ANSI.sub('', text)
+
+
+def _overwrite(line):
+    # A carriage return starts the line over, like progress bars expect
+    return line.rsplit('\r', 1)[-1]
+
+
+def _summary(text, width=60):
+    r"""
+    Example:
+        >>> from vimtk.output import _summary
+        >>> _summary('\n    for i in range(3):\n        print(i)\n')
+        'for i in range(3): ...'
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ''
+    first = lines[0][:width]
+    if len(lines) > 1 or len(lines[0]) > width:
+        first += ' ...'
+    return first
+
+
+class ScratchBuffer(object):
+    r"""
+    Appends output text to lines, continuing the last line when the previous
+    text did not end with a newline. The last line is where the next text
+    goes, so it is empty after a complete line.
+
+    Args:
+        lines (List[str] | None): the lines to append to. Defaults to the
+            ``[vimtk output]`` buffer in vim, or to a new list outside of vim.
+
+    Example:
+        >>> from vimtk.output import ScratchBuffer
+        >>> buffer = ScratchBuffer(lines=[''])
+        >>> buffer.write('a')
+        >>> buffer.write('b\nc\n')
+        >>> buffer.write('10%\r100%\n')
+        >>> buffer.write_header('next')
+        >>> buffer.lines
+        ['ab', 'c', '100%', '# next', '']
+    """
+
+    def __init__(self, lines=None):
+        self._lines = lines
+
+    @property
+    def lines(self):
+        """
+        List[str] | vim.Buffer: the lines that are appended to
+        """
+        if self._lines is not None:
+            return self._lines
+        try:
+            import vim
+        except ImportError:
+            self._lines = ['']
+            return self._lines
+        from vimtk.core import CONFIG
+        height = int(CONFIG.get('vimtk_output_height', 10) or 0)
+        bufnr = int(vim.eval('vimtk#output_bufnr({})'.format(height)))
+        for buf in vim.buffers:
+            if buf.number == bufnr:
+                return buf
+        raise KeyError('vimtk output buffer {} does not exist'.format(bufnr))
+
+    def write(self, text):
+        """
+        Args:
+            text (str): output, possibly ending in the middle of a line
+        """
+        text = strip_ansi(text).replace('\r\n', '\n')
+        if not text:
+            return
+        lines = self.lines
+        first, *rest = text.split('\n')
+        lines[-1] = _overwrite(lines[-1] + first)
+        if rest:
+            rest = [_overwrite(line) for line in rest]
+            if isinstance(lines, list):
+                lines.extend(rest)
+            else:
+                # A vim buffer appends a list of lines at the end
+                lines.append(rest)
+        if self._lines is None:
+            import vim
+            vim.command('call vimtk#output_follow()')
+
+    def write_header(self, title):
+        """
+        Starts a new line with a ``#`` comment line.
+
+        Args:
+            title (str): the text of the header
+        """
+        if self.lines[-1]:
+            self.write('\n')
+        self.write('# {}\n'.format(title))
+
+
+#: The buffer that :func:`capture` writes to by default
+SCRATCH = ScratchBuffer()
+
+_EXECUTOR = None
+
+
+def _executor():
+    # One thread, so captures read their output in the order of the sends
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _EXECUTOR = ThreadPoolExecutor(max_workers=1)
+    return _EXECUTOR
+
+
+def capture(backend, handle, text='', buffer=None):
+    """
+    Appends the output of one send to a scratch buffer in the background, if
+    ``g:vimtk_capture_output`` is set and the backend can read its output.
+
+    Args:
+        backend (object): the :mod:`vimtk.terminal_backend` backend that sent
+            the text
+        handle (object): what its ``send`` returned
+        text (str): the text that was sent, for the header line
+        buffer (ScratchBuffer | None): defaults to :data:`SCRATCH`
+
+    Returns:
+        asyncio.Future | None: done when the capture finished, None if
+        nothing is captured
+    """
+    if not hasattr(backend, 'iter_output') or not capture_enabled():
+        return None
+    from vimtk import aio
+    from vimtk.send_queue import _config_snapshot
+    if buffer is None:
+        buffer = SCRATCH
+    title = '{} {}'.format(time.strftime('%H:%M:%S'), _summary(text)).rstrip()
+    return aio.submit(_capture(backend, handle, title, buffer,
+                               _config_snapshot()))
+
+
+async def _capture(backend, handle, title, buffer, config):
+    from vimtk.tracing import span
+    loop = asyncio.get_event_loop()
+
+    def _read():
+        # Runs in the capture thread, the pieces are written on the loop
+        from vimtk.core import CONFIG
+        loop.call_soon_threadsafe(buffer.write_header, title)
+        with CONFIG.frozen(config):
+            for piece in backend.iter_output(handle):
+                loop.call_soon_threadsafe(buffer.write, piece)
+
+    with span('capture output'):
+        await loop.run_in_executor(_executor(), _read)
@@ -0,0 +1,39 @@
+import asyncio
+from typing import List
+from _typeshed import Incomplete
+
+logger: Incomplete
+
+
+def capture_enabled() -> bool:
+    ...
+
+
+def strip_ansi(text: str) -> str:
+    ...
+
+
+class ScratchBuffer:
+
+    def __init__(self, lines: List[str] | None = None) -> None:
+        ...
+
+    @property
+    def lines(self) -> List[str] | Incomplete:
+        ...
+
+    def write(self, text: str) -> None:
+        ...
+
+    def write_header(self, title: str) -> None:
+        ...
+
+
+SCRATCH: ScratchBuffer
+
+
+def capture(backend: object,
+            handle: object,
+            text: str = '',
+            buffer: ScratchBuffer | None = None) -> asyncio.Future | None:
+    ...
@@ -0,0 +1,123 @@
+"""
+A bounded cache of process information for the windows vimtk searches.
+
+Matching windows by process name used to build a new :class:`psutil.Process`
+and read ``/proc`` for every window on every search. :class:`ProcessInfoCache`
+keeps the name, exe and cmdline of each process keyed by
+``(pid, create_time)``. A cached entry is validated with
+:meth:`psutil.Process.is_running`, which compares the creation time and so
+detects a reused pid. Entries are evicted when the process is gone or when
+the cache is full, least recently used first.
+
+Example:
+    >>> import os
+    >>> from vimtk.procinfo import ProcessInfoCache
+    >>> cache = ProcessInfoCache(maxsize=4)
+    >>> info = cache.info(os.getpid())
+    >>> assert info['pid'] == os.getpid()
+    >>> assert set(info) == {'pid', 'create_time', 'name', 'exe', 'cmdline'}
+    >>> assert cache.info(os.getpid()) is info
+    >>> assert cache.name(os.getpid()) == info['name']
+    >>> # Processes that do not exist have no info
+    >>> assert cache.info(2 ** 22 + 1) is None
+"""
+import logging
+from collections import OrderedDict
+
+from vimtk.stats import STATS
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessInfoCache(object):
+    """
+    Args:
+        maxsize (int): maximum number of processes to remember
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        # Maps pid to a (psutil.Process, info) tuple. The process object
+        # remembers the create time, which is the second half of the key.
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def evict(self, pid):
+        self._entries.pop(pid, None)
+
+    def _lookup(self, pid):
+        import psutil
+        entry = self._entries.get(pid, None)
+        if entry is not None:
+            if entry[0].is_running():
+                STATS.record('process_cache', 'hit')
+                self._entries.move_to_end(pid)
+                return entry
+            # The process exited or its pid was reused
+            del self._entries[pid]
+        STATS.record('process_cache', 'miss')
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                info = {
+                    'pid': pid,
+                    'create_time': proc.create_time(),
+                    'name': proc.name(),
+                    'exe': _safe(proc.exe),
+                    'cmdline': _safe(proc.cmdline),
+                }
+        except (psutil.NoSuchProcess, ValueError):
+            return None
+        entry = self._entries[pid] = (proc, info)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def process(self, pid):
+        """
+        Returns:
+            psutil.Process: the cached process object
+
+        Raises:
+            psutil.NoSuchProcess: if the process does not exist
+        """
+        entry = self._lookup(pid)
+        if entry is None:
+            import psutil
+            raise psutil.NoSuchProcess(pid)
+        return entry[0]
+
+    def info(self, pid):
+        """
+        Returns:
+            Dict | None: ``pid``, ``create_time``, ``name``, ``exe`` and
+            ``cmdline`` of a process, or None if it does not exist. ``exe``
+            and ``cmdline`` are None when access is denied.
+        """
+        entry = self._lookup(pid)
+        return None if entry is None else entry[1]
+
+    def name(self, pid):
+        """
+        Returns:
+            str | None: the process name, or None if it does not exist
+        """
+        entry = self._lookup(pid)
+        return None if entry is None else entry[1]['name']
+
+
+def _safe(func):
+    import psutil
+    try:
+        return func()
+    except (psutil.AccessDenied, psutil.ZombieProcess):
+        return None
+
+
+#: The cache shared by :mod:`vimtk.xctrl` and :mod:`vimtk.win32_ctrl`
+PROCESS_CACHE = ProcessInfoCache()
@@ -0,0 +1,32 @@
+from typing import Dict
+from _typeshed import Incomplete
+
+logger: Incomplete
+
+
+class ProcessInfoCache:
+    maxsize: int
+
+    def __init__(self, maxsize: int = 256) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def evict(self, pid: int) -> None:
+        ...
+
+    def process(self, pid: int) -> Incomplete:
+        ...
+
+    def info(self, pid: int) -> Dict | None:
+        ...
+
+    def name(self, pid: int) -> str | None:
+        ...
+
+
+PROCESS_CACHE: ProcessInfoCache
@@ -0,0 +1,274 @@
+r"""
+Incremental reloading of vimtk modules for development.
+
+:func:`reload_stale` only reloads the modules whose source changed since they
+were (re)loaded, plus the modules that depend on them, in dependency order.
+Everything else, including caches like the :class:`vimtk.core.Config`
+snapshot or the :mod:`vimtk.stats` counters, is left alone.
+
+The dependency graph only includes imports made at module level. vimtk
+imports most of its backends inside of functions, and those imports look
+the module up in ``sys.modules`` each time, so they always see the newest
+version without their importer being reloaded.
+
+Example:
+    >>> import sys
+    >>> import time
+    >>> import ubelt as ub
+    >>> from vimtk import reloader
+    >>> dpath = ub.Path.appdir('vimtk/tests/reloader').delete().ensuredir()
+    >>> pkg = (dpath / 'demo_reload_pkg').ensuredir()
+    >>> (pkg / '__init__.py').write_text('')
+    >>> (pkg / 'base.py').write_text('VALUE = 1\n')
+    >>> (pkg / 'mid.py').write_text('from demo_reload_pkg.base import VALUE\n')
+    >>> (pkg / 'other.py').write_text('CACHE = {}\n')
+    >>> sys.path.insert(0, str(dpath))
+    >>> import demo_reload_pkg.mid
+    >>> import demo_reload_pkg.other
+    >>> demo_reload_pkg.other.CACHE['key'] = 'survives'
+    >>> reloader.snapshot('demo_reload_pkg')
+    >>> assert reloader.reload_stale('demo_reload_pkg') == []
+    >>> time.sleep(0.01)
+    >>> (pkg / 'base.py').write_text('VALUE = 2\n')
+    >>> print(reloader.reload_stale('demo_reload_pkg'))
+    ['demo_reload_pkg.base', 'demo_reload_pkg.mid']
+    >>> assert demo_reload_pkg.mid.VALUE == 2
+    >>> assert demo_reload_pkg.other.CACHE['key'] == 'survives'
+    >>> sys.path.remove(str(dpath))
+    >>> for key in [k for k in sys.modules if k.startswith('demo_reload_pkg')]:
+    >>>     del sys.modules[key]
+"""
+import ast
+import importlib
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+#: Maps module names to the source mtime seen when they were last (re)loaded.
+#: Kept across a reload of this module.
+_LOADED_MTIMES = globals().get('_LOADED_MTIMES', {})
+
+
+def loaded_modules(package='vimtk'):
+    """
+    Returns:
+        Dict[str, ModuleType]: the loaded modules in a package that come from
+        a python source file
+    """
+    prefix = package + '.'
+    modules = {}
+    for modname, module in list(sys.modules.items()):
+        if module is None:
+            continue
+        if modname == package or modname.startswith(prefix):
+            fpath = getattr(module, '__file__', None)
+            if fpath and fpath.endswith('.py'):
+                modules[modname] = module
+    return modules
+
+
+def _mtime(module):
+    try:
+        return os.stat(module.__file__).st_mtime
+    except OSError:
+        return None
+
+
+def snapshot(package='vimtk'):
+    """
+    Records the current source mtimes of the loaded modules in a package as
+    up to date.
+    """
+    for modname, module in loaded_modules(package).items():
+        _LOADED_MTIMES[modname] = _mtime(module)
+
+
+def stale_modules(package='vimtk'):
+    """
+    Returns:
+        List[str]: loaded modules whose source changed since they were loaded.
+
+    Modules without a recorded mtime are compared against the time the
+    package was imported (``_IMPORT_TIME`` in its ``__init__``), if it has
+    one.
+    """
+    modules = loaded_modules(package)
+    import_time = getattr(sys.modules.get(package), '_IMPORT_TIME', None)
+    stale = []
+    for modname, module in modules.items():
+        mtime = _mtime(module)
+        if mtime is None:
+            continue
+        if modname in _LOADED_MTIMES:
+            if mtime != _LOADED_MTIMES[modname]:
+                stale.append(modname)
+        elif import_time is not None and mtime > import_time:
+            stale.append(modname)
+        else:
+            _LOADED_MTIMES[modname] = mtime
+    return sorted(stale)
+
+
+def _toplevel_imports(module, known):
+    """
+    Finds the modules in ``known`` that a module imports at module level,
+    including imports inside of top-level ``try`` and ``if`` blocks.
+    """
+    with open(module.__file__, 'rb') as file:
+        tree = ast.parse(file.read(), module.__file__)
+    is_package = hasattr(module, '__path__')
+    package = module.__name__ if is_package else module.__name__.rpartition('.')[0]
+
+    deps = set()
+    stack = list(tree.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in known:
+                    deps.add(alias.name)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package
+                for _ in range(node.level - 1):
+                    base = base.rpartition('.')[0]
+                base = base + '.' + node.module if node.module else base
+            else:
+                base = node.module
+            for alias in node.names:
+                # ``from pkg import submodule`` depends on the submodule
+                candidate = base + '.' + alias.name
+                if candidate in known:
+                    deps.add(candidate)
+                elif base in known:
+                    deps.add(base)
+        elif isinstance(node, (ast.Try, ast.If)):
+            stack.extend(node.body)
+            stack.extend(node.orelse)
+            stack.extend(getattr(node, 'finalbody', []))
+            for handler in getattr(node, 'handlers', []):
+                stack.extend(handler.body)
+    deps.discard(module.__name__)
+    return deps
+
+
+def import_graph(package='vimtk'):
+    """
+    Returns:
+        Dict[str, Set[str]]: maps each loaded module in the package to the
+        loaded modules it imports at module level
+
+    Example:
+        >>> from vimtk import reloader
+        >>> import vimtk.core
+        >>> graph = reloader.import_graph()
+        >>> assert 'vimtk.util' in graph['vimtk.core']
+    """
+    modules = loaded_modules(package)
+    return {modname: _toplevel_imports(module, modules)
+            for modname, module in modules.items()}
+
+
+def _dependents_order(graph, roots):
+    """
+    Returns the roots and everything that depends on them, ordered so that
+    every module comes after the modules it imports.
+    """
+    reverse = {modname: set() for modname in graph}
+    for modname, deps in graph.items():
+        for dep in deps:
+            reverse[dep].add(modname)
+
+    affected = set()
+    stack = list(roots)
+    while stack:
+        modname = stack.pop()
+        if modname not in affected:
+            affected.add(modname)
+            stack.extend(reverse.get(modname, ()))
+
+    order = []
+    visiting = set()
+    visited = set()
+
+    def visit(modname):
+        if modname in visited:
+            return
+        if modname in visiting:
+            # Import cycle, the partial order is the best we can do
+            return
+        visiting.add(modname)
+        for dep in sorted(graph.get(modname, ())):
+            if dep in affected:
+                visit(dep)
+        visiting.discard(modname)
+        visited.add(modname)
+        order.append(modname)
+
+    for modname in sorted(affected):
+        visit(modname)
+    return order
+
+
+def _forget_lazy_attrs(package, old_values):
+    """
+    The package ``__getattr__`` caches lazily imported attributes in its
+    globals. Drop the ones that came from a reloaded module so they are
+    looked up again.
+    """
+    pkg_module = sys.modules.get(package)
+    if pkg_module is None:
+        return
+    namespace = pkg_module.__dict__
+    for name, value in list(namespace.items()):
+        if name.startswith('__'):
+            continue
+        if id(value) in old_values and old_values[id(value)] is value:
+            if not hasattr(value, '__spec__'):
+                del namespace[name]
+
+
+def reload_stale(package='vimtk', force=False):
+    """
+    Reloads the modules of a package whose source changed, and the modules
+    that depend on them, in dependency order.
+
+    Args:
+        package (str): the top level package name
+        force (bool): if True reload every loaded module in the package
+
+    Returns:
+        List[str]: the names of the reloaded modules, in reload order
+    """
+    modules = loaded_modules(package)
+    if force:
+        roots = list(modules)
+    else:
+        roots = stale_modules(package)
+    if not roots:
+        logger.debug('Nothing to reload')
+        return []
+
+    graph = import_graph(package)
+    order = _dependents_order(graph, roots)
+
+    # Remember the objects the old modules defined, so cached references to
+    # them can be dropped afterwards.
+    old_values = {}
+    for modname in order:
+        if modname != package:
+            for value in vars(modules[modname]).values():
+                old_values[id(value)] = value
+
+    reloaded = []
+    for modname in order:
+        module = sys.modules[modname]
+        logger.debug('Reloading {}'.format(modname))
+        importlib.reload(module)
+        _LOADED_MTIMES[modname] = _mtime(module)
+        reloaded.append(modname)
+
+    _forget_lazy_attrs(package, old_values)
+    return reloaded
@@ -0,0 +1,25 @@
+from types import ModuleType
+from typing import Dict, List, Set
+from _typeshed import Incomplete
+
+logger: Incomplete
+
+
+def loaded_modules(package: str = 'vimtk') -> Dict[str, ModuleType]:
+    ...
+
+
+def snapshot(package: str = 'vimtk') -> None:
+    ...
+
+
+def stale_modules(package: str = 'vimtk') -> List[str]:
+    ...
+
+
+def import_graph(package: str = 'vimtk') -> Dict[str, Set[str]]:
+    ...
+
+
+def reload_stale(package: str = 'vimtk', force: bool = False) -> List[str]:
+    ...
@@ -0,0 +1,334 @@
+"""
+A small process runner for the short-lived helper programs vimtk calls on
+every keypress (``wmctrl``, ``xprop``, ``xdotool``, ``xset``, ``xclip``).
+
+Compared to :func:`ubelt.cmd` this does as little as possible:
+
+* Commands are argv lists and never go through a shell. Strings are split
+  with :func:`shlex.split` for convenience.
+* Executables are resolved with :func:`shutil.which` once and cached, so the
+  child does not search the PATH on every call.
+* Only the pipes that are needed are created, and every call has a timeout.
+  :meth:`subprocess.Popen.communicate` implements timeouts by polling the
+  child with sleeps, which costs about a millisecond per call. On Linux the
+  runner waits on a pidfd instead.
+* Spawn and exit latency are recorded in :mod:`vimtk.stats` and
+  :mod:`vimtk.tracing`.
+
+The returned dictionary has the same ``out``, ``err``, and ``ret`` keys as
+:func:`ubelt.cmd`, so it is a drop-in replacement for existing callers.
+
+Example:
+    >>> from vimtk import runner
+    >>> import sys
+    >>> info = runner.run([sys.executable, '-c', 'print("hello")'])
+    >>> print(info['out'].strip())
+    hello
+    >>> assert info['ret'] == 0
+    >>> assert info['spawn_time'] <= info['elapsed']
+"""
+import logging
+import os
+import select
+import selectors
+import shlex
+import shutil
+import subprocess
+import time
+
+from vimtk.stats import STATS
+from vimtk.tracing import span
+
+logger = logging.getLogger(__name__)
+
+#: Seconds to wait for a command before it is killed
+DEFAULT_TIMEOUT = 10
+
+_WHICH_CACHE = {}
+
+# poll is cheaper to set up than epoll for the one or two pipes of a child
+if hasattr(selectors, 'PollSelector'):
+    _Selector = selectors.PollSelector
+else:
+    _Selector = selectors.SelectSelector
+
+
+def which(name):
+    """
+    Finds an executable on the PATH. Found paths are cached, missing ones are
+    looked up again on the next call in case they were installed.
+
+    Args:
+        name (str): name or path of the executable
+
+    Returns:
+        str | None: absolute path to the executable
+    """
+    try:
+        return _WHICH_CACHE[name]
+    except KeyError:
+        pass
+    fpath = shutil.which(name)
+    if fpath is not None:
+        fpath = os.path.abspath(fpath)
+        _WHICH_CACHE[name] = fpath
+    return fpath
+
+
+def clear_which_cache():
+    _WHICH_CACHE.clear()
+
+
+def run(command, input=None, timeout=DEFAULT_TIMEOUT, capture=True,
+        check=False, verbose=0):
+    r"""
+    Runs a command and waits for it to finish.
+
+    Args:
+        command (List[str] | str): argv list. A string is split with
+            :func:`shlex.split`, it is never passed to a shell.
+
+        input (str | None): text written to the stdin of the process.
+            If None, stdin is connected to ``/dev/null``.
+
+        timeout (float | None): seconds to wait before the process is killed
+
+        capture (bool): if False, stdout and stderr are discarded. Use this
+            for programs like ``xclip`` that fork a child which keeps the
+            output pipes open.
+
+        check (bool): if True raise :class:`subprocess.CalledProcessError` on
+            a non-zero exit code
+
+        verbose (int): if truthy, print the command and its output
+
+    Returns:
+        Dict: with keys ``out``, ``err``, ``ret``, ``command``,
+        ``timed_out``, ``spawn_time`` (seconds until the process was
+        started), and ``elapsed`` (seconds until it exited).
+
+    Raises:
+        FileNotFoundError: if the executable does not exist
+
+    Example:
+        >>> from vimtk import runner
+        >>> import sys
+        >>> info = runner.run([sys.executable, '-c', 'import time; time.sleep(10)'], timeout=0.1)
+        >>> assert info['timed_out']
+        >>> assert info['ret'] != 0
+        >>> # Output written before the timeout is kept, like subprocess.run
+        >>> code = 'import time; print("partial", flush=True); time.sleep(10)'
+        >>> info = runner.run([sys.executable, '-c', code], timeout=1)
+        >>> assert info['timed_out']
+        >>> assert info['out'] == 'partial\n'
+        >>> info = runner.run([sys.executable, '-c', 'import sys; print(sys.stdin.read()[::-1])'], input='abc')
+        >>> assert info['out'].strip() == 'cba'
+        >>> # Input larger than a pipe buffer is written while the output is
+        >>> # read, so a child that echoes it back does not deadlock
+        >>> code = 'import sys; sys.stdout.write(sys.stdin.read())'
+        >>> info = runner.run([sys.executable, '-c', code], input='x' * 1000000, timeout=10)
+        >>> assert len(info['out']) == 1000000 and not info['timed_out']
+    """
+    argv = _argv(command)
+    if verbose:
+        print('[runner] {}'.format(' '.join(map(shlex.quote, argv))))
+    with STATS.timed('spawn', os.path.basename(argv[0])), span('spawn', argv=argv):
+        job = _Job(argv, input, capture)
+        info = job.collect(timeout)
+    if verbose:
+        if info['out']:
+            print(info['out'], end='')
+        if info['err']:
+            print(info['err'], end='')
+    if check and info['ret'] != 0:
+        raise subprocess.CalledProcessError(
+            info['ret'], argv, output=info['out'], stderr=info['err'])
+    return info
+
+
+def run_many(commands, timeout=DEFAULT_TIMEOUT):
+    """
+    Starts several commands at once and then waits for all of them, so their
+    start up costs overlap. Each process is counted as a spawn in
+    :mod:`vimtk.stats`.
+
+    Args:
+        commands (List[List[str] | str]): the argv of each command
+        timeout (float | None): seconds to wait for all of them together
+
+    Returns:
+        List[Dict]: the result of each command as returned by :func:`run`,
+        in order
+
+    Example:
+        >>> from vimtk import runner
+        >>> import sys
+        >>> infos = runner.run_many([[sys.executable, '-c', 'print({})'.format(i)]
+        >>>                          for i in range(3)])
+        >>> [info['out'].strip() for info in infos]
+        ['0', '1', '2']
+    """
+    argvs = [_argv(command) for command in commands]
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with span('spawn many', num=len(argvs)):
+        jobs = []
+        try:
+            for argv in argvs:
+                jobs.append(_Job(argv, None, True))
+        except Exception:
+            for job in jobs:
+                job.proc.kill()
+                job.proc.communicate()
+            raise
+        infos = []
+        for job in jobs:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+            info = job.collect(remaining)
+            STATS.record('spawn', os.path.basename(job.argv[0]),
+                         info['elapsed'])
+            infos.append(info)
+    return infos
+
+
+def _argv(command):
+    if isinstance(command, str):
+        argv = shlex.split(command)
+    else:
+        argv = list(command)
+    return argv
+
+
+class _Job(object):
+    """
+    A started process whose output is collected later
+    """
+
+    def __init__(self, argv, input, capture):
+        exe = which(argv[0])
+        if exe is None:
+            raise FileNotFoundError('Cannot find executable {!r}'.format(argv[0]))
+        self.argv = argv
+        self.data = None if input is None else input.encode('utf8')
+        pipe = subprocess.PIPE if capture else subprocess.DEVNULL
+        self.start = time.perf_counter()
+        self.proc = subprocess.Popen(
+            argv, executable=exe,
+            stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+            stdout=pipe, stderr=pipe)
+        self.spawn_time = time.perf_counter() - self.start
+
+    def collect(self, timeout):
+        """
+        Waits for the process, killing it after ``timeout`` seconds.
+
+        Returns:
+            Dict: see :func:`run`
+        """
+        proc = self.proc
+        try:
+            out, err = _communicate(proc, self.data, timeout)
+            timed_out = False
+        except subprocess.TimeoutExpired as ex:
+            logger.warning('Killed {} after {}s'.format(self.argv, timeout))
+            out, err = ex.output, ex.stderr
+            timed_out = True
+        return {
+            'out': out.decode('utf8', errors='replace') if out else '',
+            'err': err.decode('utf8', errors='replace') if err else '',
+            'ret': proc.returncode,
+            'command': self.argv,
+            'timed_out': timed_out,
+            'spawn_time': self.spawn_time,
+            'elapsed': time.perf_counter() - self.start,
+        }
+
+
+def _communicate(proc, data, timeout):
+    """
+    Like :meth:`subprocess.Popen.communicate`, but waits for the exit of the
+    child on a pidfd, where available, instead of polling it, and kills the
+    child when the timeout expires.
+
+    Raises:
+        subprocess.TimeoutExpired: after the child was killed. Its ``output``
+            and ``stderr`` hold everything the child wrote, like
+            :func:`subprocess.run` reports it.
+    """
+    if timeout is None or not hasattr(os, 'pidfd_open'):
+        try:
+            return proc.communicate(data, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            # communicate keeps what it read before the timeout
+            out, err = proc.communicate()
+            raise subprocess.TimeoutExpired(
+                proc.args, timeout, output=out, stderr=err)
+
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    chunks = {}
+    with _Selector() as selector:
+        if data is not None:
+            # The input is written in pieces from the same loop that reads the
+            # output, so a child that writes while it reads cannot deadlock
+            if data:
+                selector.register(proc.stdin, selectors.EVENT_WRITE)
+            else:
+                proc.stdin.close()
+            view = memoryview(data)
+            offset = 0
+        for stream in (proc.stdout, proc.stderr):
+            if stream is not None:
+                chunks[stream] = []
+                selector.register(stream, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = None
+            if not timed_out:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # Keep reading what the child wrote until its pipes close
+                    proc.kill()
+                    timed_out = True
+                    if data is not None and not proc.stdin.closed:
+                        selector.unregister(proc.stdin)
+                        proc.stdin.close()
+                    continue
+            for key, _ in selector.select(remaining):
+                if key.fileobj is proc.stdin:
+                    try:
+                        # A writable pipe takes PIPE_BUF bytes without blocking
+                        offset += os.write(
+                            key.fd, view[offset:offset + select.PIPE_BUF])
+                    except BrokenPipeError:
+                        offset = len(data)
+                    if offset >= len(data):
+                        selector.unregister(proc.stdin)
+                        proc.stdin.close()
+                    continue
+                chunk = os.read(key.fd, 32768)
+                if chunk:
+                    chunks[key.fileobj].append(chunk)
+                else:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+
+    # Usually the child has already exited when its pipes close
+    if not timed_out and proc.poll() is None:
+        pidfd = os.pidfd_open(proc.pid)
+        try:
+            remaining = max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([pidfd], [], [], remaining)
+        finally:
+            os.close(pidfd)
+        if not ready:
+            proc.kill()
+            timed_out = True
+    proc.wait()
+    out = b''.join(chunks[proc.stdout]) if proc.stdout is not None else None
+    err = b''.join(chunks[proc.stderr]) if proc.stderr is not None else None
+    if timed_out:
+        raise subprocess.TimeoutExpired(
+            proc.args, timeout, output=out, stderr=err)
+    return out, err
@@ -0,0 +1,27 @@
+from typing import Any, Dict, List
+from _typeshed import Incomplete
+
+logger: Incomplete
+DEFAULT_TIMEOUT: int
+
+
+def which(name: str) -> str | None:
+    ...
+
+
+def clear_which_cache() -> None:
+    ...
+
+
+def run(command: List[str] | str,
+        input: str | None = None,
+        timeout: float | None = DEFAULT_TIMEOUT,
+        capture: bool = True,
+        check: bool = False,
+        verbose: int = 0) -> Dict[str, Any]:
+    ...
+
+
+def run_many(commands: List[List[str] | str],
+             timeout: float | None = DEFAULT_TIMEOUT) -> List[Dict[str, Any]]:
+    ...
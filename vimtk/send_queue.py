@@ -0,0 +1,234 @@
+r"""
+A queue that sends text to the terminal without blocking vim.
+
+With ``let g:vimtk_async_send = 1``, ``vimtk#execute_text_in_terminal`` puts
+the text on :data:`QUEUE` and returns immediately. A worker task on the
+:mod:`vimtk.aio` event loop, which a vim timer pumps, takes the texts off the
+queue one send at a time, so vim stays responsive while a send runs:
+
+* The ``gui`` backend sends with :func:`vimtk.aio.execute_text`, whose waits
+  and process calls are awaited on the loop.
+
+* The other backends send, and wait for the send to finish, in a worker
+  thread. Only the main thread may call into vim, so the thread reads the
+  ``g:vimtk_*`` variables from a snapshot taken when the text was queued
+  (see :func:`vimtk.core.Config.frozen`).
+
+Texts that are queued while a send runs are coalesced: consecutive pending
+texts for the same backend and configuration are merged into one paste (see
+:func:`merge_texts`). Pressing ``<leader>a`` three times in a row costs at
+most two round trips instead of three. When a send finished, the pump timer
+echoes how many texts it contained, and failures are reported as errors.
+
+Example:
+    >>> from vimtk import aio, send_queue
+    >>> class Recorder(object):
+    >>>     sent = []
+    >>>     def send(self, text, return_to_vim=True):
+    >>>         self.sent.append(text)
+    >>>     def wait(self, handle, timeout=None):
+    >>>         pass
+    >>> backend = Recorder()
+    >>> queue = send_queue.SendQueue()
+    >>> futures = [queue.submit('x = {}'.format(i), backend=backend)
+    >>>            for i in range(3)]
+    >>> # Nothing was sent yet, the texts go out when the loop is pumped
+    >>> print(len(queue), Recorder.sent)
+    3 []
+    >>> while aio.pump():
+    >>>     pass
+    >>> print(Recorder.sent)
+    ['x = 0\nx = 1\nx = 2']
+    >>> print([future.result() for future in futures])
+    [3, 3, 3]
+"""
+import asyncio
+import collections
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def merge_texts(texts):
+    r"""
+    Joins texts so that they run in order when pasted at once. A blank line
+    follows a text that ends in an indented block, which makes a REPL close
+    the block before the next text starts.
+
+    Args:
+        texts (List[str]): the texts in the order they were queued
+
+    Returns:
+        str: the text of one paste
+
+    Example:
+        >>> from vimtk.send_queue import merge_texts
+        >>> print(merge_texts(['x = 1', 'for i in range(x):\n    print(i)\n', 'print(x)']))
+        x = 1
+        for i in range(x):
+            print(i)
+        <BLANKLINE>
+        print(x)
+    """
+    if len(texts) == 1:
+        return texts[0]
+    parts = []
+    for text in texts:
+        text = text.rstrip('\n')
+        if parts:
+            last_line = parts[-1].rsplit('\n', 1)[-1]
+            parts.append('\n\n' if last_line[:1] in {' ', '\t'} else '\n')
+        parts.append(text)
+    return ''.join(parts)
+
+
+def _config_snapshot():
+    # The g:vimtk_* variables that a worker thread is allowed to see
+    from vimtk.core import CONFIG
+    try:
+        return dict(CONFIG.snapshot())
+    except ImportError:
+        # Not running inside vim
+        return {}
+
+
+def _send_and_wait(backend, text, return_to_vim, config):
+    # Runs in a worker thread
+    from vimtk.core import CONFIG
+    with CONFIG.frozen(config):
+        handle = backend.send(text, return_to_vim=return_to_vim)
+        backend.wait(handle)
+    return handle
+
+
+def _echo(message):
+    try:
+        import vim
+    except ImportError:
+        logger.info(message)
+    else:
+        vim.command('echo "{}"'.format(message.replace('"', '\\"')))
+
+
+class _Job(object):
+    """
+    A text waiting in the queue. Jobs with equal keys and configurations can
+    be merged.
+    """
+
+    def __init__(self, text, return_to_vim, backend, key, config, future):
+        self.text = text
+        self.return_to_vim = return_to_vim
+        self.backend = backend
+        self.key = key
+        self.config = config
+        self.future = future
+
+    def can_merge(self, other):
+        return self.key == other.key and self.config == other.config
+
+
+class SendQueue(object):
+    """
+    Sends queued texts one after another from a task on the :mod:`vimtk.aio`
+    event loop, merging texts that were queued while a send ran.
+
+    Attributes:
+        pending (Deque[_Job]): texts that were not sent yet
+        num_texts (int): number of texts sent so far
+        num_sends (int): number of backend sends they took
+    """
+
+    def __init__(self):
+        self.pending = collections.deque()
+        self.num_texts = 0
+        self.num_sends = 0
+        self._worker = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def submit(self, text, return_to_vim=True, backend=None):
+        """
+        Queues a text and returns immediately.
+
+        Args:
+            text (str): the text to execute
+            return_to_vim (bool): passed to the backend
+            backend (object | None): a :mod:`vimtk.terminal_backend` backend,
+                defaults to the configured one. Only texts for the same
+                backend object, or for the configured backend, are merged.
+
+        Returns:
+            asyncio.Future: resolves to the number of texts in the paste that
+            contained this one
+        """
+        from vimtk import aio, terminal_backend
+        if backend is None:
+            key = terminal_backend.backend_name()
+            backend = terminal_backend.get(key)
+        else:
+            key = backend
+        future = aio.event_loop().create_future()
+        self.pending.append(_Job(text, return_to_vim, backend, key,
+                                 _config_snapshot(), future))
+        if self._worker is None or self._worker.done():
+            self._worker = aio.submit(self._work())
+        return future
+
+    def _pop_batch(self):
+        first = self.pending.popleft()
+        batch = [first]
+        while self.pending and first.can_merge(self.pending[0]):
+            batch.append(self.pending.popleft())
+        return batch
+
+    async def _work(self):
+        from vimtk import aio
+        from vimtk.tracing import span
+        while self.pending:
+            batch = self._pop_batch()
+            text = merge_texts([job.text for job in batch])
+            return_to_vim = any(job.return_to_vim for job in batch)
+            start = time.perf_counter()
+            try:
+                with span('queued send', num_texts=len(batch)):
+                    await self._send(batch[0], text, return_to_vim)
+            except Exception as ex:
+                aio._echo_error('vimtk send failed: {!r}'.format(ex))
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(ex)
+                        # The failure was reported, nobody has to await it
+                        job.future.exception()
+                continue
+            self.num_texts += len(batch)
+            self.num_sends += 1
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_result(len(batch))
+            _echo('vimtk: sent {} text{} in {:.2f}s'.format(
+                len(batch), '' if len(batch) == 1 else 's',
+                time.perf_counter() - start))
+
+    async def _send(self, job, text, return_to_vim):
+        from vimtk import aio, output, terminal_backend
+        if isinstance(job.backend, terminal_backend.GuiBackend):
+            if sys.platform.startswith('win32'):
+                # There is no coroutine version of the win32 steps
+                job.backend.send(text, return_to_vim=return_to_vim)
+            else:
+                await aio.execute_text(text, return_to_vim=return_to_vim)
+        else:
+            loop = asyncio.get_event_loop()
+            handle = await loop.run_in_executor(
+                None, _send_and_wait, job.backend, text, return_to_vim,
+                job.config)
+            # Captures start on the loop thread, which may call into vim
+            output.capture(job.backend, handle, text)
+
+
+#: The queue used by ``vimtk#execute_text_in_terminal``
+QUEUE = SendQueue()
@@ -0,0 +1,48 @@
+import asyncio
+import collections
+from typing import Any, Dict, List
+from _typeshed import Incomplete
+
+logger: Incomplete
+
+
+def merge_texts(texts: List[str]) -> str:
+    ...
+
+
+class _Job:
+    text: str
+    return_to_vim: bool
+    backend: object
+    key: object
+    config: Dict[str, Any]
+    future: asyncio.Future
+
+    def __init__(self, text: str, return_to_vim: bool, backend: object,
+                 key: object, config: Dict[str, Any],
+                 future: asyncio.Future) -> None:
+        ...
+
+    def can_merge(self, other: _Job) -> bool:
+        ...
+
+
+class SendQueue:
+    pending: collections.deque
+    num_texts: int
+    num_sends: int
+
+    def __init__(self) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def submit(self,
+               text: str,
+               return_to_vim: bool = True,
+               backend: object | None = None) -> asyncio.Future:
+        ...
+
+
+QUEUE: SendQueue
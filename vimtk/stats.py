@@ -0,0 +1,347 @@
+"""
+Counters and timers for the expensive operations that vimtk performs.
+
+Every call across the vim bridge (``vim.eval``, ``vim.command``, and buffer
+slices) and every process spawned by :class:`vimtk.xctrl.XCtrl` or the
+clipboard helpers in :mod:`vimtk.cplat` can be counted and timed. Records are
+attributed to the top-level vimtk command that triggered them (see
+:func:`vimtk.commands.dispatch`), so regressions like an extra ``wmctrl``
+call per keypress show up immediately.
+
+Collection is off by default. When it is off, each instrumented call site
+only pays for an attribute lookup and a boolean check.
+
+Inside vim use ``:VimtkStats on``, ``:VimtkStats``, ``:VimtkStats reset``, and
+``:VimtkStats off``.
+
+Example:
+    >>> import vimtk
+    >>> from vimtk import stats
+    >>> vim = vimtk.mockvim(text='foo = bar')
+    >>> stats.reset()
+    >>> stats.enable()
+    >>> with stats.command('demo'):
+    >>>     vimtk.TextSelector.word_at_cursor()
+    >>>     vimtk.get_current_filetype()
+    >>>     vimtk.TextSelector.text_between_lines(1, 1)
+    >>> stats.disable()
+    >>> summary = stats.summary()
+    >>> print(sorted(summary['demo']['vim']))
+    ['buffer.getitem', 'buffer.getslice', 'eval']
+    >>> assert summary['demo']['vim']['eval']['count'] == 1
+    >>> print(stats.report())
+    >>> stats.reset()
+"""
+import sys
+import time
+
+__all__ = [
+    'STATS', 'Stats', 'command', 'disable', 'enable', 'reset', 'summary',
+    'report',
+]
+
+#: The command name used for records made outside of any vimtk command
+TOPLEVEL = '<toplevel>'
+
+
+class _NullContext(object):
+    """
+    Context manager that does nothing, returned when collection is disabled
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class _Timer(object):
+    """
+    Context manager that records the duration of its body
+    """
+    __slots__ = ('stats', 'category', 'name', 'start')
+
+    def __init__(self, stats, category, name):
+        self.stats = stats
+        self.category = category
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        self.stats.record(self.category, self.name, duration)
+        return False
+
+
+class _CommandContext(object):
+    __slots__ = ('stats', 'name')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.stats._command_stack.append(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats._command_stack.pop()
+        return False
+
+
+class Stats(object):
+    """
+    Accumulates counts and durations keyed by the top-level command, a
+    category (e.g. ``vim``, ``spawn``, ``clipboard``), and a name.
+
+    Attributes:
+        enabled (bool): if False nothing is recorded
+
+        records (Dict[Tuple[str, str, str], List]):
+            maps (command, category, name) to [count, total_seconds]
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = {}
+        self._command_stack = []
+        self._orig_vim = None
+
+    def enable(self):
+        """
+        Start recording and instrument the vim module
+        """
+        self.enabled = True
+        self.wrap_vim()
+
+    def disable(self):
+        """
+        Stop recording and remove the vim instrumentation
+        """
+        self.enabled = False
+        self.unwrap_vim()
+
+    def reset(self):
+        """
+        Forget everything recorded so far
+        """
+        self.records.clear()
+
+    def current_command(self):
+        if self._command_stack:
+            return self._command_stack[0]
+        return TOPLEVEL
+
+    def command(self, name):
+        """
+        Context manager that attributes records made in its body to a command.
+        Nested commands are attributed to the outermost one.
+        """
+        return _CommandContext(self, name)
+
+    def record(self, category, name, duration=0.0):
+        """
+        Record one event. Does nothing when disabled.
+        """
+        if not self.enabled:
+            return
+        key = (self.current_command(), category, name)
+        try:
+            entry = self.records[key]
+        except KeyError:
+            entry = self.records[key] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += duration
+
+    def timed(self, category, name):
+        """
+        Context manager that records the duration of its body.
+
+        Example:
+            >>> from vimtk.stats import Stats
+            >>> stats = Stats()
+            >>> stats.enabled = True
+            >>> with stats.timed('spawn', 'xdotool'):
+            >>>     pass
+            >>> stats.summary()[stats.current_command()]['spawn']['xdotool']['count']
+            1
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, category, name)
+
+    def summary(self):
+        """
+        Returns:
+            Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+                nested mapping from command to category to name to the count
+                and total / mean time in seconds.
+        """
+        result = {}
+        for (command, category, name), (count, total) in sorted(self.records.items()):
+            result.setdefault(command, {}).setdefault(category, {})[name] = {
+                'count': count,
+                'total': total,
+                'mean': total / count if count else 0.0,
+            }
+        return result
+
+    def totals(self):
+        """
+        Returns:
+            Dict[str, Dict[str, float]]: count and total time per category
+        """
+        totals = {}
+        for (command, category, name), (count, total) in self.records.items():
+            entry = totals.setdefault(category, {'count': 0, 'total': 0.0})
+            entry['count'] += count
+            entry['total'] += total
+        return totals
+
+    def report(self):
+        """
+        Returns:
+            str: a human readable table of all records
+        """
+        header = ['command', 'category', 'name', 'count', 'total_ms', 'mean_ms']
+        rows = []
+        for (command, category, name), (count, total) in sorted(self.records.items()):
+            rows.append([command, category, name, str(count),
+                         '{:.3f}'.format(total * 1e3),
+                         '{:.3f}'.format(total * 1e3 / count if count else 0)])
+        for category, entry in sorted(self.totals().items()):
+            rows.append(['TOTAL', category, '', str(entry['count']),
+                         '{:.3f}'.format(entry['total'] * 1e3), ''])
+        widths = [max(len(row[i]) for row in [header] + rows)
+                  for i in range(len(header))]
+        lines = ['vimtk stats ({})'.format('enabled' if self.enabled else 'disabled')]
+        for row in [header] + rows:
+            lines.append('  '.join(
+                cell.ljust(w) if i < 3 else cell.rjust(w)
+                for i, (cell, w) in enumerate(zip(row, widths))))
+        return '\n'.join(lines)
+
+    def wrap_vim(self):
+        """
+        Replaces the vim module in ``sys.modules`` with an instrumented proxy.
+        vimtk imports vim inside of its functions, so all of its bridge calls
+        go through the proxy.
+        """
+        vim = sys.modules.get('vim', None)
+        if vim is None or isinstance(vim, VimProxy):
+            return
+        self._orig_vim = vim
+        sys.modules['vim'] = VimProxy(vim, self)
+
+    def unwrap_vim(self):
+        vim = sys.modules.get('vim', None)
+        if isinstance(vim, VimProxy):
+            sys.modules['vim'] = vim._vim
+        self._orig_vim = None
+
+
+class BufferProxy(object):
+    """
+    Wraps a vim buffer and records item access. Slices are recorded
+    separately from single line access because they copy many lines across
+    the bridge.
+    """
+
+    def __init__(self, buffer, stats):
+        self.__dict__['_buffer'] = buffer
+        self.__dict__['_stats'] = stats
+
+    def _timed(self, key, action):
+        kind = 'slice' if isinstance(key, slice) else 'item'
+        return self._stats.timed('vim', 'buffer.{}{}'.format(action, kind))
+
+    def __getitem__(self, key):
+        with self._timed(key, 'get'):
+            return self._buffer[key]
+
+    def __setitem__(self, key, value):
+        with self._timed(key, 'set'):
+            self._buffer[key] = value
+
+    def __delitem__(self, key):
+        with self._timed(key, 'del'):
+            del self._buffer[key]
+
+    def __iter__(self):
+        with self._stats.timed('vim', 'buffer.iter'):
+            lines = list(self._buffer)
+        return iter(lines)
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def append(self, *args, **kwargs):
+        with self._stats.timed('vim', 'buffer.append'):
+            return self._buffer.append(*args, **kwargs)
+
+    def __getattr__(self, key):
+        return getattr(self._buffer, key)
+
+    def __setattr__(self, key, value):
+        setattr(self._buffer, key, value)
+
+
+class CurrentProxy(object):
+    def __init__(self, current, stats):
+        self.__dict__['_current'] = current
+        self.__dict__['_stats'] = stats
+
+    @property
+    def buffer(self):
+        return BufferProxy(self._current.buffer, self._stats)
+
+    def __getattr__(self, key):
+        return getattr(self._current, key)
+
+    def __setattr__(self, key, value):
+        setattr(self._current, key, value)
+
+
+class VimProxy(object):
+    """
+    Wraps the vim module and records calls to ``eval`` and ``command``.
+    """
+
+    def __init__(self, vim, stats):
+        self.__dict__['_vim'] = vim
+        self.__dict__['_stats'] = stats
+
+    def eval(self, expr):
+        with self._stats.timed('vim', 'eval'):
+            return self._vim.eval(expr)
+
+    def command(self, cmd):
+        with self._stats.timed('vim', 'command'):
+            return self._vim.command(cmd)
+
+    @property
+    def current(self):
+        return CurrentProxy(self._vim.current, self._stats)
+
+    def __getattr__(self, key):
+        return getattr(self._vim, key)
+
+    def __setattr__(self, key, value):
+        setattr(self._vim, key, value)
+
+
+#: The global stats collector used by vimtk
+STATS = Stats()
+
+enable = STATS.enable
+disable = STATS.disable
+reset = STATS.reset
+command = STATS.command
+summary = STATS.summary
+report = STATS.report
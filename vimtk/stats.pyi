@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Tuple
+
+TOPLEVEL: str
+
+
+class _NullContext:
+
+    def __enter__(self) -> _NullContext:
+        ...
+
+    def __exit__(self, *exc_info) -> bool:
+        ...
+
+
+class Stats:
+    enabled: bool
+    records: Dict[Tuple[str, str, str], List]
+
+    def __init__(self) -> None:
+        ...
+
+    def enable(self) -> None:
+        ...
+
+    def disable(self) -> None:
+        ...
+
+    def reset(self) -> None:
+        ...
+
+    def current_command(self) -> str:
+        ...
+
+    def command(self, name: str) -> Any:
+        ...
+
+    def record(self, category: str, name: str, duration: float = 0.0) -> None:
+        ...
+
+    def timed(self, category: str, name: str) -> Any:
+        ...
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+        ...
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        ...
+
+    def report(self) -> str:
+        ...
+
+    def wrap_vim(self) -> None:
+        ...
+
+    def unwrap_vim(self) -> None:
+        ...
+
+
+class BufferProxy:
+
+    def __init__(self, buffer, stats: Stats) -> None:
+        ...
+
+
+class CurrentProxy:
+
+    def __init__(self, current, stats: Stats) -> None:
+        ...
+
+
+class VimProxy:
+
+    def __init__(self, vim, stats: Stats) -> None:
+        ...
+
+    def eval(self, expr: str) -> Any:
+        ...
+
+    def command(self, cmd: str) -> Any:
+        ...
+
+
+STATS: Stats
+
+
+def enable() -> None:
+    ...
+
+
+def disable() -> None:
+    ...
+
+
+def reset() -> None:
+    ...
+
+
+def command(name: str) -> Any:
+    ...
+
+
+def summary() -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+    ...
+
+
+def report() -> str:
+    ...
@@ -0,0 +1,381 @@
+r"""
+Sends very large selections to the terminal in statement aligned chunks.
+
+:func:`vimtk.core.execute_text_in_terminal` sends a selection in one piece.
+That puts the whole text on the clipboard, and terminals and REPLs struggle
+with pastes of several megabytes. :func:`send_chunked` instead reads the
+lines lazily, splits them between top level Python statements and sends one
+chunk of at most ``g:vimtk_stream_chunk_size`` characters at a time through
+the configured :mod:`vimtk.terminal_backend`. The next chunk is only sent
+after the backend waited for the previous one, so at most one chunk (or one
+statement, if a single statement is larger than a chunk) is held in memory.
+
+Streaming is off by default. With ``let g:vimtk_stream_min_lines = 2000``,
+``vimtk#execute_text_in_terminal`` streams selections of at least that many
+lines and echoes its progress.
+
+Lines are passed around as a *source*, a callable that returns a new iterator
+over the lines (with their line endings) each time it is called. The
+preprocessing of :func:`vimtk.core.preprocess_executable_text` needs more
+than one pass over the text, and :func:`iter_preprocessed_lines` does each
+pass by iterating the source again instead of keeping a copy.
+
+Example:
+    >>> from vimtk import streaming
+    >>> text = 'import os\nfor i in range(3):\n    print(i)\nelse:\n    pass\n\n@staticmethod\ndef f():\n    pass\nx = [\n    1,\n]\n'
+    >>> for stmt in streaming.iter_statements(streaming.iter_text_lines(text)):
+    >>>     print(repr(stmt))
+    'import os\n'
+    'for i in range(3):\n    print(i)\nelse:\n    pass\n\n'
+    '@staticmethod\ndef f():\n    pass\n'
+    'x = [\n    1,\n]\n'
+    >>> lines = streaming.iter_text_lines(text)
+    >>> chunks = list(streaming.iter_chunks(streaming.iter_statements(lines), chunk_size=40))
+    >>> [len(c) for c in chunks]
+    [10, 48, 32, 15]
+    >>> assert ''.join(chunks) == text
+"""
+import logging
+import operator
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+
+_LINE = re.compile(r'[^\n]*\n|[^\n]+\Z')
+
+
+def iter_text_lines(text):
+    r"""
+    Iterates over the lines of a string, keeping the line endings, without
+    splitting it into a list first.
+
+    Args:
+        text (str): the text
+
+    Returns:
+        Iterator[str]: each line
+
+    Example:
+        >>> from vimtk.streaming import iter_text_lines
+        >>> list(iter_text_lines('a\nb\n\nc'))
+        ['a\n', 'b\n', '\n', 'c']
+    """
+    return map(operator.methodcaller('group'), _LINE.finditer(text))
+
+
+def _common_margin(lines):
+    """
+    Returns:
+        Tuple[str, bool]: the whitespace prefix that textwrap.dedent would
+        remove, and if any whitespace only line would be changed
+    """
+    margin = None
+    changed = False
+    for line in lines:
+        content = line.lstrip(' \t')
+        if content == '\n' or not content:
+            # A whitespace only line
+            changed = changed or content != line
+            continue
+        if margin == '':
+            continue
+        indent = line[:len(line) - len(content)]
+        if margin is None:
+            margin = indent
+        elif not indent.startswith(margin):
+            margin = os.path.commonprefix([margin, indent])
+    return margin or '', changed
+
+
+def _dedented(source):
+    margin, changed = _common_margin(source())
+    if not margin and not changed:
+        return source
+
+    size = len(margin)
+
+    def _source():
+        for line in source():
+            content = line.lstrip(' \t')
+            if content == '\n' or not content:
+                # Whitespace only lines keep only their line ending
+                if content:
+                    yield content
+            else:
+                yield line[size:]
+    return _source
+
+
+def _mapped(source, func):
+    def _source():
+        return map(func, source())
+    return _source
+
+
+_PYBIND_LINE = re.compile(r'" *(>>>)|(\.\.\.) .*')
+
+
+def _unquote_pybind_line(line):
+    if line.endswith('\\n"\n'):
+        return line[1:-4] + '\n'
+    elif line.endswith('"\n'):
+        return line[1:-2] + '\n'
+    elif line.endswith('\\n"'):
+        return line[1:-3]
+    elif line.endswith('"'):
+        return line[1:-1]
+    else:
+        raise AssertionError('unknown case')
+
+
+def _is_prompt(line):
+    return line.startswith(('>>> ', '...'))
+
+
+def _check_lines(lines):
+    """
+    Returns:
+        Tuple[bool, bool]: if all lines are quoted pybind11 doctest lines and
+        if all lines start with a doctest prompt
+    """
+    pybind = prompts = True
+    for line in lines:
+        if pybind:
+            pybind = bool(_PYBIND_LINE.match(line)) and line.strip().endswith('"')
+        prompts = prompts and _is_prompt(line)
+        if not (pybind or prompts):
+            break
+    return pybind, prompts
+
+
+def iter_preprocessed_lines(source):
+    r"""
+    The lines of :func:`vimtk.core.preprocess_executable_text`, computed with
+    a few passes over ``source`` instead of copies of the text.
+
+    Args:
+        source (Callable[[], Iterable[str]]): returns a new iterator over the
+            lines, with line endings, each time it is called
+
+    Yields:
+        str: the preprocessed lines
+
+    Example:
+        >>> from vimtk.streaming import iter_preprocessed_lines, iter_text_lines
+        >>> text = '    >>> x = 1\n    >>> if x:\n    ...     print(x)\n'
+        >>> lines = iter_preprocessed_lines(lambda: iter_text_lines(text))
+        >>> print(''.join(lines), end='')
+        x = 1
+        if x:
+            print(x)
+    """
+    source = _dedented(source)
+    pybind, prompts = _check_lines(source())
+    if pybind:
+        # Handle C++ pybind11 docs
+        source = _dedented(_mapped(source, _unquote_pybind_line))
+        prompts = all(_is_prompt(line) for line in source())
+    if prompts:
+        # Strip docstring prefix
+        source = _mapped(source, lambda line: line[4:])
+    source = _dedented(source)
+    for line in source():
+        yield line
+
+
+# A top level line starting with one of these continues the statement before
+# it, and a decorator line is continued by the line after it
+_CONTINUATION_LINE = re.compile(r'(?:elif|else|except|finally)\b')
+
+# Tokens that open or close a bracket or a string, start a comment or
+# continue a line. Strings that end on the same line are matched whole.
+_SCAN_TOKEN = re.compile(r'''
+    \'\'\' | """
+    | '(?:\\.|[^\\'\n])*' | "(?:\\.|[^\\"\n])*"
+    | ['"\#(\[{)\]}] | \\$
+''', re.M | re.X)
+
+# Match the rest of a string after its opening quote, including escapes
+_STRING_END = {
+    "'''": re.compile(r"(?:\\.|[^\\])*?'''", re.S),
+    '"""': re.compile(r'(?:\\.|[^\\])*?"""', re.S),
+    "'": re.compile(r"(?:\\.|[^\\'\n])*'"),
+    '"': re.compile(r'(?:\\.|[^\\"\n])*"'),
+}
+
+
+def _scan_line(line, depth, quote):
+    """
+    Updates the bracket depth and the open string of a line.
+
+    Returns:
+        Tuple[int, str | None, bool]: the bracket depth and the open string
+        quote at the end of the line, and if the line ends with a backslash
+        continuation.
+
+    Raises:
+        SyntaxError: if a bracket is closed that was never opened or a single
+            quoted string is not closed
+    """
+    if quote is not None:
+        end = _STRING_END[quote].match(line)
+        if end is None:
+            return depth, quote, False
+        line = line[end.end():]
+    stripped = line.rstrip('\r\n')
+    for match in _SCAN_TOKEN.finditer(stripped):
+        token = match.group()
+        if token in '([{':
+            depth += 1
+        elif token in ')]}':
+            depth -= 1
+            if depth < 0:
+                raise SyntaxError('unmatched {!r}'.format(token))
+        elif token == '#':
+            break
+        elif token == '\\':
+            return depth, None, True
+        elif token in _STRING_END:
+            # A string that does not end on this line, unless it is a triple
+            # quoted string that ends later on it
+            if len(token) == 1 and not stripped.endswith('\\'):
+                raise SyntaxError('unterminated string')
+            return _scan_line(line[match.end():], depth, token)
+    return depth, None, False
+
+
+def iter_statements(lines):
+    """
+    Groups lines into top level Python statements.
+
+    A statement starts at a line that begins in the first column outside of
+    any bracket, string or continued line. Only the lines of the current
+    statement are kept. Comments and blank lines belong to the statement
+    before them, ``else`` / ``except`` / ``finally`` branches to their
+    compound statement and decorators to the definition after them. If the
+    text stops being valid Python, the rest is yielded line by line.
+
+    Args:
+        lines (Iterable[str]): lines with their line endings
+
+    Yields:
+        str: the text of each statement
+    """
+    lines = iter(lines)
+    buffered = []
+    depth = 0
+    quote = None
+    continued = False
+    glue_next = False
+    try:
+        for line in lines:
+            if depth == 0 and quote is None and not continued:
+                first = line[:1]
+                if first and first not in ' \t\r\n#':
+                    split = not glue_next and not _CONTINUATION_LINE.match(line)
+                    if buffered and split:
+                        yield ''.join(buffered)
+                        buffered = []
+                    glue_next = first == '@'
+            buffered.append(line)
+            depth, quote, continued = _scan_line(line, depth, quote)
+    except SyntaxError as ex:
+        logger.debug('Cannot parse the text, sending lines: {}'.format(ex))
+        for line in buffered:
+            yield line
+        for line in lines:
+            yield line
+    else:
+        if buffered:
+            yield ''.join(buffered)
+
+
+def iter_chunks(statements, chunk_size):
+    """
+    Joins consecutive statements into chunks of at most ``chunk_size``
+    characters. A statement longer than that is a chunk of its own.
+
+    Args:
+        statements (Iterable[str]): see :func:`iter_statements`
+        chunk_size (int): the maximum number of characters per chunk
+
+    Yields:
+        str: each chunk
+    """
+    parts = []
+    size = 0
+    for stmt in statements:
+        if parts and size + len(stmt) > chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+        parts.append(stmt)
+        size += len(stmt)
+    if parts:
+        yield ''.join(parts)
+
+
+def send_chunked(lines, backend=None, chunk_size=None, return_to_vim=True,
+                 total_lines=None, progress=None):
+    r"""
+    Sends lines through a terminal backend one statement aligned chunk at a
+    time, waiting for each chunk before reading the next.
+
+    Args:
+        lines (Iterable[str]): lines with their line endings, e.g. from
+            :func:`iter_preprocessed_lines`
+        backend (object | None): a :mod:`vimtk.terminal_backend` backend,
+            defaults to the configured one
+        chunk_size (int | None): the maximum number of characters per chunk,
+            defaults to ``g:vimtk_stream_chunk_size``
+        return_to_vim (bool): passed to each send
+        total_lines (int | None): the number of lines, only used for the
+            progress report
+        progress (Callable | None): called as
+            ``progress(num_chunks, num_lines, total_lines)`` after each chunk
+
+    Returns:
+        int: the number of chunks sent
+
+    Example:
+        >>> from vimtk import streaming
+        >>> class Recorder(object):
+        >>>     def __init__(self):
+        >>>         self.sent = []
+        >>>     def send(self, text, return_to_vim=True):
+        >>>         self.sent.append(text)
+        >>>     def wait(self, handle, timeout=None):
+        >>>         pass
+        >>> text = ''.join('x{} = {}\n'.format(i, i) for i in range(1000))
+        >>> backend = Recorder()
+        >>> reports = []
+        >>> num = streaming.send_chunked(
+        >>>     streaming.iter_text_lines(text), backend, chunk_size=1000,
+        >>>     progress=lambda *args: reports.append(args))
+        >>> assert ''.join(backend.sent) == text
+        >>> assert max(map(len, backend.sent)) <= 1000
+        >>> print(num, reports[-1])
+        11 (11, 1000, None)
+    """
+    from vimtk import output
+    from vimtk.tracing import span
+    if backend is None:
+        from vimtk import terminal_backend
+        backend = terminal_backend.get()
+    if chunk_size is None:
+        from vimtk.core import CONFIG
+        chunk_size = int(CONFIG.get('vimtk_stream_chunk_size', 65536))
+    num_chunks = 0
+    num_lines = 0
+    for chunk in iter_chunks(iter_statements(lines), chunk_size):
+        with span('send chunk', index=num_chunks, size=len(chunk)):
+            handle = backend.send(chunk, return_to_vim=return_to_vim)
+            backend.wait(handle)
+        output.capture(backend, handle, chunk)
+        num_chunks += 1
+        num_lines += chunk.count('\n') + (not chunk.endswith('\n'))
+        if progress is not None:
+            progress(num_chunks, num_lines, total_lines)
+    return num_chunks
@@ -0,0 +1,31 @@
+from typing import Callable, Iterable, Iterator
+from _typeshed import Incomplete
+
+logger: Incomplete
+
+
+def iter_text_lines(text: str) -> Iterator[str]:
+    ...
+
+
+def iter_preprocessed_lines(
+        source: Callable[[], Iterable[str]]) -> Iterator[str]:
+    ...
+
+
+def iter_statements(lines: Iterable[str]) -> Iterator[str]:
+    ...
+
+
+def iter_chunks(statements: Iterable[str], chunk_size: int) -> Iterator[str]:
+    ...
+
+
+def send_chunked(lines: Iterable[str],
+                 backend: object | None = None,
+                 chunk_size: int | None = None,
+                 return_to_vim: bool = True,
+                 total_lines: int | None = None,
+                 progress: Callable[[int, int, int | None], None]
+                 | None = None) -> int:
+    ...
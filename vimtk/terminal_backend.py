@@ -0,0 +1,452 @@
+"""
+Backends that :func:`vimtk.core.execute_text_in_terminal` sends text through.
+
+The backend is selected with ``g:vimtk_terminal_backend``:
+
+* ``gui`` (the default) copies the text to the clipboard, focuses the most
+  recently used terminal window, presses the paste keys and focuses vim
+  again. It needs a windowing system (X11 or win32).
+
+* ``tmux`` pastes the text into a tmux pane. It does not touch the clipboard
+  or the window focus, so it also works in terminal vim and over SSH. The
+  pane is ``g:vimtk_tmux_target`` (any ``tmux -t`` target such as
+  ``work:1.0``). By default it is the previously active pane (``{last}``)
+  when vim itself runs inside tmux, and otherwise the active pane of the most
+  recently used session.
+
+* ``jupyter`` runs the text in a local Jupyter kernel with one
+  ``execute_request`` message, through ``jupyter_client`` (an optional
+  dependency). The kernel is found by ``g:vimtk_jupyter_connection_file``,
+  which is a path or a name pattern like ``kernel-1234*.json``. By default it
+  is the most recently started kernel. Output appears wherever the kernel
+  is displayed, e.g. a ``jupyter console --existing`` session.
+
+With ``g:vimtk_capture_output`` the output of each send of the ``tmux`` and
+``jupyter`` backends is also appended to a scratch buffer in vim, see
+:mod:`vimtk.output`.
+
+A backend is a class with a ``send(text, return_to_vim=True)`` method and
+a ``wait(handle, timeout=None)`` method that blocks until the text returned
+by ``send`` was handled, registered under its name with :func:`register`.
+:func:`vimtk.streaming.send_chunked` waits for each chunk before it sends the
+next. Backends that can read the output of the REPL also have an
+``iter_output(handle, timeout=None)`` method, which yields the output of the
+send that returned ``handle`` as it arrives.
+
+Example:
+    >>> from vimtk import terminal_backend
+    >>> sorted(terminal_backend.BACKENDS)
+    ['gui', 'jupyter', 'tmux']
+    >>> backend = terminal_backend.get('tmux')
+    >>> backend.argv('x = 1', target='work:1.0')
+    ['tmux', 'load-buffer', '-b', 'vimtk', '-', ';', 'paste-buffer', '-d', '-p', '-b', 'vimtk', '-t', 'work:1.0', ';', 'send-keys', '-t', 'work:1.0', 'Enter']
+"""
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+#: Maps a backend name to its class
+BACKENDS = {}
+
+
+def register(name):
+    """
+    Class decorator that makes a backend selectable by name
+    """
+    def _register(cls):
+        BACKENDS[name] = cls
+        return cls
+    return _register
+
+
+def backend_name():
+    """
+    Returns:
+        str: the name selected by ``g:vimtk_terminal_backend``
+    """
+    from vimtk.core import CONFIG
+    return CONFIG.get('vimtk_terminal_backend', 'gui')
+
+
+def get(name=None):
+    """
+    Args:
+        name (str | None): a registered backend, defaults to
+            :func:`backend_name`
+
+    Returns:
+        GuiBackend | TmuxBackend | JupyterBackend
+    """
+    if name is None:
+        name = backend_name()
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise KeyError('Unknown vimtk_terminal_backend={!r}. Expected one '
+                       'of {}'.format(name, ', '.join(sorted(BACKENDS))))
+    return cls()
+
+
+@register('gui')
+class GuiBackend(object):
+    """
+    Pastes through the clipboard into the most recently used terminal window
+    """
+
+    def send(self, text, return_to_vim=True):
+        from vimtk import core
+        core._execute_text_in_gui_terminal(text, return_to_vim=return_to_vim)
+
+    def wait(self, handle, timeout=None):
+        """
+        The paste is done when :func:`send` returns
+        """
+
+
+# Prints the absolute line of the cursor as history size and cursor row
+_TMUX_POSITION = '#{history_size} #{cursor_y}'
+
+# Seconds between two looks at a pane whose output is captured
+_TMUX_POLL_INTERVAL = 0.1
+
+
+def _parse_tmux_position(out):
+    history_size, cursor_y = map(int, out.split()[:2])
+    return history_size + cursor_y
+
+
+@register('tmux')
+class TmuxBackend(object):
+    """
+    Pastes into a tmux pane with ``load-buffer`` and ``paste-buffer``.
+
+    All steps run as one tmux command sequence, so sending text costs a
+    single process. The text is streamed through stdin, so large selections
+    never end up on the command line. The paste uses bracketed paste mode
+    when the program in the pane asked for it, which lets IPython take a
+    multiline block as a whole.
+
+    Args:
+        buffer_name (str): the tmux paste buffer to use, it is deleted after
+            the paste
+    """
+
+    def __init__(self, buffer_name='vimtk'):
+        self.buffer_name = buffer_name
+
+    @staticmethod
+    def default_target():
+        """
+        Returns:
+            str | None: ``g:vimtk_tmux_target`` or ``{last}`` inside tmux,
+            otherwise None, which lets tmux pick the pane
+        """
+        from vimtk.core import CONFIG
+        target = CONFIG.get('vimtk_tmux_target', None)
+        if not target and os.environ.get('TMUX', ''):
+            # Vim runs in a pane itself, the target is the one used before
+            target = '{last}'
+        return target or None
+
+    def argv(self, text, target=None, position=False):
+        """
+        Args:
+            text (str): the text, which is read from stdin
+            target (str | None): the pane
+            position (bool): if True, first print the history size and the
+                cursor row of the pane, which locate the line the paste
+                starts on
+
+        Returns:
+            List[str]: the tmux invocation that pastes ``text`` and presses
+            enter
+        """
+        from vimtk.core import CONFIG
+        target_args = [] if target is None else ['-t', target]
+        num_enter = 1
+        if '\n' in text.rstrip('\n'):
+            num_enter = max(int(CONFIG.get('vimtk_multiline_num_press_enter', 3)) - 1, 1)
+        position_args = []
+        if position:
+            position_args = (['display-message', '-p'] + target_args +
+                             [_TMUX_POSITION, ';'])
+        return (
+            ['tmux'] + position_args +
+            ['load-buffer', '-b', self.buffer_name, '-', ';',
+             'paste-buffer', '-d', '-p', '-b', self.buffer_name] +
+            target_args +
+            [';', 'send-keys'] + target_args + ['Enter'] * num_enter)
+
+    def send(self, text, return_to_vim=True):
+        """
+        Args:
+            text (str): the text to execute in the pane
+            return_to_vim (bool): unused, the focus never leaves vim
+
+        Returns:
+            Tuple[str | None, int] | None: with ``g:vimtk_capture_output``,
+            the pane and the absolute line the paste started on, for
+            :func:`iter_output`
+        """
+        from vimtk import output, runner
+        from vimtk.tracing import span
+        # The enter key presses run the text, so a trailing newline would
+        # only add an empty prompt
+        text = text.rstrip('\n')
+        target = self.default_target()
+        position = output.capture_enabled()
+        with span('tmux paste', target=target):
+            info = runner.run(self.argv(text, target=target, position=position),
+                              input=text)
+        if info['ret'] != 0:
+            raise Exception('Cannot paste into tmux pane {}: {}'.format(
+                target, info['err'].strip()))
+        if position:
+            return target, _parse_tmux_position(info['out'])
+
+    def _run(self, argv):
+        from vimtk import runner
+        info = runner.run(argv)
+        if info['ret'] != 0:
+            raise Exception('tmux {} failed: {}'.format(
+                argv[1], info['err'].strip()))
+        return info['out']
+
+    def iter_output(self, handle, timeout=None):
+        """
+        Polls the pane for the lines that appear after a paste. The line with
+        the cursor is still being written, so it is only reported once the
+        cursor moved past it. The lines include the echo of the pasted text.
+
+        Args:
+            handle (Tuple[str | None, int] | None): returned by :func:`send`
+            timeout (float | None): stop after this many seconds, by default
+                only ``g:vimtk_capture_idle_time`` seconds without new lines
+                stop it
+
+        Yields:
+            str: new lines of the pane, with line endings
+        """
+        from vimtk.core import CONFIG
+        if handle is None:
+            return
+        target, consumed = handle
+        target_args = [] if target is None else ['-t', target]
+        idle_time = float(CONFIG.get('vimtk_capture_idle_time', 1.0))
+        start = last_change = time.monotonic()
+        while True:
+            out = self._run(['tmux', 'display-message', '-p'] + target_args +
+                            [_TMUX_POSITION])
+            history_size = int(out.split()[0])
+            cursor = _parse_tmux_position(out)
+            now = time.monotonic()
+            if cursor < consumed:
+                # The pane was cleared
+                consumed = cursor
+            elif cursor > consumed:
+                # Capture line numbers are relative to the top of the screen
+                yield self._run(
+                    ['tmux', 'capture-pane', '-p', '-J'] + target_args +
+                    ['-S', str(consumed - history_size),
+                     '-E', str(cursor - 1 - history_size)])
+                consumed = cursor
+                last_change = now
+            elif now - last_change >= idle_time:
+                break
+            if timeout is not None and now - start >= timeout:
+                break
+            time.sleep(_TMUX_POLL_INTERVAL)
+
+    def wait(self, handle, timeout=None):
+        """
+        The paste is done when :func:`send` returns
+        """
+
+
+# Kernel clients are kept open for the session, keyed by connection file
+_KERNEL_CLIENTS = {}
+
+
+# Seconds between checks that the kernel is still alive while its output is
+# read
+_IOPUB_POLL_INTERVAL = 1.0
+
+
+def _kernel_client(connection_file):
+    try:
+        return _KERNEL_CLIENTS[connection_file]
+    except KeyError:
+        pass
+    import atexit
+    from jupyter_client import BlockingKernelClient
+    client = BlockingKernelClient(connection_file=connection_file)
+    client.load_connection_file()
+    client.start_channels()
+    atexit.register(client.stop_channels)
+    _KERNEL_CLIENTS[connection_file] = client
+    return client
+
+
+@register('jupyter')
+class JupyterBackend(object):
+    """
+    Executes text in a running Jupyter kernel.
+
+    The first send connects to the kernel and the client stays open, so
+    later sends only cost one ZMQ message. The request is not awaited, the
+    kernel runs it while vim continues.
+
+    Args:
+        connection_file (str | None): the kernel connection file, either a
+            path or a pattern for :func:`jupyter_client.find_connection_file`.
+            Defaults to ``g:vimtk_jupyter_connection_file`` and then to the
+            most recently started kernel.
+    """
+
+    def __init__(self, connection_file=None):
+        self.connection_file = connection_file
+
+    def resolve_connection_file(self):
+        """
+        Returns:
+            str: the path of the connection file
+
+        Raises:
+            OSError: if no matching kernel connection file exists
+        """
+        try:
+            import jupyter_client
+        except ImportError:
+            raise Exception(
+                'The jupyter terminal backend needs jupyter_client. '
+                'Install it with: pip install jupyter_client')
+        from vimtk.core import CONFIG
+        fname = self.connection_file
+        if fname is None:
+            fname = CONFIG.get('vimtk_jupyter_connection_file', None)
+        if fname is None:
+            return jupyter_client.find_connection_file()
+        fpath = os.path.expanduser(fname)
+        if os.path.isfile(fpath):
+            return os.path.abspath(fpath)
+        return jupyter_client.find_connection_file(fname)
+
+    def client(self):
+        """
+        Returns:
+            jupyter_client.BlockingKernelClient: the session client of the
+            kernel
+        """
+        return _kernel_client(self.resolve_connection_file())
+
+    def send(self, text, return_to_vim=True):
+        """
+        Args:
+            text (str): the code to execute
+            return_to_vim (bool): unused, the focus never leaves vim
+
+        Returns:
+            str: the id of the ``execute_request`` message
+        """
+        from vimtk.tracing import span
+        client = self.client()
+        with span('jupyter execute'):
+            msg_id = client.execute(text, store_history=True,
+                                    allow_stdin=False)
+        return msg_id
+
+    def wait(self, msg_id, timeout=None):
+        """
+        Blocks until the kernel finished executing a request.
+
+        Args:
+            msg_id (str): returned by :func:`send`
+            timeout (float | None): seconds to wait, None waits forever
+
+        Returns:
+            Dict: the content of the ``execute_reply``
+
+        Raises:
+            queue.Empty: on a timeout
+            Exception: if the code raised an error in the kernel
+        """
+        from vimtk.tracing import span
+        client = self.client()
+        with span('jupyter wait'):
+            while True:
+                # Replies to earlier sends that nobody waited for are skipped
+                reply = client.get_shell_msg(timeout=timeout)
+                if reply['parent_header'].get('msg_id') == msg_id:
+                    break
+        content = reply['content']
+        if content['status'] == 'error':
+            raise Exception('The kernel raised {}: {}'.format(
+                content.get('ename'), content.get('evalue')))
+        return content
+
+    def iter_output(self, msg_id, timeout=None):
+        """
+        Reads what the kernel published while it executed a request: printed
+        streams, the plain text of results and display data, and tracebacks.
+
+        The capture stops early when the kernel stops answering heartbeats or
+        announces that it (re)started, because then the request will never
+        finish.
+
+        Args:
+            msg_id (str): returned by :func:`send`
+            timeout (float | None): seconds to wait for each message, None
+                waits as long as the kernel is alive
+
+        Yields:
+            str: each piece of output as it arrives, tracebacks still contain
+            their ANSI color codes
+
+        Raises:
+            queue.Empty: on a timeout
+        """
+        import queue
+        client = self.client()
+        poll = _IOPUB_POLL_INTERVAL
+        if timeout is not None:
+            poll = min(poll, timeout)
+        waited = 0.0
+        while True:
+            try:
+                msg = client.get_iopub_msg(timeout=poll)
+            except queue.Empty:
+                if not client.is_alive():
+                    logger.warning('The kernel is not alive, stopped reading '
+                                   'the output of {}'.format(msg_id))
+                    break
+                waited += poll
+                if timeout is not None and waited >= timeout:
+                    raise
+                continue
+            waited = 0.0
+            msg_type = msg['msg_type']
+            content = msg['content']
+            if msg_type == 'status' and content['execution_state'] == 'starting':
+                logger.warning('The kernel restarted, stopped reading the '
+                               'output of {}'.format(msg_id))
+                break
+            # Output of other requests, e.g. ones sent before capturing was
+            # enabled, is skipped. The kernel runs requests in order, so
+            # nothing of later requests arrives before this one is idle.
+            if msg['parent_header'].get('msg_id') != msg_id:
+                continue
+            if msg_type == 'stream':
+                yield content['text']
+            elif msg_type in {'execute_result', 'display_data'}:
+                text = content['data'].get('text/plain')
+                if text is not None:
+                    if msg_type == 'execute_result':
+                        text = 'Out[{}]: {}'.format(
+                            content.get('execution_count'), text)
+                    yield text + '\n'
+            elif msg_type == 'error':
+                yield '\n'.join(content['traceback']) + '\n'
+            elif msg_type == 'status' and content['execution_state'] == 'idle':
+                break
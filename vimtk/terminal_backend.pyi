@@ -0,0 +1,84 @@
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from _typeshed import Incomplete
+
+logger: Incomplete
+BACKENDS: Dict[str, type]
+
+
+def register(name: str) -> Callable[[type], type]:
+    ...
+
+
+def backend_name() -> str:
+    ...
+
+
+def get(name: str | None = None) -> GuiBackend | TmuxBackend | JupyterBackend:
+    ...
+
+
+class GuiBackend:
+
+    def send(self, text: str, return_to_vim: bool = True) -> None:
+        ...
+
+    def wait(self, handle: None, timeout: float | None = None) -> None:
+        ...
+
+
+class TmuxBackend:
+    buffer_name: str
+
+    def __init__(self, buffer_name: str = 'vimtk') -> None:
+        ...
+
+    @staticmethod
+    def default_target() -> str | None:
+        ...
+
+    def argv(self,
+             text: str,
+             target: str | None = None,
+             position: bool = False) -> List[str]:
+        ...
+
+    def send(self,
+             text: str,
+             return_to_vim: bool = True) -> Tuple[str | None, int] | None:
+        ...
+
+    def wait(self,
+             handle: Tuple[str | None, int] | None,
+             timeout: float | None = None) -> None:
+        ...
+
+    def iter_output(self,
+                    handle: Tuple[str | None, int] | None,
+                    timeout: float | None = None) -> Iterator[str]:
+        ...
+
+
+class JupyterBackend:
+    connection_file: str | None
+
+    def __init__(self, connection_file: str | None = None) -> None:
+        ...
+
+    def resolve_connection_file(self) -> str:
+        ...
+
+    def client(self) -> Incomplete:
+        ...
+
+    def send(self, text: str, return_to_vim: bool = True) -> str:
+        ...
+
+    def wait(self,
+             msg_id: str,
+             timeout: float | None = None) -> Dict[str, Any]:
+        ...
+
+    def iter_output(self,
+                    msg_id: str,
+                    timeout: float | None = None) -> Iterator[str]:
+        ...
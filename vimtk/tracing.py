@@ -0,0 +1,210 @@
+"""
+Nested timing spans for the internal steps of vimtk commands.
+
+Where :mod:`vimtk.stats` answers "how many" and "how long in total", spans
+show *when* each step of a single command ran, e.g. the clipboard copy,
+window lookup, focus changes, key sends and sleeps of
+:func:`vimtk.core.execute_text_in_terminal`. Finished spans go into a fixed
+size ring buffer, so a long running vim session only keeps the most recent
+ones, and can be exported as Chrome trace JSON and viewed in
+``chrome://tracing`` or https://ui.perfetto.dev.
+
+Tracing is off by default. When it is off :func:`span` returns a shared
+no-op context manager, so instrumented code only pays for a function call
+and a boolean check.
+
+Inside vim use ``:VimtkTrace on``, ``:VimtkTrace dump [fpath]``,
+``:VimtkTrace clear``, and ``:VimtkTrace off``.
+
+Example:
+    >>> from vimtk import tracing
+    >>> import json
+    >>> tracing.enable()
+    >>> with tracing.span('outer', kind='demo'):
+    >>>     with tracing.span('inner'):
+    >>>         pass
+    >>> tracing.disable()
+    >>> trace = tracing.chrome_trace()
+    >>> print([event['name'] for event in trace['traceEvents']])
+    ['inner', 'outer']
+    >>> outer = trace['traceEvents'][1]
+    >>> assert outer['ph'] == 'X' and outer['args'] == {'kind': 'demo'}
+    >>> text = json.dumps(trace)
+    >>> tracing.clear()
+"""
+import collections
+import os
+import threading
+import time
+
+__all__ = [
+    'TRACER', 'Tracer', 'chrome_trace', 'clear', 'disable', 'dump', 'enable',
+    'span', 'traced',
+]
+
+#: The default number of finished spans kept in the ring buffer
+DEFAULT_CAPACITY = 10000
+
+
+class _NullSpan(object):
+    """
+    Span that does nothing, returned when tracing is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        stop = time.perf_counter_ns()
+        self.tracer.events.append((
+            self.name, self.start, stop - self.start,
+            threading.get_ident(), self.args))
+        return False
+
+
+class Tracer(object):
+    """
+    Records finished spans into a ring buffer.
+
+    Attributes:
+        enabled (bool): if False :func:`span` is a no-op
+
+        events (collections.deque):
+            finished spans as (name, start_ns, duration_ns, thread_id, args)
+            tuples, oldest first
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.enabled = False
+        self.events = collections.deque(maxlen=capacity)
+
+    def enable(self, capacity=None):
+        """
+        Args:
+            capacity (int | None): if given, resizes the ring buffer
+        """
+        if capacity is not None and capacity != self.events.maxlen:
+            self.events = collections.deque(self.events, maxlen=capacity)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events.clear()
+
+    def span(self, name, **args):
+        """
+        Returns a context manager that records its body as a span.
+
+        Args:
+            name (str): what the span measures
+            **args: extra information shown with the span in the viewer
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def chrome_trace(self):
+        """
+        Returns:
+            Dict: the finished spans in Chrome trace format, using complete
+            ("X") events with times in microseconds
+        """
+        pid = os.getpid()
+        trace_events = []
+        for name, start, duration, tid, args in self.events:
+            event = {
+                'name': name,
+                'ph': 'X',
+                'ts': start / 1e3,
+                'dur': duration / 1e3,
+                'pid': pid,
+                'tid': tid,
+            }
+            if args:
+                event['args'] = args
+            trace_events.append(event)
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, fpath):
+        """
+        Writes the Chrome trace JSON to a file
+
+        Args:
+            fpath (PathLike): output path
+
+        Returns:
+            PathLike: the output path
+        """
+        import json
+        with open(fpath, 'w') as file:
+            json.dump(self.chrome_trace(), file, default=repr)
+        return fpath
+
+
+#: The global tracer used by vimtk
+TRACER = Tracer()
+
+
+def span(name, **args):
+    """
+    Records a span on the global tracer. See :func:`Tracer.span`.
+    """
+    if not TRACER.enabled:
+        return _NULL_SPAN
+    return _Span(TRACER, name, args)
+
+
+def traced(func):
+    """
+    Decorator that records each call of a function as a span named after it.
+
+    Example:
+        >>> from vimtk import tracing
+        >>> @tracing.traced
+        >>> def step():
+        >>>     return 1
+        >>> tracing.enable()
+        >>> assert step() == 1
+        >>> tracing.disable()
+        >>> assert tracing.TRACER.events[-1][0] == 'step'
+        >>> tracing.clear()
+    """
+    import functools
+    name = func.__name__
+
+    @functools.wraps(func)
+    def _wrapper(*args, **kwargs):
+        if not TRACER.enabled:
+            return func(*args, **kwargs)
+        with _Span(TRACER, name, {}):
+            return func(*args, **kwargs)
+    return _wrapper
+
+
+enable = TRACER.enable
+disable = TRACER.disable
+clear = TRACER.clear
+chrome_trace = TRACER.chrome_trace
+dump = TRACER.dump
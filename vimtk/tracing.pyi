@@ -0,0 +1,73 @@
+from os import PathLike
+from typing import Any, Callable, Dict, TypeVar
+import collections
+
+_F = TypeVar('_F', bound=Callable)
+
+DEFAULT_CAPACITY: int
+
+
+class _NullSpan:
+
+    def __enter__(self) -> _NullSpan:
+        ...
+
+    def __exit__(self, *exc_info) -> bool:
+        ...
+
+
+class Tracer:
+    enabled: bool
+    events: collections.deque
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        ...
+
+    def enable(self, capacity: int | None = None) -> None:
+        ...
+
+    def disable(self) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def span(self, name: str, **args) -> Any:
+        ...
+
+    def chrome_trace(self) -> Dict:
+        ...
+
+    def dump(self, fpath: PathLike) -> PathLike:
+        ...
+
+
+TRACER: Tracer
+
+
+def span(name: str, **args) -> Any:
+    ...
+
+
+def traced(func: _F) -> _F:
+    ...
+
+
+def enable(capacity: int | None = None) -> None:
+    ...
+
+
+def disable() -> None:
+    ...
+
+
+def clear() -> None:
+    ...
+
+
+def chrome_trace() -> Dict:
+    ...
+
+
+def dump(fpath: PathLike) -> PathLike:
+    ...
@@ -52,15 +52,19 @@ class Win32Window:
     #     return proc_handle
 
     def process(self):
+        from vimtk.procinfo import PROCESS_CACHE
         pid = self.process_id()
-        proc = psutil.Process(pid)
-        return proc
+        return PROCESS_CACHE.process(pid)
         # exe_fpath = win32process.GetModuleFileNameEx(proc_handle, 0)
         # return exe_fpath
 
     def process_name(self):
-        proc = self.process()
-        return proc.name()
+        from vimtk.procinfo import PROCESS_CACHE
+        pid = self.process_id()
+        info = PROCESS_CACHE.info(pid)
+        if info is None:
+            raise psutil.NoSuchProcess(pid)
+        return info['name']
 
     def info(self):
         return {
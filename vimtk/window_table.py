@@ -0,0 +1,1048 @@
+"""
+A session owned table of the managed X windows and their stacking order.
+
+Looking up a terminal used to list every window (``wmctrl -lx``) and read the
+stacking order (``xprop -root``) on each call. The :class:`WindowTable` fills
+itself once and then only refreshes when the root window reports that one of
+these properties changed:
+
+* ``_NET_CLIENT_LIST`` changes when windows are created or destroyed. The
+  whole table is refilled.
+* ``_NET_CLIENT_LIST_STACKING`` changes whenever a window is raised, e.g. on
+  every focus change. Only the stacking order is updated, and with the
+  ``xprop -spy`` watcher the new order is part of the notification itself,
+  so no query is needed at all.
+* ``_NET_ACTIVE_WINDOW`` changes on every focus change. The new active
+  window is pushed onto a :class:`FocusHistory`, which orders windows by
+  when they last had the focus. The stacking order only approximates that:
+  windows can be raised without being used, and some window managers do not
+  raise on focus.
+
+The table holds a :class:`WindowSnapshot`: compact :class:`WindowRecord`
+objects for the class, pid, desktop and title of each window together with
+the stacking order. A fill is a single query, one round trip on the X
+connection of the python-xlib backend or one helper process with the command
+line tools, and every lookup in :mod:`vimtk.xctrl` shares the same snapshot.
+
+Notifications come from a ``PropertyNotify`` event mask on the root window
+when the python-xlib backend is used (see :mod:`vimtk.xlib_backend`), or from
+a long running ``xprop -root -spy`` helper process otherwise. An optional
+TTL (``g:vimtk_window_table_ttl``, in seconds) forces a full refill
+regardless. Without any watcher and without a TTL the table is refilled on
+every access, which is the old behavior.
+
+Window titles change without any root window notification, e.g. when a
+terminal starts IPython. Lookups that match titles (a title query clause or
+a ``wmctrl -lx`` line pattern) therefore read the titles again with
+``snapshot(titles=True)``, which costs one ``wmctrl`` call or one property
+read per window, but no refill of the rest of the table.
+
+Example:
+    >>> from vimtk.window_table import WindowTable, WindowSnapshot, WindowRecord
+    >>> calls = []
+    >>> def query_snapshot():
+    >>>     calls.append('snapshot')
+    >>>     records = [WindowRecord(1, '0', 10, 'gvim.Gvim', 'host', 'a.py'),
+    >>>                WindowRecord(2, '0', 20, 'xterm.XTerm', 'host', 'bash')]
+    >>>     return WindowSnapshot(records, stacking=[1, 2])
+    >>> def query_stacking():
+    >>>     calls.append('stacking')
+    >>>     return [1, 2]
+    >>> class DemoWatcher(object):
+    >>>     events = []
+    >>>     def poll(self):
+    >>>         events, self.events = self.events, []
+    >>>         return events
+    >>> watcher = DemoWatcher()
+    >>> table = WindowTable(query_snapshot, query_stacking, watcher=watcher)
+    >>> assert table.stacking_order() == [1, 2]
+    >>> assert sorted(table.window_list()) == [1, 2]
+    >>> assert calls == ['snapshot']
+    >>> # A raise that reports the new order does not need a query
+    >>> watcher.events = [('stacking', [2, 1])]
+    >>> assert table.snapshot().ordered_ids('mru') == [1, 2]
+    >>> assert calls == ['snapshot']
+    >>> # A raise without the new order only queries the stacking order
+    >>> watcher.events = [('stacking', None)]
+    >>> assert table.snapshot().ordered_ids('mru') == [2, 1]
+    >>> assert calls == ['snapshot', 'stacking']
+    >>> # A new window refills the table
+    >>> watcher.events = [('clients', None)]
+    >>> _ = table.window_list()
+    >>> assert calls == ['snapshot', 'stacking', 'snapshot']
+    >>> # Without a title query, title lookups refill the table
+    >>> _ = table.snapshot(titles=True)
+    >>> assert calls == ['snapshot', 'stacking', 'snapshot', 'snapshot']
+"""
+import functools
+import logging
+import re
+import time
+from sys import intern
+
+from vimtk.stats import STATS
+
+logger = logging.getLogger(__name__)
+
+#: The root window properties the table depends on
+WATCHED_PROPERTIES = ('_NET_CLIENT_LIST', '_NET_CLIENT_LIST_STACKING',
+                      '_NET_CURRENT_DESKTOP', '_NET_ACTIVE_WINDOW')
+
+# The kind of watcher event each property produces
+_PROPERTY_KINDS = {
+    '_NET_CLIENT_LIST': 'clients',
+    '_NET_CLIENT_LIST_STACKING': 'stacking',
+    '_NET_CURRENT_DESKTOP': 'desktop',
+    '_NET_ACTIVE_WINDOW': 'active',
+}
+
+#: Fields of a :class:`WindowIndex` query
+QUERY_FIELDS = ('id', 'class', 'title', 'pid', 'desktop', 'client', 'proc')
+
+
+def parse_stacking_line(line):
+    """
+    Parses the ``_NET_CLIENT_LIST_STACKING`` line printed by ``xprop -root``
+
+    Returns:
+        List[int] | None: window ids from bottom to top, or None if the line
+        does not contain a value
+
+    Example:
+        >>> from vimtk.window_table import parse_stacking_line
+        >>> parse_stacking_line('_NET_CLIENT_LIST_STACKING(WINDOW): window id # 0x1a00003, 0x2c0000a')
+        [27262979, 46137354]
+        >>> print(parse_stacking_line('_NET_CLIENT_LIST_STACKING:  not found.'))
+        None
+    """
+    if '#' not in line:
+        return None
+    return [int(h, 16) for h in line.split('#', 1)[1].split(',') if h.strip()]
+
+
+def parse_active_line(line):
+    """
+    Parses the ``_NET_ACTIVE_WINDOW`` line printed by ``xprop -root``
+
+    Returns:
+        int | None: the active window id, or None if no window is active
+
+    Example:
+        >>> from vimtk.window_table import parse_active_line
+        >>> parse_active_line('_NET_ACTIVE_WINDOW(WINDOW): window id # 0x2c0000a')
+        46137354
+        >>> print(parse_active_line('_NET_ACTIVE_WINDOW(WINDOW): window id # 0x0'))
+        None
+    """
+    wm_ids = parse_stacking_line(line)
+    if not wm_ids or not wm_ids[0]:
+        return None
+    return wm_ids[0]
+
+
+def parse_desktop_line(line):
+    """
+    Parses the ``_NET_CURRENT_DESKTOP`` line printed by ``xprop -root``
+
+    Returns:
+        str | None: the active desktop like ``wmctrl`` reports it
+    """
+    if '=' not in line:
+        return None
+    return line.split('=', 1)[1].strip()
+
+
+def parse_snapshot_lines(lines):
+    """
+    Parses the output of ``xprop -root`` for the stacking order, the active
+    desktop and the active window followed by ``wmctrl -lxp``, as printed by
+    the snapshot query of :mod:`vimtk.xctrl`. Lines are consumed one at a
+    time, so any iterable of lines works, e.g. a pipe.
+
+    Args:
+        lines (Iterable[str]): the output lines
+
+    Returns:
+        WindowSnapshot
+
+    Example:
+        >>> from vimtk.window_table import parse_snapshot_lines
+        >>> text = chr(10).join([
+        >>>     '_NET_CLIENT_LIST_STACKING(WINDOW): window id # 0x3c00007, 0x4200003',
+        >>>     '_NET_CURRENT_DESKTOP(CARDINAL) = 0',
+        >>>     '_NET_ACTIVE_WINDOW(WINDOW): window id # 0x3c00007',
+        >>>     '0x03c00007  0 4051   gvim.Gvim             host a.py (~) - GVIM',
+        >>>     '0x04200003  0 4100   xterm.XTerm           host make  -j4',
+        >>>     '',
+        >>> ])
+        >>> snapshot = parse_snapshot_lines(text.splitlines())
+        >>> snapshot.ordered_ids()
+        [62914567, 69206019]
+        >>> print(snapshot.current_desktop, snapshot.records[0x4200003].title)
+        0 make  -j4
+    """
+    stacking = []
+    current_desktop = None
+    focus = []
+    records = []
+    for line in lines:
+        if line.startswith('_NET_CLIENT_LIST_STACKING'):
+            stacking = parse_stacking_line(line) or []
+        elif line.startswith('_NET_CURRENT_DESKTOP'):
+            current_desktop = parse_desktop_line(line)
+        elif line.startswith('_NET_ACTIVE_WINDOW'):
+            active = parse_active_line(line)
+            focus = [] if active is None else [active]
+        elif line.strip():
+            records.append(WindowRecord.from_wmctrl_line(line))
+    return WindowSnapshot(records, stacking, current_desktop, focus=focus)
+
+
+class WindowRecord(object):
+    """
+    The fields ``wmctrl -lxp`` reports for one managed window.
+
+    Example:
+        >>> from vimtk.window_table import WindowRecord
+        >>> line = '0x03c00007  0 4051   gvim.Gvim             host a.py (~) - GVIM'
+        >>> record = WindowRecord.from_wmctrl_line(line)
+        >>> print(record.hexid, record.pid, record.wm_class, record.title)
+        0x03c00007 4051 gvim.Gvim a.py (~) - GVIM
+        >>> record.as_dict()['wm_id'] == 0x03c00007
+        True
+    """
+    __slots__ = ('wm_id', 'deskid', 'pid', 'wm_class', 'client', 'title',
+                 '_line')
+
+    def __init__(self, wm_id, deskid, pid, wm_class, client, title):
+        self.wm_id = wm_id
+        self.deskid = deskid
+        self.pid = pid
+        self.wm_class = wm_class
+        self.client = client
+        self.title = title
+        self._line = None
+
+    @classmethod
+    def from_wmctrl_line(cls, line):
+        """
+        Parses one line of ``wmctrl -lxp``. The title is everything after the
+        client column, so runs of spaces inside it are kept.
+
+        Example:
+            >>> from vimtk.window_table import WindowRecord
+            >>> line = '0x04200003 -1 0      Navigator.firefox     host a  b   c '
+            >>> record = WindowRecord.from_wmctrl_line(line)
+            >>> print(repr(record.title), record.deskid, record.pid)
+            'a  b   c ' -1 0
+            >>> print(repr(WindowRecord.from_wmctrl_line('0x1 0 1 a.A host').title))
+            ''
+        """
+        parts = line.rstrip('\n').split(None, 5)
+        if len(parts) < 5:
+            raise ValueError('Not a line of wmctrl -lxp: {!r}'.format(line))
+        hexid, deskid, pid, wm_class, client = parts[0:5]
+        title = parts[5] if len(parts) > 5 else ''
+        # Many windows share a class, desktop and host
+        return cls(int(hexid, 16), intern(deskid), int(pid), intern(wm_class),
+                   intern(client), title)
+
+    @classmethod
+    def from_info(cls, info):
+        return cls(info['wm_id'], info['deskid'], info['pid'],
+                   info['wm_class'], info['client'], info['title'])
+
+    @property
+    def hexid(self):
+        return '0x{:08x}'.format(self.wm_id)
+
+    def line(self):
+        """
+        Returns:
+            str: the record formatted like a line of ``wmctrl -lx``, which is
+            the text window patterns are matched against
+        """
+        if self._line is None:
+            self._line = '{} {:>2} {:<20} {} {}'.format(
+                self.hexid, self.deskid, self.wm_class, self.client,
+                self.title)
+        return self._line
+
+    def as_dict(self):
+        """
+        Returns:
+            Dict: the info dictionary of :func:`vimtk.xctrl.wmctrl_list`
+        """
+        return {
+            'hexid': self.hexid,
+            'wm_id': self.wm_id,
+            'deskid': self.deskid,
+            'pid': self.pid,
+            'wm_class': self.wm_class,
+            'client': self.client,
+            'title': self.title,
+        }
+
+    def __repr__(self):
+        return '<WindowRecord({})>'.format(self.line())
+
+
+class WindowSnapshot(object):
+    """
+    The managed windows and their stacking order at one point in time.
+
+    Args:
+        records (Iterable[WindowRecord]): one record per managed window
+
+        stacking (List[int]): window ids from bottom to top
+
+        current_desktop (str | None): the active desktop
+
+        focus (Tuple[int, ...]): window ids from the most to the least
+            recently focused, see :class:`FocusHistory`
+
+    Example:
+        >>> from vimtk.window_table import WindowSnapshot, WindowRecord
+        >>> snapshot = WindowSnapshot([
+        >>>     WindowRecord(1, '0', 10, 'gvim.Gvim', 'host', 'a.py'),
+        >>>     WindowRecord(2, '0', 20, 'xterm.XTerm', 'host', 'bash'),
+        >>>     WindowRecord(3, '1', 30, 'xterm.XTerm', 'host', 'htop'),
+        >>> ], stacking=[3, 1, 2])
+        >>> snapshot.ordered_ids('mru')
+        [2, 1, 3]
+        >>> snapshot.find_ids('XTerm')
+        [2, 3]
+        >>> snapshot.sort_ids([3, 2], 'lru')
+        [3, 2]
+        >>> # Recently focused windows come first, the rest by stacking order
+        >>> snapshot.with_focus((3, 9)).ordered_ids('mru')
+        [3, 2, 1]
+    """
+    __slots__ = ('records', 'stacking', 'current_desktop', 'focus', '_index')
+
+    def __init__(self, records, stacking, current_desktop=None, focus=()):
+        self.records = {record.wm_id: record for record in records}
+        self.stacking = list(stacking)
+        self.current_desktop = current_desktop
+        self.focus = tuple(focus)
+        self._index = None
+
+    def _replace(self, stacking, current_desktop, focus):
+        new = WindowSnapshot.__new__(WindowSnapshot)
+        new.records = self.records
+        new.stacking = list(stacking)
+        new.current_desktop = current_desktop
+        new.focus = tuple(focus)
+        new._index = None
+        return new
+
+    def with_stacking(self, stacking):
+        """
+        Returns:
+            WindowSnapshot: the same records in a new stacking order
+        """
+        return self._replace(stacking, self.current_desktop, self.focus)
+
+    def with_desktop(self, current_desktop):
+        """
+        Returns:
+            WindowSnapshot: the same records with another active desktop
+        """
+        return self._replace(self.stacking, current_desktop, self.focus)
+
+    def with_focus(self, focus):
+        """
+        Returns:
+            WindowSnapshot: the same records with another focus history
+        """
+        return self._replace(self.stacking, self.current_desktop, focus)
+
+    def with_titles(self, titles):
+        """
+        Args:
+            titles (Dict[int, str]): the current title of each window
+
+        Returns:
+            WindowSnapshot: the records with updated titles, or this snapshot
+            if no title changed
+
+        Example:
+            >>> from vimtk.window_table import WindowSnapshot, WindowRecord
+            >>> snapshot = WindowSnapshot([
+            >>>     WindowRecord(1, '0', 10, 'gvim.Gvim', 'host', 'a.py'),
+            >>>     WindowRecord(2, '0', 20, 'xterm.XTerm', 'host', 'bash'),
+            >>> ], stacking=[1, 2])
+            >>> assert snapshot.with_titles({1: 'a.py'}) is snapshot
+            >>> snapshot.with_titles({2: 'ipython'}).find_ids('ipython')
+            [2]
+        """
+        changed = {wm_id: title for wm_id, title in titles.items()
+                   if wm_id in self.records
+                   and self.records[wm_id].title != title}
+        if not changed:
+            return self
+        new = self._replace(self.stacking, self.current_desktop, self.focus)
+        new.records = dict(self.records)
+        for wm_id, title in changed.items():
+            record = self.records[wm_id]
+            new.records[wm_id] = WindowRecord(
+                wm_id, record.deskid, record.pid, record.wm_class,
+                record.client, title)
+        return new
+
+    def index(self):
+        """
+        Returns:
+            WindowIndex: the query index of this snapshot, built on first use
+        """
+        if self._index is None:
+            self._index = WindowIndex(self)
+        return self._index
+
+    def query(self, query, order='mru'):
+        """
+        Returns:
+            List[WindowRecord]: the records matching a :class:`WindowIndex`
+            query
+        """
+        return self.index().query(query, order=order)
+
+    def ordered_ids(self, order='mru'):
+        """
+        Args:
+            order (str): ``'mru'`` (most recently focused first, then the
+                remaining windows from the top of the stack) or ``'lru'``
+                (the reverse)
+
+        Returns:
+            List[int]: the ids of the windows that have a record
+        """
+        if order not in {'mru', 'lru'}:
+            raise NotImplementedError(order)
+        records = self.records
+        seen = set()
+        ordered = []
+        for wm_id in self.focus:
+            if wm_id in records and wm_id not in seen:
+                seen.add(wm_id)
+                ordered.append(wm_id)
+        for wm_id in reversed(self.stacking):
+            if wm_id in records and wm_id not in seen:
+                seen.add(wm_id)
+                ordered.append(wm_id)
+        if order == 'lru':
+            ordered.reverse()
+        return ordered
+
+    def ordered(self, order='mru'):
+        """
+        Returns:
+            List[WindowRecord]: records in the order of :func:`ordered_ids`
+        """
+        records = self.records
+        return [records[wm_id] for wm_id in self.ordered_ids(order)]
+
+    def sort_ids(self, wm_ids, order='mru'):
+        """
+        Returns:
+            List[int]: the given window ids in the order of
+            :func:`ordered_ids`
+        """
+        wanted = set(wm_ids)
+        return [wm_id for wm_id in self.ordered_ids(order) if wm_id in wanted]
+
+    def find(self, pattern=None):
+        """
+        Args:
+            pattern (str | None): regex searched in :func:`WindowRecord.line`
+
+        Returns:
+            List[WindowRecord]: matching records in mapping order
+        """
+        if pattern is None:
+            return list(self.records.values())
+        import re
+        search = re.compile(pattern).search
+        return [record for record in self.records.values()
+                if search(record.line())]
+
+    def find_ids(self, pattern=None):
+        return [record.wm_id for record in self.find(pattern)]
+
+
+def parse_query(query):
+    """
+    Parses a window query into clauses.
+
+    A query is one or more clauses joined by ``&``. Each clause is a field,
+    an operator and a value. The fields are ``id``, ``class`` (the
+    ``instance.Class`` pair of ``WM_CLASS``), ``title``, ``pid``,
+    ``desktop``, ``client`` (the host), and ``proc`` (the process name). The
+    ``=`` operator compares exactly, where ``class`` also matches either half
+    of the pair and ``desktop=current`` means the active desktop. The ``~``
+    operator searches a regular expression, use ``(?i)`` to ignore case.
+
+    Returns:
+        Tuple[Tuple[str, str, str], ...]: (field, op, value) clauses
+
+    Example:
+        >>> from vimtk.window_table import parse_query
+        >>> parse_query('class~terminal & desktop=current')
+        (('class', '~', 'terminal'), ('desktop', '=', 'current'))
+        >>> import pytest
+        >>> with pytest.raises(ValueError):
+        >>>     parse_query('colour=red')
+    """
+    return _parse_query(query)
+
+
+def query_uses_titles(query):
+    """
+    Returns:
+        bool: if a query has a ``title`` clause
+
+    Example:
+        >>> from vimtk.window_table import query_uses_titles
+        >>> query_uses_titles('class~terminal & title~ipython')
+        True
+        >>> query_uses_titles('class~terminal')
+        False
+    """
+    return any(field == 'title' for field, _, _ in parse_query(query))
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_query(query):
+    clauses = []
+    for text in query.split('&'):
+        text = text.strip()
+        match = _CLAUSE_PATTERN.match(text)
+        if match is None:
+            raise ValueError('Invalid window query clause {!r}'.format(text))
+        field, op, value = match.groups()
+        if field not in QUERY_FIELDS:
+            raise ValueError('Unknown window query field {!r}. Expected one '
+                             'of {}'.format(field, ', '.join(QUERY_FIELDS)))
+        clauses.append((field, op, value.strip()))
+    return tuple(clauses)
+
+
+_CLAUSE_PATTERN = re.compile(r'^(\w+)\s*([=~])(.*)$')
+
+
+@functools.lru_cache(maxsize=128)
+def _compile(pattern):
+    return re.compile(pattern).search
+
+
+class WindowIndex(object):
+    """
+    Hash indexes over the records of a :class:`WindowSnapshot`.
+
+    Exact clauses are dictionary lookups. Regex clauses on ``class`` and
+    ``desktop`` run once per distinct value instead of once per window, and
+    title patterns are compiled once per session. Process names come from
+    :data:`vimtk.procinfo.PROCESS_CACHE` and are only looked up for the
+    windows left after the other clauses.
+
+    Args:
+        snapshot (WindowSnapshot): the windows to index
+
+    Example:
+        >>> from vimtk.window_table import WindowSnapshot, WindowRecord
+        >>> snapshot = WindowSnapshot([
+        >>>     WindowRecord(1, '0', 10, 'gvim.Gvim', 'host', 'a.py'),
+        >>>     WindowRecord(2, '0', 20, 'gnome-terminal-server.Gnome-terminal', 'host', 'bash'),
+        >>>     WindowRecord(3, '1', 30, 'gnome-terminal-server.Gnome-terminal', 'host', 'htop'),
+        >>>     WindowRecord(4, '-1', 40, 'xterm.XTerm', 'host', 'sticky'),
+        >>> ], stacking=[3, 1, 4, 2], current_desktop='0')
+        >>> index = snapshot.index()
+        >>> index.query_ids('class~terminal & desktop=current')
+        [2]
+        >>> index.query_ids('class=XTerm')
+        [4]
+        >>> index.query_ids('desktop=current')
+        [2, 4, 1]
+        >>> index.query_ids('title~^h & pid=30')
+        [3]
+        >>> index.query_ids('class~(?i)TERM', order='lru')
+        [3, 4, 2]
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.by_class = {}
+        self.by_pid = {}
+        self.by_desktop = {}
+        self.by_client = {}
+        for wm_id, record in snapshot.records.items():
+            self.by_class.setdefault(record.wm_class, set()).add(wm_id)
+            self.by_pid.setdefault(record.pid, set()).add(wm_id)
+            self.by_desktop.setdefault(record.deskid, set()).add(wm_id)
+            self.by_client.setdefault(record.client, set()).add(wm_id)
+        self._class_parts = {}
+        for wm_class, wm_ids in self.by_class.items():
+            for part in {wm_class} | set(wm_class.split('.')):
+                self._class_parts.setdefault(part, set()).update(wm_ids)
+        self._rank = None
+        self._proc_names = {}
+
+    def rank(self):
+        """
+        Returns:
+            Dict[int, int]: position of each window in MRU order
+        """
+        if self._rank is None:
+            self._rank = {wm_id: rank for rank, wm_id in
+                          enumerate(self.snapshot.ordered_ids('mru'))}
+        return self._rank
+
+    def _proc_name(self, pid):
+        try:
+            return self._proc_names[pid]
+        except KeyError:
+            pass
+        from vimtk.procinfo import PROCESS_CACHE
+        name = self._proc_names[pid] = PROCESS_CACHE.name(pid)
+        return name
+
+    def _keyed(self, table, op, value):
+        if op == '=':
+            return table.get(value, set())
+        search = _compile(value)
+        found = set()
+        for key, wm_ids in table.items():
+            if search(str(key)):
+                found.update(wm_ids)
+        return found
+
+    def _candidates(self, field, op, value):
+        """
+        Returns the ids matching a clause, or None if the clause has to be
+        checked against each remaining window
+        """
+        if field == 'class':
+            return self._keyed(self.by_class if op == '~' else self._class_parts,
+                               op, value)
+        elif field == 'desktop':
+            if op == '=' and value == 'current':
+                value = self.snapshot.current_desktop
+                # Sticky windows are on every desktop
+                return self.by_desktop.get(value, set()) | self.by_desktop.get('-1', set())
+            return self._keyed(self.by_desktop, op, value)
+        elif field == 'pid' and op == '=':
+            return self.by_pid.get(int(value), set())
+        elif field == 'client':
+            return self._keyed(self.by_client, op, value)
+        elif field == 'id' and op == '=':
+            wm_id = int(value, 0)
+            return {wm_id} if wm_id in self.snapshot.records else set()
+        return None
+
+    def _check(self, record, field, op, value):
+        if field == 'title':
+            text = record.title
+        elif field == 'proc':
+            text = self._proc_name(record.pid)
+            if text is None:
+                return False
+        elif field == 'pid':
+            text = str(record.pid)
+        else:
+            text = record.hexid
+        if op == '=':
+            return text == value
+        return _compile(value)(text) is not None
+
+    def select(self, clauses, order='mru'):
+        """
+        Args:
+            clauses (Iterable[Tuple[str, str, str]]): parsed query, see
+                :func:`parse_query`
+
+            order (str): ``'mru'`` or ``'lru'``
+
+        Returns:
+            List[WindowRecord]: matching records in stacking order
+        """
+        if order not in {'mru', 'lru'}:
+            raise NotImplementedError(order)
+        candidates = None
+        checks = []
+        for field, op, value in clauses:
+            found = self._candidates(field, op, value)
+            if found is None:
+                checks.append((field, op, value))
+            elif candidates is None:
+                candidates = set(found)
+            else:
+                candidates &= found
+        if candidates is None:
+            candidates = self.snapshot.records.keys()
+        records = self.snapshot.records
+        # Process names are the expensive check, so they go last
+        checks.sort(key=lambda clause: clause[0] == 'proc')
+        matched = [records[wm_id] for wm_id in candidates
+                   if all(self._check(records[wm_id], *clause)
+                          for clause in checks)]
+        rank = self.rank()
+        missing = len(rank)
+        matched.sort(key=lambda record: rank.get(record.wm_id, missing),
+                     reverse=(order == 'lru'))
+        return matched
+
+    def query(self, query, order='mru'):
+        """
+        Args:
+            query (str): e.g. ``'class~terminal & desktop=current'``, see
+                :func:`parse_query`
+
+        Returns:
+            List[WindowRecord]: matching records in stacking order
+        """
+        return self.select(_parse_query(query), order=order)
+
+    def query_ids(self, query, order='mru'):
+        return [record.wm_id for record in self.query(query, order=order)]
+
+
+class FocusHistory(object):
+    """
+    Window ids in the order they last had the input focus.
+
+    Args:
+        maxlen (int): number of windows to remember
+
+    Example:
+        >>> from vimtk.window_table import FocusHistory
+        >>> history = FocusHistory(maxlen=3)
+        >>> for wm_id in [1, 2, 3, 1, 0, 4]:
+        >>>     history.push(wm_id)
+        >>> history.ids()
+        (4, 1, 3)
+    """
+
+    def __init__(self, maxlen=64):
+        from collections import OrderedDict
+        self.maxlen = maxlen
+        # Most recently focused last
+        self._ids = OrderedDict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def push(self, wm_id):
+        """
+        Records that a window got the focus. None and 0 mean no window is
+        active and are ignored.
+        """
+        if not wm_id:
+            return
+        self._ids.pop(wm_id, None)
+        self._ids[wm_id] = None
+        if len(self._ids) > self.maxlen:
+            self._ids.popitem(last=False)
+
+    def discard(self, wm_id):
+        self._ids.pop(wm_id, None)
+
+    def ids(self):
+        """
+        Returns:
+            Tuple[int, ...]: window ids, most recently focused first
+        """
+        return tuple(reversed(self._ids))
+
+
+class WindowTable(object):
+    """
+    Args:
+        query_snapshot (Callable[[], WindowSnapshot]):
+            queries the window records and the stacking order together
+
+        query_stacking (Callable[[], List[int]] | None):
+            returns the window ids from bottom to top. If None, a stacking
+            change without the new order refills the whole snapshot.
+
+        watcher (XlibRootWatcher | XpropSpyWatcher | None):
+            reports changes to the root window properties. Its ``poll``
+            method returns a list of ``('clients', None)``,
+            ``('stacking', order_or_None)``,
+            ``('desktop', desktop_or_None)`` and
+            ``('active', wm_id_or_None)`` events.
+
+        ttl (float | None): if given, refill after this many seconds
+
+        query_titles (Callable[[], Dict[int, str]] | None):
+            returns the current title of each window. Titles change without
+            any root window notification, so lookups that match titles ask
+            for them with ``snapshot(titles=True)``. If None, those lookups
+            refill the whole snapshot.
+    """
+
+    def __init__(self, query_snapshot, query_stacking=None, watcher=None,
+                 ttl=None, query_titles=None):
+        self.query_snapshot = query_snapshot
+        self.query_stacking = query_stacking
+        self.query_titles = query_titles
+        self.watcher = watcher
+        self.ttl = ttl
+        self.focus_history = FocusHistory()
+        self._snapshot = None
+        self._filled_at = None
+
+    def invalidate(self):
+        """
+        Forget everything, the next access refills the table
+        """
+        self._snapshot = None
+
+    def _expired(self):
+        if self._snapshot is None:
+            return True
+        if self.ttl is not None:
+            return time.monotonic() - self._filled_at > self.ttl
+        # Without a watcher nothing tells us the table is out of date
+        return self.watcher is None
+
+    def _sync(self):
+        if self.watcher is not None:
+            focus_changed = False
+            for kind, value in self.watcher.poll():
+                if kind == 'active':
+                    self.focus_history.push(value)
+                    focus_changed = True
+                elif kind == 'clients':
+                    self.invalidate()
+                elif kind == 'stacking' and self._snapshot is not None:
+                    if value is None:
+                        if self.query_stacking is None:
+                            self.invalidate()
+                            continue
+                        STATS.record('window_table', 'stacking query')
+                        value = self.query_stacking()
+                    self._snapshot = self._snapshot.with_stacking(value)
+                elif kind == 'desktop' and self._snapshot is not None:
+                    if value is None:
+                        # Desktop switches are rare, refill everything
+                        self.invalidate()
+                    else:
+                        self._snapshot = self._snapshot.with_desktop(value)
+            if focus_changed and self._snapshot is not None:
+                self._snapshot = self._snapshot.with_focus(
+                    self.focus_history.ids())
+        if self._expired():
+            STATS.record('window_table', 'fill')
+            snapshot = self.query_snapshot()
+            # The query may have seen a focus change the watcher has not
+            # reported yet. Later events replay in order, so the history
+            # still ends with the latest change.
+            for wm_id in reversed(snapshot.focus):
+                self.focus_history.push(wm_id)
+            self._snapshot = snapshot.with_focus(self.focus_history.ids())
+            self._filled_at = time.monotonic()
+            return True
+        return False
+
+    def snapshot(self, titles=False):
+        """
+        Args:
+            titles (bool): if True, the titles are read again unless the
+                table was just refilled. Use this for lookups that match
+                titles.
+
+        Returns:
+            WindowSnapshot: the current window records and stacking order
+        """
+        filled = self._sync()
+        if titles and not filled:
+            if self.query_titles is None:
+                self.invalidate()
+                self._sync()
+            else:
+                STATS.record('window_table', 'title query')
+                self._snapshot = self._snapshot.with_titles(self.query_titles())
+        return self._snapshot
+
+    def window_list(self):
+        """
+        Returns:
+            Dict[int, WindowRecord]: window records keyed by window id
+        """
+        return self.snapshot().records
+
+    def stacking_order(self):
+        """
+        Returns:
+            List[int]: window ids from bottom to top
+        """
+        return self.snapshot().stacking
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+
+
+class XlibRootWatcher(object):
+    """
+    Watches the root window properties through ``PropertyNotify`` events.
+
+    A daemon thread with its own X connection waits for the events and
+    queues them, so polling never blocks. The thread reads the new
+    ``_NET_ACTIVE_WINDOW`` as soon as it changes, which keeps focus changes
+    that happen between two polls in the history. The session connection of
+    :mod:`vimtk.xlib_backend` is not shared with the thread.
+
+    Args:
+        backend (vimtk.xlib_backend.XlibBackend): the session connection,
+            whose display the watcher connects to
+    """
+
+    def __init__(self, backend):
+        import threading
+        from collections import deque
+        from Xlib import X
+        from Xlib import display as xdisplay
+        self.display = xdisplay.Display(backend.display.get_display_name())
+        self.root = self.display.screen().root
+        self._atoms = {
+            self.display.intern_atom(name): kind
+            for name, kind in _PROPERTY_KINDS.items()
+        }
+        self._active_atom = self.display.intern_atom('_NET_ACTIVE_WINDOW')
+        self.root.change_attributes(event_mask=X.PropertyChangeMask)
+        self.display.flush()
+        # deque appends and pops are atomic, so it is the only shared state
+        self._events = deque([('active', self._read_active())])
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='vimtk-root-watcher', daemon=True)
+        self._thread.start()
+
+    def _read_active(self):
+        from Xlib import X
+        prop = self.root.get_full_property(self._active_atom, X.AnyPropertyType)
+        if prop is None or not len(prop.value) or not prop.value[0]:
+            return None
+        return int(prop.value[0])
+
+    def _run(self):
+        import select
+        from Xlib import X
+        display = self.display
+        try:
+            while not self._stop.is_set():
+                select.select([display.fileno()], [], [], 0.1)
+                while display.pending_events():
+                    event = display.next_event()
+                    if event.type != X.PropertyNotify:
+                        continue
+                    kind = self._atoms.get(event.atom, None)
+                    if kind == 'active':
+                        self._events.append((kind, self._read_active()))
+                    elif kind is not None:
+                        self._events.append((kind, None))
+        except Exception as ex:
+            if not self._stop.is_set():
+                logger.warning('Stopped watching the root window: {!r}'.format(ex))
+
+    def poll(self):
+        if not self._thread.is_alive():
+            # The connection broke, so every access has to assume the table
+            # is stale.
+            return [('clients', None)]
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=0.5)
+        self.display.close()
+
+
+class XpropSpyWatcher(object):
+    """
+    Watches the root window properties with a long running
+    ``xprop -root -spy`` process, whose output is read without blocking.
+
+    Example:
+        >>> from vimtk.window_table import XpropSpyWatcher
+        >>> line = '_NET_CLIENT_LIST_STACKING(WINDOW): window id # 0x1a00003, 0x2c0000a'
+        >>> XpropSpyWatcher._parse_line(line)
+        ('stacking', [27262979, 46137354])
+        >>> XpropSpyWatcher._parse_line('_NET_CLIENT_LIST(WINDOW): window id # 0x1a00003')
+        ('clients', None)
+        >>> XpropSpyWatcher._parse_line('_NET_CURRENT_DESKTOP(CARDINAL) = 2')
+        ('desktop', '2')
+        >>> XpropSpyWatcher._parse_line('_NET_ACTIVE_WINDOW(WINDOW): window id # 0x1a00003')
+        ('active', 27262979)
+    """
+
+    def __init__(self, startup_timeout=0.2):
+        import os
+        import subprocess
+        from vimtk import runner
+        exe = runner.which('xprop')
+        if exe is None:
+            raise FileNotFoundError('xprop is not installed')
+        self.proc = subprocess.Popen(
+            [exe, '-root', '-spy'] + list(WATCHED_PROPERTIES),
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        os.set_blocking(self.proc.stdout.fileno(), False)
+        self._partial = b''
+        self._pending = []
+        # xprop prints the current values when it starts. Consume them so
+        # they are not mistaken for changes, except for the active window,
+        # which starts the focus history.
+        self._wait_readable(startup_timeout)
+        self._pending = [event for event in self.poll() if event[0] == 'active']
+
+    def _wait_readable(self, timeout):
+        import select
+        select.select([self.proc.stdout], [], [], timeout)
+
+    @staticmethod
+    def _parse_line(line):
+        if line.startswith('_NET_CLIENT_LIST_STACKING'):
+            return ('stacking', parse_stacking_line(line))
+        elif line.startswith('_NET_CLIENT_LIST'):
+            return ('clients', None)
+        elif line.startswith('_NET_CURRENT_DESKTOP'):
+            return ('desktop', parse_desktop_line(line))
+        elif line.startswith('_NET_ACTIVE_WINDOW'):
+            return ('active', parse_active_line(line))
+        return None
+
+    def poll(self):
+        if self.proc.poll() is not None:
+            # The helper died (e.g. the X server went away), so every access
+            # has to assume the table is stale.
+            return [('clients', None)]
+        import os
+        fd = self.proc.stdout.fileno()
+        chunks = [self._partial]
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b''.join(chunks)
+        *lines, self._partial = data.split(b'\n')
+        events, self._pending = self._pending, []
+        for line in lines:
+            event = self._parse_line(line.decode('utf8', errors='replace'))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def close(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.proc.stdout.close()
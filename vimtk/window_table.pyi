@@ -0,0 +1,210 @@
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+from _typeshed import Incomplete
+
+logger: Incomplete
+WATCHED_PROPERTIES: Tuple[str, ...]
+QUERY_FIELDS: Tuple[str, ...]
+
+
+def parse_stacking_line(line: str) -> List[int] | None:
+    ...
+
+
+def parse_active_line(line: str) -> int | None:
+    ...
+
+
+def parse_desktop_line(line: str) -> str | None:
+    ...
+
+
+def parse_snapshot_lines(lines: Iterable[str]) -> WindowSnapshot:
+    ...
+
+
+class WindowRecord:
+    wm_id: int
+    deskid: str
+    pid: int
+    wm_class: str
+    client: str
+    title: str
+
+    def __init__(self, wm_id: int, deskid: str, pid: int, wm_class: str,
+                 client: str, title: str) -> None:
+        ...
+
+    @classmethod
+    def from_wmctrl_line(cls, line: str) -> WindowRecord:
+        ...
+
+    @classmethod
+    def from_info(cls, info: Dict) -> WindowRecord:
+        ...
+
+    @property
+    def hexid(self) -> str:
+        ...
+
+    def line(self) -> str:
+        ...
+
+    def as_dict(self) -> Dict:
+        ...
+
+
+class WindowSnapshot:
+    records: Dict[int, WindowRecord]
+    stacking: List[int]
+    current_desktop: str | None
+    focus: Tuple[int, ...]
+
+    def __init__(self, records: Iterable[WindowRecord],
+                 stacking: List[int],
+                 current_desktop: str | None = None,
+                 focus: Iterable[int] = ...) -> None:
+        ...
+
+    def with_stacking(self, stacking: List[int]) -> WindowSnapshot:
+        ...
+
+    def with_desktop(self, current_desktop: str | None) -> WindowSnapshot:
+        ...
+
+    def with_focus(self, focus: Iterable[int]) -> WindowSnapshot:
+        ...
+
+    def with_titles(self, titles: Dict[int, str]) -> WindowSnapshot:
+        ...
+
+    def index(self) -> WindowIndex:
+        ...
+
+    def query(self, query: str, order: str = 'mru') -> List[WindowRecord]:
+        ...
+
+    def ordered_ids(self, order: str = 'mru') -> List[int]:
+        ...
+
+    def ordered(self, order: str = 'mru') -> List[WindowRecord]:
+        ...
+
+    def sort_ids(self, wm_ids: Iterable[int],
+                 order: str = 'mru') -> List[int]:
+        ...
+
+    def find(self, pattern: str | None = None) -> List[WindowRecord]:
+        ...
+
+    def find_ids(self, pattern: str | None = None) -> List[int]:
+        ...
+
+
+def parse_query(query: str) -> Tuple[Tuple[str, str, str], ...]:
+    ...
+
+
+def query_uses_titles(query: str) -> bool:
+    ...
+
+
+class WindowIndex:
+    snapshot: WindowSnapshot
+    by_class: Dict[str, Set[int]]
+    by_pid: Dict[int, Set[int]]
+    by_desktop: Dict[str, Set[int]]
+    by_client: Dict[str, Set[int]]
+
+    def __init__(self, snapshot: WindowSnapshot) -> None:
+        ...
+
+    def rank(self) -> Dict[int, int]:
+        ...
+
+    def select(self, clauses: Iterable[Tuple[str, str, str]],
+               order: str = 'mru') -> List[WindowRecord]:
+        ...
+
+    def query(self, query: str, order: str = 'mru') -> List[WindowRecord]:
+        ...
+
+    def query_ids(self, query: str, order: str = 'mru') -> List[int]:
+        ...
+
+
+class FocusHistory:
+    maxlen: int
+
+    def __init__(self, maxlen: int = 64) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+    def push(self, wm_id: int | None) -> None:
+        ...
+
+    def discard(self, wm_id: int) -> None:
+        ...
+
+    def ids(self) -> Tuple[int, ...]:
+        ...
+
+
+class WindowTable:
+    query_snapshot: Callable[[], WindowSnapshot]
+    query_stacking: Callable[[], List[int]] | None
+    watcher: Incomplete
+    ttl: float | None
+    query_titles: Callable[[], Dict[int, str]] | None
+    focus_history: FocusHistory
+
+    def __init__(self,
+                 query_snapshot: Callable[[], WindowSnapshot],
+                 query_stacking: Callable[[], List[int]] | None = None,
+                 watcher: Incomplete | None = None,
+                 ttl: float | None = None,
+                 query_titles: Callable[[], Dict[int, str]] | None = None) -> None:
+        ...
+
+    def invalidate(self) -> None:
+        ...
+
+    def snapshot(self, titles: bool = False) -> WindowSnapshot:
+        ...
+
+    def window_list(self) -> Dict[int, WindowRecord]:
+        ...
+
+    def stacking_order(self) -> List[int]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class XlibRootWatcher:
+    display: Incomplete
+    root: Incomplete
+
+    def __init__(self, backend) -> None:
+        ...
+
+    def poll(self) -> List[Tuple[str, int | None]]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class XpropSpyWatcher:
+    proc: Incomplete
+
+    def __init__(self, startup_timeout: float = 0.2) -> None:
+        ...
+
+    def poll(self) -> List[Tuple[str, List[int] | int | str | None]]:
+        ...
+
+    def close(self) -> None:
+        ...
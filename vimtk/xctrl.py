@@ -11,10 +11,12 @@ try:
 except Exception:
     ub = None
 
+import functools
 import time
 import re
 import logging
 from vimtk import cplat
+from vimtk import runner
 try:
     from shlex import quote as cmd_quote
 except ImportError:
@@ -22,49 +24,171 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Sentinel meaning the backend has not been selected yet
+_UNSET = object()
+_NATIVE = _UNSET
+
+
+def _native_backend():
+    """
+    Returns the session connection of :mod:`vimtk.xlib_backend` if it is
+    selected by ``g:vimtk_xctrl_backend`` and available, otherwise None, in
+    which case the command line tools are used.
+    """
+    global _NATIVE
+    if _NATIVE is _UNSET:
+        _NATIVE = _select_native_backend()
+    return _NATIVE
+
+
+def _select_native_backend():
+    from vimtk import xlib_backend
+    from vimtk.core import CONFIG
+    choice = CONFIG.get('vimtk_xctrl_backend', 'auto')
+    if choice == 'cli':
+        return None
+    if choice not in {'auto', 'xlib'}:
+        raise KeyError('Unknown vimtk_xctrl_backend={!r}. '
+                       'Expected auto, xlib, or cli'.format(choice))
+    if choice == 'auto' and not xlib_backend.is_available():
+        return None
+    try:
+        return xlib_backend.connect()
+    except Exception as ex:
+        if choice == 'xlib':
+            raise
+        logger.warning('Cannot connect to X, using the command line '
+                       'tools: {!r}'.format(ex))
+        return None
+
+
+def reset_backend():
+    """
+    Selects the backend again on next use, e.g. after changing
+    ``g:vimtk_xctrl_backend``, and drops the window table.
+    """
+    global _NATIVE, _TABLE
+    if _TABLE is not None:
+        _TABLE.close()
+    _NATIVE = _UNSET
+    _TABLE = None
+
+
+_TABLE = None
+
+
+def window_table():
+    """
+    Returns the :class:`vimtk.window_table.WindowTable` for this session,
+    which caches the window list and stacking order until the root window
+    reports a change.
+    """
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = _make_window_table()
+    return _TABLE
+
+
+def _make_window_table():
+    import atexit
+    from vimtk import window_table as window_table_mod
+    from vimtk.core import CONFIG
+    ttl = CONFIG['vimtk_window_table_ttl']
+    if ttl is not None:
+        ttl = float(ttl)
+    native = _native_backend()
+    watcher = None
+    try:
+        if native is not None:
+            watcher = window_table_mod.XlibRootWatcher(native)
+        else:
+            watcher = window_table_mod.XpropSpyWatcher()
+    except Exception as ex:
+        logger.debug('Cannot watch the root window, the window table will '
+                     'not be cached: {!r}'.format(ex))
+    table = window_table_mod.WindowTable(
+        _query_snapshot, _query_stacking_order, watcher=watcher, ttl=ttl,
+        query_titles=_query_titles)
+    atexit.register(table.close)
+    return table
+
 
 def is_directory_open(dpath):
     # FIXME
-    import ubelt as ub  # pip install me! https://github.com/Erotemic/ubelt
     import platform
     from os.path import basename
-    import re
     computer_name = platform.node()
     dname = basename(dpath)
-    if not ub.find_exe('wmctrl'):
-        raise Exception('wmctrl must be installed')
-
-    for line in ub.cmd('wmctrl -lxp')['out'].splitlines():
-        parts = re.split(' +', line)
-        if len(parts) > 3 and parts[3] == 'nautilus.Nautilus':
-            if parts[4] == computer_name:
+    for record in window_table().snapshot(titles=True).records.values():
+        if record.wm_class == 'nautilus.Nautilus':
+            if record.client == computer_name:
                 # FIXME: Might be a False positive!
-                line_dname = ' '.join(parts[5:])
-                if line_dname == dname:
+                if record.title == dname:
                     return True
     # Always correctly returns False
     return False
 
 
 def wmctrl_list():
-    lines = ub.cmd('wmctrl -lxp')['out']
-    windows = {}
-    for line in lines.split('\n'):
-        if line:
-            parts = re.split(' +', line)
-            hexid, deskid, pid, wm_class, client = parts[0:5]
-            title = ' '.join(parts[5:])
-            wm_id = int(hexid, 16)
-            windows[wm_id] = {
-                'hexid': hexid,
-                'wm_id': wm_id,
-                'deskid': deskid,
-                'pid': int(pid),
-                'wm_class': wm_class,
-                'client': client,
-                'title': title,
-            }
-    return windows
+    """
+    Returns:
+        Dict[int, Dict]: info about each managed window keyed by window id,
+        served from the session :func:`window_table`.
+    """
+    records = window_table().window_list()
+    return {wm_id: record.as_dict() for wm_id, record in records.items()}
+
+
+# Print the stacking order, the active window and the window list. They
+# are started together, so the snapshot costs one round of process start up.
+_SNAPSHOT_COMMANDS = [
+    ['xprop', '-root', '_NET_CLIENT_LIST_STACKING', '_NET_CURRENT_DESKTOP',
+     '_NET_ACTIVE_WINDOW'],
+    ['wmctrl', '-lxp'],
+]
+
+
+def _query_snapshot():
+    """
+    Returns:
+        vimtk.window_table.WindowSnapshot: the stacking order together with
+        the class, pid, desktop and title of every managed window. Its focus
+        history only holds the active window.
+    """
+    from vimtk.window_table import (WindowRecord, WindowSnapshot,
+                                    parse_snapshot_lines)
+    native = _native_backend()
+    if native is not None:
+        records = [WindowRecord.from_info(info)
+                   for info in native.window_list().values()]
+        return WindowSnapshot(records, native.stacking_order(),
+                              native.current_desktop(),
+                              focus=[native.active_window()])
+    lines = []
+    for info in runner.run_many(_SNAPSHOT_COMMANDS):
+        if info['ret'] != 0:
+            raise Exception('Cannot list windows: {} failed: {}'.format(
+                info['command'][0], info['err'].strip()))
+        lines.extend(info['out'].splitlines())
+    return parse_snapshot_lines(lines)
+
+
+def _query_titles():
+    """
+    Returns:
+        Dict[int, str]: the current title of every managed window
+    """
+    from vimtk.window_table import WindowRecord
+    native = _native_backend()
+    if native is not None:
+        return native.window_titles()
+    info = runner.run(['wmctrl', '-lxp'])
+    if info['ret'] != 0:
+        raise Exception('Cannot list windows: wmctrl failed: {}'.format(
+            info['err'].strip()))
+    records = [WindowRecord.from_wmctrl_line(line)
+               for line in info['out'].splitlines() if line.strip()]
+    return {record.wm_id: record.title for record in records}
 
 
 def windows_in_order():
@@ -138,21 +262,21 @@ def windows_in_order():
         ub.cmd('wmctrl -lxp')['out']
         os.system('wmctrl -lxp')
     """
-    # info = XCtrl.cmd('xprop -root')
-    info = XCtrl.cmd('xprop -root _NET_CLIENT_LIST_STACKING')
-
-    lines = [line for line in info['out'].split('\n')
-             if line.startswith('_NET_CLIENT_LIST_STACKING')]
-    assert len(lines) == 1, str(lines)
-    winid_order_str = lines[0]
-    winid_order = winid_order_str.split('#')[1].strip().split(', ')[::-1]
-    winid_order = [int(h, 16) for h in winid_order]
+    for record in window_table().snapshot().ordered('mru'):
+        yield XWindow(record.wm_id, record.as_dict())
 
-    windows = wmctrl_list()
 
-    for wm_id in winid_order:
-        info = windows[wm_id]
-        yield XWindow(wm_id, info)
+def _query_stacking_order():
+    """
+    Returns:
+        List[int]: managed window ids from bottom to top
+    """
+    from vimtk.window_table import parse_stacking_line
+    native = _native_backend()
+    if native is not None:
+        return native.stacking_order()
+    info = runner.run(['xprop', '-root', '_NET_CLIENT_LIST_STACKING'])
+    return parse_stacking_line(info['out']) or []
 
 
 def find_windows(proc=None, title=None, visible=True):
@@ -168,28 +292,40 @@ def find_windows(proc=None, title=None, visible=True):
         >>> for win in find_windows('terminator'):
         >>>     print(ub.urepr(win.info()))
     """
-    import re
-    for win in windows_in_order():
-        flag = True
-        if proc:
-            try:
-                proc_name = win.process_name()
-                flag &= bool(re.match(proc, proc_name))
-            except Exception:
-                flag = False
-        if title:
-            try:
-                win_title = win.title()
-                flag &= bool(re.match(title, win_title))
-            except Exception:
-                flag = False
-        if visible:
-            try:
-                flag &= win.visible()
-            except Exception:
-                flag = False
-        if flag:
-            yield win
+    # Anchor the patterns to keep the re.match semantics
+    clauses = []
+    if title:
+        clauses.append(('title', '~', '^(?:{})'.format(title)))
+    if proc:
+        clauses.append(('proc', '~', '^(?:{})'.format(proc)))
+    index = window_table().snapshot(titles=bool(title)).index()
+    for record in index.select(clauses, order='mru'):
+        # XWindow.visible is always true for wmctrl windows
+        yield XWindow(record.wm_id, record.as_dict())
+
+
+def query_windows(query, order='mru'):
+    """
+    Finds windows with a :class:`vimtk.window_table.WindowIndex` query like
+    ``class~terminal & desktop=current``.
+
+    Args:
+        query (str): see :func:`vimtk.window_table.parse_query`
+        order (str): ``'mru'`` or ``'lru'``
+
+    Returns:
+        List[XWindow]: the matching windows in stacking order
+
+    Example:
+        >>> # xdoctest: +REQUIRES(env:DISPLAY)
+        >>> from vimtk.xctrl import *  # NOQA
+        >>> for win in query_windows('desktop=current'):
+        >>>     print(win)
+    """
+    from vimtk.window_table import query_uses_titles
+    snapshot = window_table().snapshot(titles=query_uses_titles(query))
+    records = snapshot.query(query, order=order)
+    return [XWindow(record.wm_id, record.as_dict()) for record in records]
 
 
 class XWindow(object):
@@ -208,6 +344,24 @@ class XWindow(object):
         self = XWindow(wm_id)
         return self
 
+    @classmethod
+    def find_query(XWindow, query, method='mru'):
+        """
+        Returns the first window matching a :func:`query_windows` query
+        """
+        from vimtk.window_table import query_uses_titles
+        snapshot = window_table().snapshot(titles=query_uses_titles(query))
+        records = snapshot.query(query, order=method)
+        if not records:
+            available_windows = '\n'.join(
+                record.line() for record in snapshot.records.values())
+            msg = 'No window matches query=%r' % (query,)
+            msg += '\navailable windows are:\n%s' % (available_windows,)
+            logger.error(msg)
+            raise Exception(msg)
+        record = records[0]
+        return XWindow(record.wm_id, record.as_dict())
+
     @classmethod
     def findall(XWindow, pattern):
         wm_ids = XCtrl.findall_window_ids(pattern)
@@ -227,24 +381,24 @@ class XWindow(object):
             >>> print('self: XWindow = {}'.format(ub.urepr(self, nl=1)))
             >>> print('info = ' + ub.urepr(self.wininfo()))
         """
-        wm_id = int(ub.cmd('xdotool getwindowfocus')['out'].strip())
+        wm_id = XCtrl.current_window_id()
         win = XWindow(wm_id)
         return win
 
     def _wmquery(self, key):
         if self.cache:
             return self.cache[key]
-        windows = wmctrl_list()
-        info = windows[self.wm_id]
-        self.cache = info
-        return info['title']
+        # Titles are not cached by the window table, see its titles argument
+        snapshot = window_table().snapshot(titles=(key == 'title'))
+        self.cache = snapshot.records[self.wm_id].as_dict()
+        return self.cache[key]
 
     @property
     def hexid(self):
         return hex(self.wm_id)
 
     def title(self):
-        self._wmquery('title')
+        return self._wmquery('title')
 
     def visible(self):
         """ Basically true for wmctrl (afaik) """
@@ -261,10 +415,9 @@ class XWindow(object):
         return self._wmquery('wm_class')
 
     def process(self):
-        import psutil
+        from vimtk.procinfo import PROCESS_CACHE
         pid = self._wmquery('pid')
-        proc = psutil.Process(pid)
-        return proc
+        return PROCESS_CACHE.process(pid)
 
     def size(self):
         # Get the current size
@@ -286,13 +439,13 @@ class XWindow(object):
             >>> w, h = self.size()
             >>> self.resize(w + 10, h + 10)
         """
-        command = f'xdotool windowsize {self.wm_id} {width} {height}'
-        ub.cmd(command, verbose=3)
+        _move_resize_windows({self.wm_id: (-1, -1, width, height)},
+                             unmaximize=False)
 
     def wininfo(self):
         """
         """
-        cmdinfo = ub.cmd('xwininfo -id {}'.format(self.wm_id))
+        cmdinfo = runner.run(['xwininfo', '-id', str(self.wm_id)])
         if cmdinfo['ret'] != 0:
             print('info = {}'.format(ub.urepr(cmdinfo, nl=1)))
             raise Exception(cmdinfo['ret'])
@@ -317,12 +470,53 @@ class XWindow(object):
         return info
 
     def process_name(self):
-        proc = self.process()
-        return proc.name()
+        import psutil
+        from vimtk.procinfo import PROCESS_CACHE
+        pid = self._wmquery('pid')
+        info = PROCESS_CACHE.info(pid)
+        if info is None:
+            raise psutil.NoSuchProcess(pid)
+        return info['name']
+
+    def focus(self, sleeptime=None, sync=False, timeout=0.5):
+        """
+        Activates the window.
 
-    def focus(self, sleeptime=None):
-        ub.cmd('wmctrl -ia {}'.format(self.hexid))
-        time.sleep(sleeptime if sleeptime is not None else  self.sleeptime)
+        Args:
+            sleeptime (float | None): seconds to sleep afterwards, or, if
+                ``sync`` is True, only if the focus change was not confirmed
+
+            sync (bool): wait until the window manager reports the window as
+                active, polling ``_NET_ACTIVE_WINDOW`` with the xlib backend or
+                with ``xdotool windowactivate --sync`` otherwise
+
+            timeout (float): maximum seconds to wait if ``sync`` is True
+
+        Returns:
+            bool: True if the focus change was confirmed
+        """
+        if sleeptime is None:
+            sleeptime = self.sleeptime
+        native = _native_backend()
+        confirmed = False
+        if not sync:
+            if native is not None:
+                native.activate(self.wm_id)
+            else:
+                runner.run(['wmctrl', '-ia', self.hexid])
+        elif native is not None:
+            native.activate(self.wm_id)
+            confirmed = native.wait_active(self.wm_id, timeout=timeout)
+        else:
+            info = runner.run(['xdotool', 'windowactivate', '--sync',
+                               str(self.wm_id)], timeout=timeout)
+            confirmed = info['ret'] == 0 and not info['timed_out']
+        if not confirmed:
+            if sync:
+                logger.debug('Focus on {} not confirmed after {}s'.format(
+                    self.hexid, timeout))
+            time.sleep(sleeptime)
+        return confirmed
 
     def info(self):
         info = self.cache.copy()
@@ -401,19 +595,120 @@ class XWindow(object):
 
         print('MOVING: win_key = %r' % (self.title(),))
         print('TO: abs_bbox = %r' % (abs_bbox,))
-        # abs_bbox.replace('[', '').replace(']', '')
-        # get = lambda cmd: XCtrl.cmd(' '.join(["/bin/bash", "-c", cmd]))['out']  # NOQA
-        win_id = XCtrl.find_window_id(self.title(), error='raise')
-        print('MOVING: win_id = %r' % (win_id,))
-        fmtdict = locals()
-        cmd_list = [
-            ("wmctrl -ir {win_id} -b remove,maximized_horz".format(**fmtdict)),
-            ("wmctrl -ir {win_id} -b remove,maximized_vert".format(**fmtdict)),
-            ("wmctrl -ir {win_id} -e 0,{abs_bbox}".format(**fmtdict)),
-        ]
-        print('\n'.join(cmd_list))
-        for cmd in cmd_list:
-            XCtrl.cmd(cmd)
+        _move_resize_windows({self.wm_id: _parse_bbox(abs_bbox)})
+
+
+def _parse_bbox(bbox):
+    """
+    Args:
+        bbox (str | Sequence[int]): ``x, y, w, h`` as a sequence, or as a
+            comma separated string with optional brackets
+
+    Returns:
+        Tuple[int, int, int, int]
+
+    Example:
+        >>> from vimtk.xctrl import _parse_bbox
+        >>> _parse_bbox('[0, 10, 800,600]')
+        (0, 10, 800, 600)
+        >>> _parse_bbox((0.0, 1, 2, 3))
+        (0, 1, 2, 3)
+    """
+    if isinstance(bbox, str):
+        bbox = bbox.strip().strip('[]()').split(',')
+    bbox = tuple(int(float(v)) for v in bbox)
+    if len(bbox) != 4:
+        raise ValueError('Expected x, y, w, h but got {!r}'.format(bbox))
+    return bbox
+
+
+def _move_resize_windows(geometries, unmaximize=True):
+    """
+    Moves and resizes several windows at once. The python-xlib backend
+    buffers all requests and flushes them together. Otherwise the ``wmctrl``
+    calls for all windows are started together, see
+    :func:`vimtk.runner.run_many`.
+
+    Args:
+        geometries (Dict[int, Tuple[int, int, int, int]]): maps window ids to
+            ``x, y, w, h``, where -1 keeps the current value
+
+        unmaximize (bool): remove the maximized state first
+    """
+    if not geometries:
+        return
+    native = _native_backend()
+    if native is not None:
+        for wm_id, (x, y, w, h) in geometries.items():
+            native.move_resize(wm_id, x, y, w, h, unmaximize=unmaximize,
+                               flush=False)
+        native.display.flush()
+        return
+    unmaximize_commands = []
+    move_commands = []
+    for wm_id, bbox in geometries.items():
+        hexid = '0x{:08x}'.format(wm_id)
+        unmaximize_commands.append(
+            ['wmctrl', '-ir', hexid, '-b', 'remove,maximized_horz,maximized_vert'])
+        move_commands.append(
+            ['wmctrl', '-ir', hexid, '-e', '0,' + ','.join(map(str, bbox))])
+    # wmctrl does one action per call. The calls for different windows run
+    # concurrently, and a window is only moved after it was unmaximized.
+    batches = [unmaximize_commands, move_commands] if unmaximize else [move_commands]
+    failures = []
+    for commands in batches:
+        for info in runner.run_many(commands):
+            if info['ret'] != 0 or info['timed_out']:
+                failures.append('{} ({})'.format(
+                    ' '.join(info['command']), info['err'].strip()))
+    if failures:
+        logger.warning('Some windows were not moved: {}'.format(
+            '; '.join(failures)))
+
+
+def apply_layout(layout, method='mru', unmaximize=True):
+    """
+    Moves and resizes a set of windows in one batch.
+
+    All queries are resolved against one window snapshot and the geometry
+    changes are sent together, see :func:`_move_resize_windows`.
+
+    Args:
+        layout (Dict[str, str | Sequence[int]]): maps a
+            :func:`query_windows` query to the ``x, y, w, h`` of the first
+            matching window
+
+        method (str): which match to use if several windows match, ``'mru'``
+            or ``'lru'``
+
+        unmaximize (bool): remove the maximized state first
+
+    Returns:
+        Dict[str, int | None]: the window id each query was applied to, or
+        None if no window matched
+
+    Example:
+        >>> # xdoctest: +REQUIRES(env:DISPLAY)
+        >>> from vimtk.xctrl import *  # NOQA
+        >>> applied = apply_layout({
+        >>>     'class~(?i)gvim': (0, 0, 1280, 1440),
+        >>>     'class~terminal & desktop=current': (1280, 0, 1280, 1440),
+        >>> })
+    """
+    snapshot = window_table().snapshot()
+    applied = {}
+    geometries = {}
+    for query, bbox in layout.items():
+        records = snapshot.query(query, order=method)
+        if not records:
+            logger.warning('No window matches layout query {!r}'.format(query))
+            applied[query] = None
+            continue
+        wm_id = records[0].wm_id
+        applied[query] = wm_id
+        geometries[wm_id] = _parse_bbox(bbox)
+    _move_resize_windows(geometries, unmaximize=unmaximize)
+    return applied
 
 
 def _wmctrl_terminal_patterns():
@@ -437,6 +732,14 @@ def _wmctrl_terminal_patterns():
     return terminal_pattern
 
 
+def _terminal_query():
+    """
+    window query for common terminals, which matches the same applications
+    as :func:`_wmctrl_terminal_patterns` but only against ``WM_CLASS``
+    """
+    return 'class~' + _wmctrl_terminal_patterns()
+
+
 class XCtrl(object):
     r"""
     xdotool key ctrl+shift+i
@@ -511,8 +814,17 @@ class XCtrl(object):
 
     @classmethod
     def cmd(XCtrl, command):
+        """
+        Runs a command without a shell. See :func:`vimtk.runner.run`.
+
+        Args:
+            command (List[str] | str): argv list or a string to split
+
+        Returns:
+            Dict: with keys ``out``, ``err``, and ``ret``
+        """
         logging.debug('[cmd] {}'.format(command))
-        info = ub.cmd(command)
+        info = runner.run(command)
         if info['ret'] != 0:
             logging.warn('Something went wrong {}'.format(ub.urepr(info)))
         return info
@@ -541,29 +853,17 @@ class XCtrl(object):
             wmctrl -l | awk '{print $1}' | xprop -id
             0x00a00007 | grep "WM_CLASS(STRING)"
         """
-        # List all windows and their identifiers
-        info = XCtrl.cmd('wmctrl -lx')
-        lines = info['out'].split('\n')
-        if pattern is not None:
-            # Find windows with identifiers matching the pattern
-            lines = [line for line in lines if re.search(pattern, line)]
-        # Get the hex-id portion of the output
-        winid_list = [line.split()[0] for line in lines]
-        winid_list = [int(h, 16) for h in winid_list if h]
-        return winid_list
+        # Match the pattern against the wmctrl -lx line of each window
+        snapshot = window_table().snapshot(titles=pattern is not None)
+        return snapshot.find_ids(pattern)
 
     @classmethod
     def sort_window_ids(XCtrl, winid_list, order='mru'):
         """
-        Orders window ids by most recently used
+        Orders window ids by most recently used, see
+        :func:`XCtrl.sorted_window_ids`
         """
-        def isect(list1, list2):
-            set2 = set(list2)
-            return [item for item in list1 if item in set2]
-
-        winid_order = XCtrl.sorted_window_ids(order)
-        sorted_win_ids = isect(winid_order, winid_list)
-        return sorted_win_ids
+        return window_table().snapshot().sort_ids(winid_list, order)
 
     @staticmethod
     def killold(pattern, num=4):
@@ -580,31 +880,22 @@ class XCtrl(object):
             >>> pattern = 'gvim'
             >>> num = 2
         """
-        import psutil
+        from vimtk.procinfo import PROCESS_CACHE
         num = int(num)
-        winid_list = XCtrl.findall_window_ids(pattern)
-        winid_list = XCtrl.sort_window_ids(winid_list, 'mru')[num:]
-
-        info = XCtrl.cmd('wmctrl -lxp')
-        lines = info['out'].split('\n')
-        lines = [' '.join(list(ub.take(line.split(), [0, 2])))
-                 for line in lines]
-        output_lines = lines
-        # output_lines = XCtrl.cmd(
-        #     """wmctrl -lxp | awk '{print $1 " " $3}'""",
-        #     **cmdkw)['out'].strip().split('\n')
-        output_fields = [line.split(' ') for line in output_lines]
-        output_fields = [(int(wid, 16), int(pid)) for wid, pid in output_fields]
-        pid_list = [pid for wid, pid in output_fields if wid in winid_list]
+        snapshot = window_table().snapshot(titles=True)
+        winid_list = snapshot.sort_ids(snapshot.find_ids(pattern), 'mru')[num:]
+        pid_list = [snapshot.records[wid].pid for wid in winid_list]
         for pid in pid_list:
-            proc = psutil.Process(pid=pid)
+            proc = PROCESS_CACHE.process(pid)
             proc.kill()
+            PROCESS_CACHE.evict(pid)
 
     @staticmethod
     def sorted_window_ids(order='mru'):
         """
         Returns window ids orderd by criteria
-        default is mru (most recently used)
+        default is mru (most recently used): the windows that most recently
+        had the focus first, then the others from the top of the stack
 
         CommandLine:
             xprop -root | grep "^_NET_CLIENT_LIST_STACKING" | tr "," " "
@@ -618,20 +909,7 @@ class XCtrl(object):
             >>> winid_order = XCtrl.sorted_window_ids()
             >>> print('winid_order = {!r}'.format(winid_order))
         """
-        info = XCtrl.cmd('xprop -root')
-        lines = [line for line in info['out'].split('\n')
-                 if line.startswith('_NET_CLIENT_LIST_STACKING')]
-        assert len(lines) == 1, str(lines)
-        winid_order_str = lines[0]
-        winid_order = winid_order_str.split('#')[1].strip().split(', ')[::-1]
-        winid_order = [int(h, 16) for h in winid_order]
-        if order == 'lru':
-            winid_order = winid_order[::-1]
-        elif order == 'mru':
-            winid_order = winid_order
-        else:
-            raise NotImplementedError(order)
-        return winid_order
+        return window_table().snapshot().ordered_ids(order)
 
     @staticmethod
     def find_window_id(pattern, method='mru', error='raise'):
@@ -639,10 +917,12 @@ class XCtrl(object):
         xprop -id 0x00a00007 | grep "WM_CLASS(STRING)"
         """
         logging.debug('Find window id pattern={}, method={}'.format(pattern, method))
-        winid_candidates = XCtrl.findall_window_ids(pattern)
+        snapshot = window_table().snapshot(titles=pattern is not None)
+        winid_candidates = snapshot.find_ids(pattern)
         if len(winid_candidates) == 0:
             if error == 'raise':
-                available_windows = XCtrl.cmd('wmctrl -lx')['out']
+                available_windows = '\n'.join(
+                    record.line() for record in snapshot.records.values())
                 msg = 'No window matches pattern=%r' % (pattern,)
                 msg += '\navailable windows are:\n%s' % (available_windows,)
                 logger.error(msg)
@@ -654,7 +934,7 @@ class XCtrl(object):
             # print('Multiple (%d) windows matches pattern=%r' % (
             #     len(winid_list), pattern,))
             # Find most recently used window with the focus name.
-            win_id = XCtrl.sort_window_ids(winid_candidates, method)[0]
+            win_id = snapshot.sort_ids(winid_candidates, method)[0]
         return win_id
 
     @staticmethod
@@ -694,11 +974,7 @@ class XCtrl(object):
             print('text = %r' % (text,))
             print(cplat.get_clipboard())
 
-        terminal_pattern = r'\|'.join([
-            'terminal',
-            re.escape('terminator.Terminator'),  # gtk3 terminator
-            re.escape('x-terminal-emulator.X-terminal-emulator'),  # gtk2 terminator
-        ])
+        terminal_pattern = _wmctrl_terminal_patterns()
 
         # Build xdtool script
         doscript = [
@@ -725,6 +1001,10 @@ class XCtrl(object):
     @staticmethod
     def do(*cmd_list, **kwargs):
         """
+        Runs a doscript, a sequence of ``(command, argument[, sleeptime])``
+        tuples. The script is compiled with :func:`XCtrl.compile_do` and key
+        auto-repeat is turned off while it runs.
+
         DEPRICATE THIS
         """
         verbose = kwargs.get('verbose', False)
@@ -734,88 +1014,217 @@ class XCtrl(object):
             print = logger.debug
 
         print('Executing x do: %s' % (ub.urepr(cmd_list),))
+        steps = XCtrl.compile_do(*cmd_list, **kwargs)
 
         # http://askubuntu.com/questions/455762/xbindkeys-wont-work-properly
         # Make things work even if other keys are pressed
-        defaultsleep = 0.0
-        sleeptime = kwargs.get('sleeptime', defaultsleep)
         time.sleep(.05)
-        XCtrl.cmd('xset r off')
+        XCtrl.run_compiled(steps, verbose=verbose)
 
-        memory = {}
+    @staticmethod
+    def run_compiled(steps, verbose=False):
+        """
+        Runs the steps returned by :func:`XCtrl.compile_do` with key
+        auto-repeat turned off.
+        """
+        XCtrl.set_autorepeat(False)
+        try:
+            for count, (kind, value) in enumerate(steps):
+                if verbose:
+                    logger.info('# Step {}: {} {!r}'.format(count, kind, value))
+                if kind == 'run':
+                    XCtrl.cmd(value)
+                elif kind == 'call':
+                    value()
+                else:
+                    time.sleep(value)
+        finally:
+            XCtrl.set_autorepeat(True)
+
+    @staticmethod
+    def compile_do(*cmd_list, **kwargs):
+        """
+        Compiles a doscript into as few process invocations as possible.
+
+        Windows are resolved once up front and ``$NAME`` references to
+        remembered windows are substituted, so focus changes become plain
+        ``windowactivate <id>`` commands. Consecutive xdotool commands and
+        the sleeps between them are chained into one ``xdotool`` invocation.
+        A ``type`` command consumes all remaining arguments, so it always
+        ends a chain. With the python-xlib backend the steps are calls on
+        the session connection instead.
+
+        ``remember_window_id`` and ``remember_window_name`` record the window
+        that is active when the script is compiled, so they must come before
+        the first step that changes the focus.
+
+        Args:
+            *cmd_list: ``(command, argument[, sleeptime])`` tuples
+            sleeptime (float): default sleep after each step
+            chain (bool): if False, run one process per step
+            native (XlibBackend | None): backend to compile for, defaults to
+                the session backend
+
+        Returns:
+            List[Tuple[str, object]]: ``('run', argv)``, ``('call', func)``
+            and ``('sleep', seconds)`` steps
+
+        Raises:
+            ValueError: if a window is remembered after a focus change
 
-        for count, item in enumerate(cmd_list):
-            # print('item = %r' % (item,))
-            sleeptime = kwargs.get('sleeptime', defaultsleep)
+        Example:
+            >>> from vimtk.xctrl import XCtrl
+            >>> steps = XCtrl.compile_do(
+            >>>     ('focus_id', 0x3c00007), ('key', 'Escape'),
+            >>>     ('type2', ';e foo.py'), ('key', 'KP_Enter'),
+            >>>     native=None, sleeptime=0.01)
+            >>> for step in steps:
+            >>>     print(step)
+            ('run', ['xdotool', 'windowactivate', '62914567', 'sleep', '0.01', 'key', 'Escape', 'sleep', '0.01', 'type', ';e foo.py'])
+            ('sleep', 0.01)
+            ('run', ['xdotool', 'key', 'KP_Enter', 'sleep', '0.01'])
+            >>> steps = XCtrl.compile_do(
+            >>>     ('key', 'Escape'), ('key', 'KP_Enter', 0), native=None,
+            >>>     chain=False)
+            >>> for step in steps:
+            >>>     print(step)
+            ('run', ['xdotool', 'key', 'Escape'])
+            ('run', ['xdotool', 'key', 'KP_Enter'])
+            >>> import pytest
+            >>> with pytest.raises(ValueError):
+            >>>     XCtrl.compile_do(('focus_id', 0x3c00007),
+            >>>                      ('remember_window_id', 'TERM'), native=None)
+        """
+        defaultsleep = kwargs.get('sleeptime', 0.0)
+        chain = kwargs.get('chain', True)
+        native = kwargs.get('native', _UNSET)
+        if native is _UNSET:
+            native = _native_backend()
 
+        memory = {}
+        steps = []
+        pending = []
+        focus_changed = False
+
+        def flush():
+            if pending:
+                steps.append(('run', ['xdotool'] + pending))
+                del pending[:]
+
+        def add_xdotool(args, ends_chain=False):
+            pending.extend(args)
+            if ends_chain or not chain:
+                flush()
+
+        def add_step(step):
+            flush()
+            steps.append(step)
+
+        def lookup(key_):
+            if isinstance(key_, str) and key_.startswith('$'):
+                return memory[key_[1:]]
+            return key_
+
+        for item in cmd_list:
+            sleeptime = defaultsleep
             assert isinstance(item, tuple)
             assert len(item) >= 2
             xcmd, key_ = item[0:2]
             if len(item) >= 3:
                 if isinstance(item[2], str) and item[2].endswith('?'):
                     sleeptime = float(item[2][:-1])
-                    print('special command sleep')
-                    print('sleeptime = %r' % (sleeptime,))
                 else:
                     sleeptime = float(item[2])
 
-            args = []
-
-            print('# Step %d' % (count,))
-            print('xcmd = {!r}'.format(xcmd))
-
-            if xcmd == 'focus':
-                key_ = str(key_)
-                if key_.startswith('$'):
-                    key_ = memory[key_[1:]]
-                pattern = key_
-                win_id = XCtrl.find_window_id(pattern, method='mru')
-                if win_id is None:
-                    args = ['wmctrl', '-xa', pattern]
+            if xcmd in {'remember_window_id', 'remember_window_name'}:
+                if focus_changed:
+                    raise ValueError(
+                        '{} must come before the first focus step, the '
+                        'window is looked up when the script is '
+                        'compiled'.format(xcmd))
+            elif xcmd in {'focus', 'focus_id', 'windowactivate', 'windowfocus'}:
+                focus_changed = True
+
+            if xcmd in {'focus', 'focus_id'}:
+                key_ = lookup(key_)
+                if xcmd == 'focus':
+                    win_id = XCtrl.find_window_id(str(key_), method='mru')
+                elif isinstance(key_, str):
+                    win_id = int(key_, 0)
+                else:
+                    win_id = key_
+                if native is not None:
+                    add_step(('call', functools.partial(native.activate, win_id)))
                 else:
-                    args = ['wmctrl', '-ia', hex(win_id)]
-            elif xcmd == 'focus_id':
-                key_ = str(key_)
-                if key_.startswith('$'):
-                    key_ = memory[key_[1:]]
-                args = ['wmctrl', '-ia', hex(key_)]
+                    add_xdotool(['windowactivate', str(win_id)])
             elif xcmd == 'remember_window_id':
                 memory[key_] = XCtrl.current_window_id()
                 continue
             elif xcmd == 'remember_window_name':
                 memory[key_] = XCtrl.current_window_name()
                 continue
+            elif native is not None and xcmd in {'type', 'type2'}:
+                add_step(('call', functools.partial(native.type_text, str(key_))))
+            elif native is not None and xcmd == 'key':
+                add_step(('call', functools.partial(native.send_keys, str(key_))))
             elif xcmd == 'type':
-                args = [
-                    'xdotool',
+                add_xdotool([
                     'keyup', '--window', '0', '7',
-                    'type', '--clearmodifiers',
-                    '--window', '0', str(key_)
-                ]
+                    'type', '--clearmodifiers', '--window', '0', str(key_)
+                ], ends_chain=True)
             elif xcmd == 'type2':
-                args = [
-                    'xdotool', 'type', cmd_quote(str(key_))
-                ]
+                add_xdotool(['type', str(key_)], ends_chain=True)
             elif xcmd == 'xset-r-on':
-                args = ['xset', 'r', 'on']
+                add_step(('call', functools.partial(XCtrl.set_autorepeat, True)))
             elif xcmd == 'xset-r-off':
-                args = ['xset', 'r', 'off']
+                add_step(('call', functools.partial(XCtrl.set_autorepeat, False)))
             else:
-                args = ['xdotool', str(xcmd), str(key_)]
-
-            print('args = {!r}'.format(args))
-            XCtrl.cmd(args)
+                add_xdotool([str(xcmd), str(key_)])
 
             if sleeptime > 0:
-                time.sleep(sleeptime)
+                if pending:
+                    add_xdotool(['sleep', '{:g}'.format(sleeptime)])
+                else:
+                    add_step(('sleep', sleeptime))
+        flush()
+        return steps
+
+    @staticmethod
+    def set_autorepeat(enabled):
+        """
+        Turns key auto-repeat on or off, like ``xset r on`` / ``xset r off``.
+        Turning it off makes synthesized key presses reliable while the user
+        is still holding down keys.
+        """
+        native = _native_backend()
+        if native is not None:
+            native.set_autorepeat(enabled)
+        else:
+            XCtrl.cmd(['xset', 'r', 'on' if enabled else 'off'])
 
-        XCtrl.cmd('xset r on')
+    @staticmethod
+    def wait_keys_released(timeout=0.05):
+        """
+        Waits until no key is held down, so synthesized key presses do not
+        combine with the keys of the mapping that triggered a command. Without
+        the xlib backend the keyboard state is not available and this sleeps
+        for the whole timeout.
+        """
+        native = _native_backend()
+        if native is not None:
+            native.wait_keys_released(timeout=timeout)
+        else:
+            time.sleep(timeout)
 
     @staticmethod
     def current_window_id():
         logging.debug('Get current window id')
-        info = XCtrl.cmd('xdotool getwindowfocus')
-        value = int(info['out'].strip())
+        native = _native_backend()
+        if native is not None:
+            value = native.active_window()
+        else:
+            info = XCtrl.cmd('xdotool getwindowfocus')
+            value = int(info['out'].strip())
         logging.debug('... current window id = {}'.format(value))
         return value
 
@@ -842,10 +1251,20 @@ class XCtrl(object):
         time.sleep(sleeptime)
 
     @classmethod
-    def send_keys(XCtrl, key, sleeptime=0.1):
-        args = ['xdotool', 'key', str(key)]
-        XCtrl.cmd(args)
-        time.sleep(sleeptime)
+    def send_keys(XCtrl, key, sleeptime=0.0):
+        """
+        Presses a key combination. The key events have been delivered to the
+        X server when this returns, and the server keeps them in order, so
+        sleeping afterwards is rarely necessary.
+        """
+        native = _native_backend()
+        if native is not None:
+            native.send_keys(str(key))
+        else:
+            args = ['xdotool', 'key', str(key)]
+            XCtrl.cmd(args)
+        if sleeptime > 0:
+            time.sleep(sleeptime)
 
     # @classmethod
     # def focus(XCtrl, pattern=None, win_id=None, sleeptime=.01):
@@ -1,16 +1,26 @@
 import ubelt as ub
 from _typeshed import Incomplete
 from collections.abc import Generator
-from typing import Any
+from typing import Any, Dict, List, Sequence, Tuple
+
+from vimtk.window_table import WindowTable
 
 logger: Incomplete
 
 
+def reset_backend() -> None:
+    ...
+
+
+def window_table() -> WindowTable:
+    ...
+
+
 def is_directory_open(dpath):
     ...
 
 
-def wmctrl_list():
+def wmctrl_list() -> Dict[int, Dict]:
     ...
 
 
@@ -24,6 +34,16 @@ def find_windows(proc: Incomplete | None = ...,
     ...
 
 
+def query_windows(query: str, order: str = ...) -> List[XWindow]:
+    ...
+
+
+def apply_layout(layout: Dict[str, str | Sequence[int]],
+                 method: str = ...,
+                 unmaximize: bool = ...) -> Dict[str, int | None]:
+    ...
+
+
 class XWindow(ub.NiceRepr):
     wm_id: Incomplete
     cache: Incomplete
@@ -39,6 +59,10 @@ class XWindow(ub.NiceRepr):
     def find(XWindow, pattern, method: str = ...):
         ...
 
+    @classmethod
+    def find_query(XWindow, query: str, method: str = ...) -> XWindow:
+        ...
+
     @classmethod
     def current(XWindow):
         ...
@@ -74,7 +98,10 @@ class XWindow(ub.NiceRepr):
     def process_name(self):
         ...
 
-    def focus(self, sleeptime: Incomplete | None = ...) -> None:
+    def focus(self,
+              sleeptime: float | None = ...,
+              sync: bool = ...,
+              timeout: float = ...) -> bool:
         ...
 
     def info(self):
@@ -125,6 +152,23 @@ class XCtrl:
     def do(*cmd_list, **kwargs) -> None:
         ...
 
+    @staticmethod
+    def run_compiled(steps: List[Tuple[str, Any]],
+                     verbose: bool = False) -> None:
+        ...
+
+    @staticmethod
+    def compile_do(*cmd_list, **kwargs) -> List[Tuple[str, Any]]:
+        ...
+
+    @staticmethod
+    def set_autorepeat(enabled: bool) -> None:
+        ...
+
+    @staticmethod
+    def wait_keys_released(timeout: float = ...) -> None:
+        ...
+
     @staticmethod
     def current_window_id():
         ...
@@ -0,0 +1,402 @@
+"""
+Native X11 backend for :mod:`vimtk.xctrl` built on python-xlib.
+
+The command line backend spawns ``wmctrl``, ``xprop``, ``xdotool`` and
+``xset`` for every step of :func:`vimtk.core.execute_text_in_terminal`. This
+backend instead keeps a single X connection open for the whole vim session:
+
+* window lists and stacking order come from the ``_NET_CLIENT_LIST`` and
+  ``_NET_CLIENT_LIST_STACKING`` root properties and per-window properties
+  like ``WM_CLASS`` and ``_NET_WM_PID``,
+* focus changes are ``_NET_ACTIVE_WINDOW`` client messages to the root
+  window, like ``wmctrl -ia``,
+* key presses are synthesized with the XTEST extension, like ``xdotool key``,
+* key auto-repeat is toggled with ``XChangeKeyboardControl``, like ``xset``.
+
+The backend is selected with ``let g:vimtk_xctrl_backend = 'auto'`` (the
+default, use this backend if python-xlib is installed and a display is
+available), ``'xlib'`` (always use it), or ``'cli'`` (never use it).
+
+Requirements:
+    pip install python-xlib
+
+CommandLine:
+    # Run the tests under a virtual X server
+    xvfb-run -a xdoctest -m vimtk.xlib_backend
+
+Example:
+    >>> # xdoctest: +REQUIRES(module:Xlib)
+    >>> # xdoctest: +REQUIRES(env:DISPLAY)
+    >>> from vimtk import xlib_backend
+    >>> backend = xlib_backend.connect()
+    >>> assert backend is xlib_backend.connect()
+    >>> windows = backend.window_list()
+    >>> order = backend.stacking_order()
+    >>> assert set(order) <= set(windows)
+    >>> for wm_id, info in windows.items():
+    >>>     assert info['wm_id'] == wm_id
+    >>>     assert set(info) >= {'hexid', 'deskid', 'pid', 'wm_class', 'client', 'title'}
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+#: xdotool modifier names to keysym names
+MODIFIER_KEYSYMS = {
+    'ctrl': 'Control_L',
+    'control': 'Control_L',
+    'shift': 'Shift_L',
+    'alt': 'Alt_L',
+    'meta': 'Meta_L',
+    'super': 'Super_L',
+}
+
+_CONNECTION = None
+
+
+def is_available():
+    """
+    Returns:
+        bool: True if python-xlib is installed and a display is configured
+    """
+    import os
+    if not os.environ.get('DISPLAY'):
+        return False
+    try:
+        import Xlib  # NOQA
+    except ImportError:
+        return False
+    return True
+
+
+def connect():
+    """
+    Returns the X connection for this session, opening it on first use.
+
+    Returns:
+        XlibBackend
+    """
+    global _CONNECTION
+    if _CONNECTION is None:
+        _CONNECTION = XlibBackend()
+    return _CONNECTION
+
+
+def disconnect():
+    """
+    Closes the session connection. The next :func:`connect` opens a new one.
+    """
+    global _CONNECTION
+    if _CONNECTION is not None:
+        _CONNECTION.close()
+        _CONNECTION = None
+
+
+class XlibBackend(object):
+    """
+    A single X connection that provides the window queries and actions the
+    command line tools are used for.
+
+    Args:
+        display_name (str | None): defaults to the DISPLAY environment variable
+    """
+
+    def __init__(self, display_name=None):
+        from Xlib import display as xdisplay
+        self.display = xdisplay.Display(display_name)
+        self.root = self.display.screen().root
+        self._atoms = {}
+
+    def close(self):
+        self.display.close()
+
+    def atom(self, name):
+        try:
+            return self._atoms[name]
+        except KeyError:
+            value = self._atoms[name] = self.display.intern_atom(name)
+            return value
+
+    def _property(self, window, name, type_=None):
+        from Xlib import X
+        if type_ is None:
+            type_ = X.AnyPropertyType
+        elif isinstance(type_, str):
+            type_ = self.atom(type_)
+        try:
+            prop = window.get_full_property(self.atom(name), type_)
+        except Exception:
+            # The window went away between listing and querying it
+            return None
+        if prop is None:
+            return None
+        return prop.value
+
+    def _text_property(self, window, name, type_=None):
+        value = self._property(window, name, type_)
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return value.decode('utf8', errors='replace')
+        return str(value)
+
+    def _window(self, wm_id):
+        return self.display.create_resource_object('window', wm_id)
+
+    def client_list(self):
+        """
+        Returns:
+            List[int]: managed windows in mapping order (``_NET_CLIENT_LIST``)
+        """
+        value = self._property(self.root, '_NET_CLIENT_LIST')
+        return [] if value is None else list(value)
+
+    def stacking_order(self):
+        """
+        Returns:
+            List[int]: managed windows from bottom to top
+            (``_NET_CLIENT_LIST_STACKING``)
+        """
+        value = self._property(self.root, '_NET_CLIENT_LIST_STACKING')
+        return [] if value is None else list(value)
+
+    def current_desktop(self):
+        """
+        Returns:
+            str | None: the active desktop (``_NET_CURRENT_DESKTOP``)
+        """
+        value = self._property(self.root, '_NET_CURRENT_DESKTOP')
+        return None if value is None else str(int(value[0]))
+
+    def window_info(self, wm_id):
+        """
+        Returns:
+            Dict: the same fields that ``wmctrl -lxp`` reports for a window
+        """
+        window = self._window(wm_id)
+        wm_class = self._property(window, 'WM_CLASS')
+        if wm_class is not None:
+            if isinstance(wm_class, bytes):
+                wm_class = wm_class.decode('utf8', errors='replace')
+            wm_class = '.'.join(p for p in wm_class.split('\0') if p)
+        else:
+            wm_class = 'N/A'
+        desktop = self._property(window, '_NET_WM_DESKTOP')
+        pid = self._property(window, '_NET_WM_PID')
+        title = self._title(window)
+        client = self._text_property(window, 'WM_CLIENT_MACHINE') or 'N/A'
+        deskid = -1 if desktop is None else int(desktop[0])
+        # wmctrl reports unsigned -1 (sticky windows) as -1
+        if deskid == 0xFFFFFFFF:
+            deskid = -1
+        return {
+            'hexid': '0x{:08x}'.format(wm_id),
+            'wm_id': wm_id,
+            'deskid': str(deskid),
+            'pid': 0 if pid is None else int(pid[0]),
+            'wm_class': wm_class,
+            'client': client.rstrip('\0'),
+            'title': title,
+        }
+
+    def _title(self, window):
+        title = self._text_property(window, '_NET_WM_NAME', 'UTF8_STRING')
+        if title is None:
+            title = self._text_property(window, 'WM_NAME') or ''
+        return title
+
+    def window_title(self, wm_id):
+        """
+        Returns:
+            str: the title of a window (``_NET_WM_NAME`` or ``WM_NAME``)
+        """
+        return self._title(self._window(wm_id))
+
+    def window_titles(self):
+        """
+        Returns:
+            Dict[int, str]: maps the managed window ids to their titles
+        """
+        return {wm_id: self.window_title(wm_id) for wm_id in self.client_list()}
+
+    def window_list(self):
+        """
+        Returns:
+            Dict[int, Dict]: maps window ids to the info in
+            :func:`XlibBackend.window_info`, like :func:`vimtk.xctrl.wmctrl_list`
+        """
+        return {wm_id: self.window_info(wm_id) for wm_id in self.client_list()}
+
+    def active_window(self):
+        """
+        Returns:
+            int: the id of the active window (``_NET_ACTIVE_WINDOW``), or the
+            window with the input focus if the window manager does not set it
+        """
+        value = self._property(self.root, '_NET_ACTIVE_WINDOW')
+        if value is not None and len(value) and value[0]:
+            return int(value[0])
+        focus = self.display.get_input_focus().focus
+        return int(getattr(focus, 'id', focus))
+
+    def _send_root_message(self, window, name, data):
+        from Xlib import X
+        from Xlib.protocol import event
+        data = (list(data) + [0] * 5)[:5]
+        message = event.ClientMessage(
+            window=window, client_type=self.atom(name), data=(32, data))
+        mask = X.SubstructureRedirectMask | X.SubstructureNotifyMask
+        self.root.send_event(message, event_mask=mask)
+
+    def activate(self, wm_id):
+        """
+        Switches to the desktop of a window and activates it, like
+        ``wmctrl -ia``.
+        """
+        from Xlib import X
+        window = self._window(wm_id)
+        desktop = self._property(window, '_NET_WM_DESKTOP')
+        if desktop is not None and int(desktop[0]) != 0xFFFFFFFF:
+            self._send_root_message(
+                self.root, '_NET_CURRENT_DESKTOP', [int(desktop[0]), X.CurrentTime])
+        # Source indication 2 means the request comes from a pager, which
+        # window managers do not subject to focus stealing prevention.
+        self._send_root_message(window, '_NET_ACTIVE_WINDOW', [2, X.CurrentTime, 0])
+        self.display.flush()
+
+    def wait_active(self, wm_id, timeout=0.5, interval=0.001):
+        """
+        Polls ``_NET_ACTIVE_WINDOW`` until a window is active.
+
+        Returns:
+            bool: False if the window did not become active within the timeout
+        """
+        import time
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.active_window() == wm_id:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def wait_keys_released(self, timeout=0.05, interval=0.001):
+        """
+        Polls the keyboard state until no key is held down, e.g. the keys of
+        the mapping that triggered a command.
+
+        Returns:
+            bool: False if keys were still held down after the timeout
+        """
+        import time
+        deadline = time.monotonic() + timeout
+        while True:
+            if not any(self.display.query_keymap()):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def resize(self, wm_id, width, height):
+        window = self._window(wm_id)
+        window.configure(width=int(width), height=int(height))
+        self.display.flush()
+
+    def move_resize(self, wm_id, x=-1, y=-1, width=-1, height=-1,
+                    unmaximize=True, flush=True):
+        """
+        Asks the window manager to move and resize a window, like
+        ``wmctrl -ir <id> -e 0,x,y,w,h``. Negative values keep the current
+        position or size. The requests are only buffered if ``flush`` is
+        False, so a whole layout can be sent in one write.
+
+        Args:
+            unmaximize (bool): first remove the maximized state, which would
+                otherwise override the new geometry
+        """
+        window = self._window(wm_id)
+        if unmaximize:
+            # _NET_WM_STATE_REMOVE = 0, source indication 2 (pager)
+            self._send_root_message(window, '_NET_WM_STATE', [
+                0, self.atom('_NET_WM_STATE_MAXIMIZED_HORZ'),
+                self.atom('_NET_WM_STATE_MAXIMIZED_VERT'), 2])
+        # Static gravity 0 means the window manager default. Bits 8 to 11
+        # say which of x, y, width and height are set, and bits 12 and 13 are
+        # the source indication.
+        values = [x, y, width, height]
+        flags = 2 << 12
+        for bit, value in enumerate(values):
+            if value >= 0:
+                flags |= 1 << (8 + bit)
+        self._send_root_message(window, '_NET_MOVERESIZE_WINDOW',
+                                [flags] + [max(int(v), 0) for v in values])
+        if flush:
+            self.display.flush()
+
+    def geometry(self, wm_id):
+        """
+        Returns:
+            Dict[str, int]: x, y, width, and height of a window
+        """
+        geom = self._window(wm_id).get_geometry()
+        return {'x': geom.x, 'y': geom.y, 'width': geom.width,
+                'height': geom.height}
+
+    def _keycode(self, name):
+        from Xlib import XK
+        keysym = XK.string_to_keysym(name)
+        if keysym == 0 and len(name) == 1:
+            keysym = ord(name)
+        keycode = self.display.keysym_to_keycode(keysym)
+        if keycode == 0:
+            raise KeyError('No keycode for key {!r}'.format(name))
+        return keycode
+
+    def send_keys(self, keyspec):
+        """
+        Presses and releases a key combination given in xdotool syntax, e.g.
+        ``ctrl+shift+v`` or ``KP_Enter``.
+        """
+        from Xlib import X
+        from Xlib.ext import xtest
+        names = [MODIFIER_KEYSYMS.get(part.lower(), part)
+                 for part in keyspec.split('+')]
+        keycodes = [self._keycode(name) for name in names]
+        for keycode in keycodes:
+            xtest.fake_input(self.display, X.KeyPress, keycode)
+        for keycode in reversed(keycodes):
+            xtest.fake_input(self.display, X.KeyRelease, keycode)
+        self.display.sync()
+
+    def type_text(self, text):
+        """
+        Types text with XTEST, pressing shift for characters that need it
+        """
+        from Xlib import X, XK
+        from Xlib.ext import xtest
+        shift = self._keycode('Shift_L')
+        for char in text:
+            keysym = XK.string_to_keysym(char) or ord(char)
+            if char == '\n':
+                keysym = XK.string_to_keysym('Return')
+            keycode = self.display.keysym_to_keycode(keysym)
+            if keycode == 0:
+                logger.warning('Cannot type {!r}'.format(char))
+                continue
+            needs_shift = self.display.keycode_to_keysym(keycode, 0) != keysym
+            if needs_shift:
+                xtest.fake_input(self.display, X.KeyPress, shift)
+            xtest.fake_input(self.display, X.KeyPress, keycode)
+            xtest.fake_input(self.display, X.KeyRelease, keycode)
+            if needs_shift:
+                xtest.fake_input(self.display, X.KeyRelease, shift)
+        self.display.sync()
+
+    def set_autorepeat(self, enabled):
+        """
+        Turns key auto-repeat on or off, like ``xset r on`` / ``xset r off``
+        """
+        from Xlib import X
+        mode = X.AutoRepeatModeOn if enabled else X.AutoRepeatModeOff
+        self.display.change_keyboard_control(auto_repeat_mode=mode)
+        self.display.flush()
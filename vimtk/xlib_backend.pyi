@@ -0,0 +1,94 @@
+from typing import Dict, List
+from _typeshed import Incomplete
+
+logger: Incomplete
+MODIFIER_KEYSYMS: Dict[str, str]
+
+
+def is_available() -> bool:
+    ...
+
+
+def connect() -> XlibBackend:
+    ...
+
+
+def disconnect() -> None:
+    ...
+
+
+class XlibBackend:
+    display: Incomplete
+    root: Incomplete
+
+    def __init__(self, display_name: str | None = None) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+    def atom(self, name: str) -> int:
+        ...
+
+    def client_list(self) -> List[int]:
+        ...
+
+    def stacking_order(self) -> List[int]:
+        ...
+
+    def current_desktop(self) -> str | None:
+        ...
+
+    def wait_active(self,
+                    wm_id: int,
+                    timeout: float = 0.5,
+                    interval: float = 0.001) -> bool:
+        ...
+
+    def wait_keys_released(self,
+                           timeout: float = 0.05,
+                           interval: float = 0.001) -> bool:
+        ...
+
+    def window_info(self, wm_id: int) -> Dict:
+        ...
+
+    def window_title(self, wm_id: int) -> str:
+        ...
+
+    def window_titles(self) -> Dict[int, str]:
+        ...
+
+    def window_list(self) -> Dict[int, Dict]:
+        ...
+
+    def active_window(self) -> int:
+        ...
+
+    def activate(self, wm_id: int) -> None:
+        ...
+
+    def resize(self, wm_id: int, width: int, height: int) -> None:
+        ...
+
+    def move_resize(self,
+                    wm_id: int,
+                    x: int = -1,
+                    y: int = -1,
+                    width: int = -1,
+                    height: int = -1,
+                    unmaximize: bool = True,
+                    flush: bool = True) -> None:
+        ...
+
+    def geometry(self, wm_id: int) -> Dict[str, int]:
+        ...
+
+    def send_keys(self, keyspec: str) -> None:
+        ...
+
+    def type_text(self, text: str) -> None:
+        ...
+
+    def set_autorepeat(self, enabled: bool) -> None:
+        ...